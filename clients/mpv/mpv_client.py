@@ -16,6 +16,7 @@ Native Media Player for Linux/Unix - полная идентичность с An
 
 import socket
 import json
+import asyncio
 import socketio
 import time
 import threading
@@ -25,10 +26,24 @@ import argparse
 import signal
 import subprocess
 import requests
+from urllib3.util.retry import Retry
 import platform
 import re
-from urllib.parse import quote
-from typing import Optional, Dict, Any, List
+import queue
+import shutil
+import hashlib
+import sqlite3
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlparse
+from typing import Optional, Dict, Any, Iterable, List
+
+try:
+    import aiohttp  # Только для --asyncio (python-socketio[asyncio_client])
+except ImportError:
+    aiohttp = None
 
 class DeviceDetector:
     """
@@ -90,6 +105,100 @@ class DeviceDetector:
             pass
         return (0, 32)  # По умолчанию - старая версия
     
+    @staticmethod
+    def host_key() -> list:
+        """Бинарник mpv (путь, mtime) и ядро: после их обновления кэш и калибровка устаревают"""
+        mpv_path = shutil.which('mpv') or 'mpv'
+        try:
+            mpv_mtime = os.stat(mpv_path).st_mtime
+        except OSError:
+            mpv_mtime = None
+        return [mpv_path, mpv_mtime, platform.release(), platform.machine()]
+    
+    @staticmethod
+    def detect_cached(cache_file: str) -> tuple:
+        """
+        detect_platform() + get_mpv_version() с кэшем на диске
+        Ключ - бинарник mpv (путь, mtime) и ядро: после обновления mpv
+        или ядра определяем заново. Возвращает (platform, version, из_кэша)
+        """
+        key = DeviceDetector.host_key()
+        mpv_mtime = key[1]
+        
+        try:
+            with open(cache_file, 'r') as f:
+                cached = json.load(f)
+            if cached.get('key') == key:
+                return cached['platform'], tuple(cached['mpv_version']), True
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        platform_type = DeviceDetector.detect_platform()
+        mpv_version = DeviceDetector.get_mpv_version()
+        if mpv_mtime is not None:  # Без mpv не кэшируем - версия по умолчанию
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                with open(cache_file + '.tmp', 'w') as f:
+                    json.dump({'key': key, 'platform': platform_type, 'mpv_version': list(mpv_version)}, f)
+                os.replace(cache_file + '.tmp', cache_file)
+            except OSError:
+                pass
+        return platform_type, mpv_version, False
+    
+    # Кодеки (имена ffprobe), которые платформа декодирует аппаратно
+    HWDEC_CODECS = {
+        'raspberry_pi': ['h264', 'hevc', 'vp8', 'vp9'],  # rpivid-v4l2 + v4l2m2m
+        'arm_linux': ['h264', 'hevc'],
+        'x86_linux': ['h264', 'hevc', 'vp8', 'vp9', 'mpeg2video', 'vc1'],
+        'unknown': [],
+    }
+    # Предел программного декодирования (ширина, высота) без пропусков кадров
+    SOFTWARE_DECODE_MAX = {
+        'raspberry_pi': (1920, 1080),
+        'arm_linux': (1280, 720),
+    }
+    
+    @staticmethod
+    def get_capabilities(platform_type: str, calibration: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Профиль возможностей платформы для проверки файлов до loadfile (замеры --calibrate точнее)"""
+        if calibration:
+            software_max = calibration.get('software_max')
+            return {
+                'hwdec_codecs': set(calibration.get('hwdec_codecs') or []),
+                'software_max': tuple(software_max) if software_max else None,
+            }
+        return {
+            'hwdec_codecs': set(DeviceDetector.HWDEC_CODECS.get(platform_type, [])),
+            'software_max': DeviceDetector.SOFTWARE_DECODE_MAX.get(platform_type),
+        }
+    
+    @staticmethod
+    def load_calibration(path: str) -> Optional[Dict[str, Any]]:
+        """Профиль --calibrate этой машины (None - нет или mpv/ядро с тех пор обновлены)"""
+        try:
+            with open(path, 'r') as f:
+                calibration = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(calibration, dict) or not isinstance(calibration.get('params'), dict):
+            return None
+        if calibration.get('key') != DeviceDetector.host_key():
+            print(f"[Detector] ⚠️ Калибровка устарела (обновлен mpv или ядро) - запустите --calibrate заново")
+            return None
+        return calibration
+    
+    @staticmethod
+    def apply_calibration(params: List[str], calibration: Dict[str, Any]) -> List[str]:
+        """Замена hwdec/vo/потоков платформы замеренными на этой машине"""
+        calibrated = calibration['params']
+        params = [p for p in params if not p.startswith(Calibrator.TUNED_OPTIONS)]
+        params += [f'--{name}={value}' for name, value in calibrated.items()]
+        if calibrated.get('hwdec', 'no') != 'no' and calibration.get('hwdec_codecs'):
+            params.append(f"--hwdec-codecs={','.join(calibration['hwdec_codecs'])}")
+        print(f"[Detector] 📏 Калибровка от {calibration.get('created', '?')}: "
+              f"{', '.join(f'{k}={v}' for k, v in calibrated.items())}")
+        return params
+    
     @staticmethod
     def get_optimal_params(platform_type: str, mpv_version: tuple) -> List[str]:
         """
@@ -127,7 +236,7 @@ class DeviceDetector:
                 '--network-timeout=60',
                 '--vo=x11',  # X11 стабильнее чем gpu на RPi с X-сервером
                 '--hwdec=v4l2m2m',  # rpivid-v4l2 аппаратный декодер
-                '--hwdec-codecs=h264,hevc,vp8,vp9',  # Поддерживаемые кодеки
+                f'--hwdec-codecs={",".join(DeviceDetector.HWDEC_CODECS["raspberry_pi"])}',  # Поддерживаемые кодеки
                 '--vd-lavc-threads=4',  # 4 ядра CPU (arm_freq=2000)
                 '--framedrop=vo',  # Пропуск кадров если нужно
             ])
@@ -191,192 +300,3911 @@ class DeviceDetector:
         ])
         return params
 
-class MPVClient:
-    def __init__(self, server_url, device_id, display=':0', fullscreen=True):
-        self.server_url = server_url.rstrip('/')
-        self.device_id = device_id
-        self.running = True
-        self.ipc_socket = f'/tmp/mpv-{device_id}.sock'
+class Calibrator:
+    """
+    Калибровка воспроизведения на этой машине (--calibrate)
+    
+    Короткие тестовые ролики (H.264/HEVC/VP9 в 720p/1080p/4K) генерирует
+    ffmpeg; без ffmpeg берутся уже лежащие в каталоге калибровки файлы
+    вида h264-1080p.mp4. Сначала скорость декодирования: каждый ролик без
+    привязки ко времени (--untimed, --vo=null) через каждый hwdec и число
+    потоков. Затем вывод: ролики в реальном времени с лучшим декодером через
+    каждый vo, считаются пропуски кадров. Самый быстрый стабильный профиль
+    пишется в calibration.json - DeviceDetector применяет его при запусках.
+    """
+    
+    # Кодек (имя ffprobe) -> (кодер ffmpeg, его параметры, контейнер)
+    CODECS = {
+        'h264': ('libx264', ['-preset', 'ultrafast'], 'mp4'),
+        'hevc': ('libx265', ['-preset', 'ultrafast'], 'mp4'),
+        'vp9': ('libvpx-vp9', ['-deadline', 'realtime', '-cpu-used', '8'], 'webm'),
+    }
+    SIZES = {'720p': (1280, 720), '1080p': (1920, 1080), '4k': (3840, 2160)}
+    CLIP_SECONDS = 3
+    CLIP_FPS = 30
+    
+    # Декодирование меряется с копированием кадров в память (без окна);
+    # в профиль идет тот же hwdec без -copy
+    HWDEC_CANDIDATES = {
+        'raspberry_pi': ['v4l2m2m-copy', 'drm-copy'],
+        'arm_linux': ['auto-copy-safe'],
+        'x86_linux': ['vaapi-copy', 'nvdec-copy', 'vdpau-copy'],
+    }
+    VO_CANDIDATES = {
+        'raspberry_pi': ['x11', 'gpu', 'drm'],
+        'arm_linux': ['gpu', 'x11', 'drm'],
+        'x86_linux': ['gpu', 'x11'],
+    }
+    TUNED_OPTIONS = ('--hwdec=', '--vo=', '--vd-lavc-threads=', '--hwdec-codecs=')
+    REALTIME_MARGIN = 1.2   # Декодирование быстрее реального времени с запасом
+    MAX_DROP_RATIO = 0.01   # Доля пропущенных кадров, при которой вывод стабилен
+    
+    def __init__(self, directory: str, platform_type: str, display: str):
+        self.directory = directory
+        self.clips_dir = os.path.join(directory, 'calibration')
+        self.platform_type = platform_type
+        self.env = {**os.environ, 'DISPLAY': display}
+        self.results: List[Dict[str, Any]] = []
+    
+    def run(self) -> Optional[Dict[str, Any]]:
+        """Полная калибровка; профиль записывается в calibration.json"""
+        clips = self._clips()
+        if not clips:
+            print(f"[Calibrate] ❌ Нет тестовых роликов: нужен ffmpeg или файлы в {self.clips_dir}")
+            return None
         
-        print(f"[MPV] 🚀 Запуск MPV клиента v1.0 (идентичен Android ExoPlayer)")
-        print(f"[MPV] Сервер: {server_url}")
-        print(f"[MPV] Устройство: {device_id}")
-        print(f"[MPV] Display: {display}")
-        print(f"[MPV] 🔍 Система: {platform.system()} {platform.machine()}")
+        # 1. Декодирование: каждый hwdec и число потоков
+        cpu = os.cpu_count() or 2
+        threads = sorted({0, cpu, min(16, cpu * 2)})
+        decoders = [(hwdec, t) for hwdec in ['no'] + self.HWDEC_CANDIDATES.get(self.platform_type, [])
+                    for t in threads]
+        for clip in clips:
+            for hwdec, t in decoders:
+                self._measure(clip, {'hwdec': hwdec, 'vd-lavc-threads': t, 'vo': 'null'}, untimed=True)
         
-        # === Состояния (как в Android) ===
-        self.current_video_file: Optional[str] = None
-        self.saved_position: float = 0.0  # Позиция в секундах
-        self.current_pdf_file: Optional[str] = None
-        self.current_pdf_page: int = 1
-        self.current_pptx_file: Optional[str] = None
-        self.current_pptx_slide: int = 1
-        self.current_folder_name: Optional[str] = None
-        self.current_folder_image: int = 1
-        self.is_playing_placeholder: bool = False
+        decode = [r for r in self.results if r['vo'] == 'null']
+        hwdec, t = max(decoders, key=lambda config: self._decode_score(decode, *config))
+        print(f"[Calibrate] 🏆 Декодирование: hwdec={hwdec}, vd-lavc-threads={t}")
         
-        # === Кэш заглушки (как в Android) ===
-        self.cached_placeholder_file: Optional[str] = None
-        self.cached_placeholder_type: Optional[str] = None
+        # 2. Вывод: реальное время, выбранный декодер без копирования кадров
+        render_hwdec = hwdec.replace('-copy', '')
+        playable = [clip for clip in clips if self._realtime(decode, clip, hwdec, t)]
+        for vo in self.VO_CANDIDATES.get(self.platform_type, ['gpu']):
+            for clip in playable:
+                self._measure(clip, {'hwdec': render_hwdec, 'vd-lavc-threads': t, 'vo': vo}, untimed=False)
         
-        # === Error retry (как в Android) ===
-        self.error_retry_count: int = 0
-        self.max_retry_attempts: int = 3
+        rendered = [r for r in self.results if r['vo'] != 'null']
+        vo = min(self.VO_CANDIDATES.get(self.platform_type, ['gpu']),
+                 key=lambda candidate: self._render_score(rendered, candidate))
+        drops, _ = self._render_score(rendered, vo)
+        if drops > self.MAX_DROP_RATIO:
+            print(f"[Calibrate] ⚠️ Ни один vo не выводит без пропусков (лучший {vo}: {drops:.1%})")
+        print(f"[Calibrate] 🏆 Вывод: vo={vo}")
         
-        # === Флаг первого запуска (как в Android) ===
-        self.is_first_launch: bool = True
+        profile = {
+            'key': DeviceDetector.host_key(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'platform': self.platform_type,
+            'params': {'hwdec': render_hwdec, 'vo': vo, 'vd-lavc-threads': t},
+            'hwdec_codecs': sorted({r['codec'] for r in decode if r['hwdec'] == hwdec and r['hw']}),
+            'software_max': self._software_max(decode, t),
+            'results': self.results,
+        }
+        path = os.path.join(self.directory, 'calibration.json')
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(profile, f, indent=2)
+        os.replace(path + '.tmp', path)
+        print(f"[Calibrate] 💾 Профиль: {path}")
+        return profile
+    
+    def _clips(self) -> List[Dict[str, Any]]:
+        """Тестовые ролики: сгенерированные ffmpeg или уже лежащие в каталоге"""
+        os.makedirs(self.clips_dir, exist_ok=True)
+        ffmpeg = shutil.which('ffmpeg')
+        clips = []
+        for codec, (encoder, encoder_args, container) in self.CODECS.items():
+            for size, (width, height) in self.SIZES.items():
+                path = os.path.join(self.clips_dir, f'{codec}-{size}.{container}')
+                if not os.path.exists(path) and ffmpeg:
+                    print(f"[Calibrate] 🎞️ Генерация {os.path.basename(path)}...")
+                    try:
+                        subprocess.run(
+                            [ffmpeg, '-y', '-v', 'error', '-f', 'lavfi',
+                             '-i', f'testsrc2=size={width}x{height}:rate={self.CLIP_FPS}',
+                             '-t', str(self.CLIP_SECONDS), '-pix_fmt', 'yuv420p', '-c:v', encoder,
+                             *encoder_args, path + '.part.' + container],
+                            check=True, timeout=300, stdout=subprocess.DEVNULL
+                        )
+                        os.replace(path + '.part.' + container, path)
+                    except (OSError, subprocess.SubprocessError):
+                        print(f"[Calibrate] ⚠️ {codec} {size}: кодер {encoder} недоступен")
+                if os.path.exists(path):
+                    clips.append({'path': path, 'codec': codec, 'size': size, 'pixels': width * height})
+        return clips
+    
+    def _measure(self, clip: Dict[str, Any], options: Dict[str, Any], untimed: bool):
+        """Один прогон ролика: скорость, пропуски кадров, CPU% и фактический hwdec"""
+        result = self._play(clip['path'], options, untimed)
+        label = f"{clip['codec']} {clip['size']} " + ' '.join(f'{k}={v}' for k, v in options.items())
+        if result is None:
+            print(f"[Calibrate] ❌ {label}: не воспроизводится")
+            return
+        result.update(codec=clip['codec'], size=clip['size'], pixels=clip['pixels'],
+                      hwdec=options['hwdec'], threads=options['vd-lavc-threads'], vo=options['vo'])
+        self.results.append(result)
+        print(f"[Calibrate] {'⚡' if result['hw'] else '🧮'} {label}: {result['fps']:.0f} fps, "
+              f"пропуски {result['drops']}, CPU {result['cpu_pct']:.0f}%")
+    
+    def _play(self, path: str, options: Dict[str, Any], untimed: bool) -> Optional[Dict[str, Any]]:
+        ipc_socket = os.path.join(self.clips_dir, 'calibrate.sock')
+        if os.path.exists(ipc_socket):
+            os.unlink(ipc_socket)
+        cmd = ['mpv', '--no-config', '--idle=no', '--keep-open=yes', '--no-audio', '--really-quiet',
+               f'--input-ipc-server={ipc_socket}'] + [f'--{k}={v}' for k, v in options.items()]
+        if untimed:
+            cmd.append('--untimed')
+        process = subprocess.Popen(cmd + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=self.env)
+        ipc = MPVIPC(ipc_socket)
         
-        # Удаляем старый socket если есть
-        if os.path.exists(self.ipc_socket):
-            os.unlink(self.ipc_socket)
+        def get(name):
+            return (ipc.command('get_property', name, timeout=2.0) or {}).get('data')
         
-        # === УМНОЕ ОПРЕДЕЛЕНИЕ ПЛАТФОРМЫ И ПАРАМЕТРОВ ===
-        platform_type = DeviceDetector.detect_platform()
-        mpv_version = DeviceDetector.get_mpv_version()
-        optimal_params = DeviceDetector.get_optimal_params(platform_type, mpv_version)
+        try:
+            if not ipc.connect(timeout=5.0):
+                return None
+            started = finished = None
+            deadline = time.time() + self.CLIP_SECONDS * 10
+            while time.time() < deadline and process.poll() is None:
+                if started is None and get('time-pos') is not None:
+                    started = time.time()
+                if get('eof-reached') is True:
+                    finished = time.time()
+                    break
+                time.sleep(0.02)
+            if started is None or finished is None:
+                return None  # Не открылся, упал или не успел за отведенное время
+            
+            elapsed = max(finished - started, 0.001)
+            drops = sum(get(name) or 0 for name in
+                        ('frame-drop-count', 'decoder-frame-drop-count', 'vo-delayed-frame-count'))
+            hwdec_current = get('hwdec-current')
+            with open(f'/proc/{process.pid}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+            return {
+                'fps': self.CLIP_SECONDS * self.CLIP_FPS / elapsed,
+                'drops': drops,
+                'cpu_pct': cpu_seconds / elapsed * 100,
+                'hw': hwdec_current not in (None, '', 'no'),
+            }
+        except (OSError, ValueError, IndexError):
+            return None
+        finally:
+            ipc.command('quit', wait=False)
+            ipc.close()
+            try:
+                process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    
+    def _runs(self, results: List[Dict[str, Any]], clip: Dict[str, Any], hwdec: str, threads: int) -> list:
+        return [r for r in results if r['codec'] == clip['codec'] and r['size'] == clip['size']
+                and r['hwdec'] == hwdec and r['threads'] == threads]
+    
+    def _realtime(self, results: List[Dict[str, Any]], clip: Dict[str, Any], hwdec: str, threads: int) -> bool:
+        return any(r['fps'] >= self.CLIP_FPS * self.REALTIME_MARGIN
+                   for r in self._runs(results, clip, hwdec, threads))
+    
+    def _decode_score(self, results: List[Dict[str, Any]], hwdec: str, threads: int) -> tuple:
+        """Больше пикселей в реальном времени, затем меньше CPU (hwdec без hw-кадров не считается)"""
+        runs = [r for r in results if r['hwdec'] == hwdec and r['threads'] == threads
+                and (r['hw'] or hwdec == 'no')]
+        realtime = sum(r['pixels'] for r in runs if r['fps'] >= self.CLIP_FPS * self.REALTIME_MARGIN)
+        cpu = sum(r['cpu_pct'] for r in runs) / len(runs) if runs else float('inf')
+        return realtime, -cpu
+    
+    def _render_score(self, results: List[Dict[str, Any]], vo: str) -> tuple:
+        """(доля пропущенных кадров, CPU%) по роликам через vo; не открылся - худший"""
+        runs = [r for r in results if r['vo'] == vo]
+        if not runs:
+            return float('inf'), float('inf')
+        frames = len(runs) * self.CLIP_SECONDS * self.CLIP_FPS
+        return sum(r['drops'] for r in runs) / frames, sum(r['cpu_pct'] for r in runs) / len(runs)
+    
+    def _software_max(self, results: List[Dict[str, Any]], threads: int) -> Optional[List[int]]:
+        """Наибольшее разрешение, которое CPU декодирует в реальном времени во всех кодеках"""
+        best = None
+        for size, (width, height) in self.SIZES.items():
+            runs = [r for r in results if r['size'] == size and r['hwdec'] == 'no' and r['threads'] == threads]
+            if runs and all(r['fps'] >= self.CLIP_FPS * self.REALTIME_MARGIN for r in runs):
+                best = [width, height]
+        return best
+
+class MPVIPC:
+    """
+    Постоянное IPC соединение с MPV (одно на весь процесс)
+    
+    Reader поток читает сокет буферами, разбирает JSON построчно и
+    раздает ответы ожидающим вызовам по request_id. События MPV
+    (строки без request_id) ответами не считаются - они уходят в
+    отдельный dispatcher поток, чтобы обработчики могли сами слать команды.
+    """
+    
+    RECV_SIZE = 65536
+    
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.connected = False
         
-        # Создаем команду MPV
-        mpv_cmd = ['mpv'] + optimal_params + [f'--input-ipc-server={self.ipc_socket}']
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        self._next_request_id = 0
+        self._closed = False
         
-        if fullscreen:
-            mpv_cmd.append('--fullscreen')
-        # DISPLAY передается через environment
+        # События MPV и observe_property (переживают переподключение)
+        self._event_handlers: List = []
+        self._events: queue.Queue = queue.Queue()
+        self._dispatcher_started = False
+        self._observed: Dict[int, str] = {}
         
-        print(f"[MPV] 🎬 Запуск MPV процесса...")
-        print(f"[MPV] 📝 Команда: {' '.join(mpv_cmd[:5])}...")
+        # Подряд неотвеченные команды - признак зависания MPV
+        self.consecutive_timeouts = 0
+    
+    def connect(self, timeout: float = 5.0) -> bool:
+        """Подключение к IPC socket (с повтором пока MPV не начнет слушать)"""
+        with self._connect_lock:
+            if self.connected:
+                return True
+            
+            deadline = time.time() + timeout
+            while not self._closed:
+                try:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.socket_path)
+                    break
+                except OSError:
+                    sock.close()
+                    if time.time() >= deadline:
+                        return False
+                    time.sleep(0.05)
+            else:
+                return False
+            
+            self._sock = sock
+            self.connected = True
+            threading.Thread(target=self._reader_loop, args=(sock,), daemon=True).start()
+            
+            # Наблюдения привязаны к соединению - восстанавливаем их
+            for observe_id, name in self._observed.items():
+                self.command('observe_property', observe_id, name, wait=False)
+            return True
+    
+    def add_event_handler(self, handler):
+        """Подписка на события MPV (handler(event_dict) вызывается из dispatcher потока)"""
+        self._event_handlers.append(handler)
+        if not self._dispatcher_started:
+            self._dispatcher_started = True
+            threading.Thread(target=self._dispatch_events, daemon=True).start()
+    
+    def observe_property(self, observe_id: int, name: str) -> Optional[Dict[str, Any]]:
+        """observe_property: MPV сам присылает property-change при изменении"""
+        self._observed[observe_id] = name
+        return self.command('observe_property', observe_id, name)
+    
+    def close(self):
+        """Закрытие соединения (ожидающие вызовы получают None, dispatcher поток завершается)"""
+        self._closed = True
+        self._drop_connection(self._sock)
+        self._events.put(None)
+    
+    def command(self, *args, wait: bool = True, timeout: float = 10.0) -> Optional[Dict[str, Any]]:
+        """
+        Отправка команды в MPV
+        wait=True - ждем ответ с нашим request_id, wait=False - fire and forget
+        """
+        if not self.connected:
+            return None  # MPV перезапускается - не ждем; переподключает только монитор
         
-        # КРИТИЧНО: Запускаем с STDOUT тоже для полной отладки
-        self.mpv_process = subprocess.Popen(
-            mpv_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,  # Объединяем stderr в stdout
-            env={**os.environ, 'DISPLAY': display}
-        )
+        with self._pending_lock:
+            self._next_request_id += 1
+            request_id = self._next_request_id
+            waiter = None
+            if wait:
+                waiter = {'event': threading.Event(), 'response': None}
+                self._pending[request_id] = waiter
+        
+        payload = (json.dumps({'command': list(args), 'request_id': request_id}) + '\n').encode()
+        sock = self._sock
+        
+        try:
+            with self._send_lock:
+                sock.sendall(payload)
+        except (OSError, AttributeError) as e:
+            print(f"[IPC] ⚠️ Ошибка отправки: {e}")
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            self._drop_connection(sock)
+            return None
+        
+        if waiter is None:
+            return None
+        
+        if not waiter['event'].wait(timeout):
+            # Timeout не критичен - команда может уже выполниться
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            self.consecutive_timeouts += 1
+            return None
         
-        print(f"[MPV] ⏳ Ожидание создания IPC socket: {self.ipc_socket}")
+        return waiter['response']
+    
+    def _reader_loop(self, sock: socket.socket):
+        """Чтение ответов и событий MPV (буферами, а не по байту)"""
+        buffer = b''
         
-        # Ждем создания IPC socket (увеличен таймаут до 10 секунд для Raspberry Pi)
-        for i in range(100):  # 100 * 0.1 = 10 секунд
-            if os.path.exists(self.ipc_socket):
-                print(f"[MPV] ✅ Socket создан за {i * 0.1:.1f} сек")
+        while True:
+            try:
+                chunk = sock.recv(self.RECV_SIZE)
+            except OSError:
+                break
+            if not chunk:
                 break
             
-            # Проверяем не завершился ли MPV с ошибкой
-            if self.mpv_process.poll() is not None:
-                print(f"[MPV] ❌ MPV процесс завершился с кодом: {self.mpv_process.returncode}")
-                
-                # Читаем весь вывод
-                output = self.mpv_process.stdout.read().decode('utf-8', errors='ignore')
-                if output:
-                    print(f"[MPV] 📛 Вывод MPV:")
-                    print("=" * 60)
-                    print(output)
-                    print("=" * 60)
-                else:
-                    print(f"[MPV] 📛 Нет вывода от MPV")
-                
-                print(f"[MPV] 💡 Попробуйте запустить MPV вручную:")
-                print(f"[MPV] 💡   mpv --idle=yes --force-window=yes --input-ipc-server=/tmp/test.sock")
-                sys.exit(1)
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
             
-            time.sleep(0.1)
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line.decode('utf-8', errors='ignore'))
+                except json.JSONDecodeError as e:
+                    print(f"[IPC] ⚠️ JSON parse error: {e}")
+                    continue
+                
+                self._dispatch(message)
         
-        if not os.path.exists(self.ipc_socket):
-            print(f"[MPV] ❌ IPC socket не создан за 10 секунд: {self.ipc_socket}")
-            print(f"[MPV] 🔍 Проверка MPV процесса...")
-            
-            # Пытаемся получить вывод
-            if self.mpv_process.poll() is None:
-                print(f"[MPV] ℹ️ MPV процесс еще работает (PID: {self.mpv_process.pid})")
-                print(f"[MPV] 💡 Попробуйте запустить вручную для отладки:")
-                print(f"[MPV] 💡   mpv --idle=yes --input-ipc-server=/tmp/test.sock")
-            else:
-                output = self.mpv_process.stdout.read().decode('utf-8', errors='ignore')
-                print(f"[MPV] 📛 MPV завершился. Вывод:")
-                print("=" * 60)
-                print(output if output else "(пусто)")
-                print("=" * 60)
-            
-            sys.exit(1)
+        self._drop_connection(sock)
+    
+    def _dispatch(self, message: Dict[str, Any]):
+        """Маршрутизация сообщения: ответ -> ожидающему вызову, событие -> dispatcher"""
+        self.consecutive_timeouts = 0
         
-        print(f"[MPV] ✅ MPV запущен (PID: {self.mpv_process.pid})")
-        self._check_hardware_acceleration()
+        if 'event' in message:
+            if self._event_handlers:
+                self._events.put(message)
+            return
         
-        # Socket.IO клиент
-        self.sio = socketio.Client(
-            reconnection=True,
-            reconnection_attempts=0,
-            reconnection_delay=2,
-            reconnection_delay_max=10
-        )
+        request_id = message.get('request_id')
+        if request_id is None:
+            return
         
-        # Setup
-        self._setup_socket_events()
-        self._setup_signal_handlers()
-        self._setup_mpv_monitor()
+        with self._pending_lock:
+            waiter = self._pending.pop(request_id, None)
+        
+        if waiter is not None:
+            waiter['response'] = message
+            waiter['event'].set()
     
-    def _check_hardware_acceleration(self):
-        """Проверка аппаратного декодирования"""
-        time.sleep(1.0)  # Увеличено для старых MPV
-        try:
-            result = self.send_command('get_property', 'hwdec-current')
-            if result and result.get('error') == 'success':
-                hwdec = result.get('data', 'no')
-                if hwdec and hwdec != 'no':
-                    print(f"[MPV] ✅ Аппаратное ускорение: {hwdec}")
-                else:
-                    print(f"[MPV] ⚠️ CPU декодинг (установите VAAPI/VDPAU)")
-            else:
-                print(f"[MPV] ℹ️ Hwdec статус: недоступен (старая версия MPV)")
-        except Exception as e:
-            print(f"[MPV] ℹ️ Не удалось проверить hwdec: {e}")
+    def _dispatch_events(self):
+        """Dispatcher поток: события MPV по порядку всем подписчикам"""
+        while True:
+            event = self._events.get()
+            if event is None:
+                return  # close()
+            for handler in self._event_handlers:
+                try:
+                    handler(event)
+                except Exception as e:
+                    print(f"[IPC] ⚠️ Event handler error: {e}")
+    
+    def _drop_connection(self, sock: Optional[socket.socket]):
+        """Сброс соединения и освобождение всех ожидающих"""
+        with self._pending_lock:
+            if sock is not self._sock:
+                return
+            self._sock = None
+            self.connected = False
+            pending = list(self._pending.values())
+            self._pending.clear()
+        
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        
+        for waiter in pending:
+            waiter['event'].set()
+
+class AsyncMPVIPC:
+    """
+    IPC соединение с MPV для asyncio режима (--asyncio)
+    
+    Тот же протокол что у MPVIPC, но без потоков: reader - задача
+    event loop, ответы раздаются future по request_id, события MPV
+    вызывают обработчики прямо в loop (они не должны блокировать).
+    """
+    
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.connected = False
+        
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_request_id = 0
+        self._closed = False
+        
+        self._event_handlers: List = []
+        self._observed: Dict[int, str] = {}
+        
+        # Подряд неотвеченные команды - признак зависания MPV
+        self.consecutive_timeouts = 0
+    
+    async def connect(self, timeout: float = 5.0) -> bool:
+        """Подключение к IPC socket (с повтором пока MPV не начнет слушать)"""
+        if self.connected:
+            return True
+        
+        deadline = time.time() + timeout
+        while not self._closed:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(
+                    self.socket_path, limit=MPVIPC.RECV_SIZE * 16
+                )
+                break
+            except OSError:
+                if time.time() >= deadline:
+                    return False
+                await asyncio.sleep(0.05)
+        else:
+            return False
+        
+        self.connected = True
+        self._reader_task = asyncio.get_running_loop().create_task(self._reader_loop(self._writer))
+        
+        # Наблюдения привязаны к соединению - восстанавливаем их
+        for observe_id, name in self._observed.items():
+            await self.command('observe_property', observe_id, name, wait=False)
+        return True
+    
+    def add_event_handler(self, handler):
+        """Подписка на события MPV (handler(event_dict) вызывается в event loop)"""
+        self._event_handlers.append(handler)
     
-    def send_command(self, command, *args) -> Optional[Dict[str, Any]]:
-        """Отправка команды в MPV через IPC"""
+    async def observe_property(self, observe_id: int, name: str) -> Optional[Dict[str, Any]]:
+        """observe_property: MPV сам присылает property-change при изменении"""
+        self._observed[observe_id] = name
+        return await self.command('observe_property', observe_id, name)
+    
+    def close(self):
+        """Закрытие соединения (ожидающие вызовы получают None)"""
+        self._closed = True
+        self._drop_connection(self._writer)
+    
+    async def command(self, *args, wait: bool = True, timeout: float = 10.0) -> Optional[Dict[str, Any]]:
+        """
+        Отправка команды в MPV
+        wait=True - ждем ответ с нашим request_id, wait=False - fire and forget
+        """
+        if not self.connected:
+            return None  # MPV перезапускается - не ждем; переподключает только монитор
+        
+        self._next_request_id += 1
+        request_id = self._next_request_id
+        future = None
+        if wait:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+        
+        writer = self._writer
         try:
-            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            sock.settimeout(10)  # Увеличен до 10 сек для старых MPV
-            sock.connect(self.ipc_socket)
-            
-            cmd = {"command": [command] + list(args)}
-            sock.send((json.dumps(cmd) + '\n').encode())
-            
-            # КРИТИЧНО: Читаем только ПЕРВУЮ строку JSON (MPV может отправить несколько событий)
-            response_bytes = b''
-            while True:
-                chunk = sock.recv(1)
-                if not chunk or chunk == b'\n':
-                    break
-                response_bytes += chunk
-            
-            sock.close()
-            
-            if response_bytes:
-                response = response_bytes.decode('utf-8', errors='ignore').strip()
-                return json.loads(response)
+            writer.write((json.dumps({'command': list(args), 'request_id': request_id}) + '\n').encode())
+            await writer.drain()
+        except (OSError, AttributeError) as e:
+            print(f"[IPC] ⚠️ Ошибка отправки: {e}")
+            self._pending.pop(request_id, None)
+            self._drop_connection(writer)
             return None
-            
-        except json.JSONDecodeError as e:
-            print(f"[MPV] ⚠️ JSON parse error: {e}")
+        
+        if future is None:
             return None
-        except socket.timeout:
+        
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
             # Timeout не критичен - команда может уже выполниться
+            self._pending.pop(request_id, None)
+            self.consecutive_timeouts += 1
             return None
-        except Exception as e:
-            print(f"[MPV] ⚠️ IPC error: {e}")
+    
+    async def _reader_loop(self, writer: asyncio.StreamWriter):
+        """Чтение ответов и событий MPV построчно"""
+        reader = self._reader
+        while True:
+            try:
+                line = await reader.readline()
+            except (OSError, ValueError):
+                break
+            if not line:
+                break
+            if not line.strip():
+                continue
+            
+            try:
+                message = json.loads(line.decode('utf-8', errors='ignore'))
+            except json.JSONDecodeError as e:
+                print(f"[IPC] ⚠️ JSON parse error: {e}")
+                continue
+            
+            self._dispatch(message)
+        
+        self._drop_connection(writer)
+    
+    def _dispatch(self, message: Dict[str, Any]):
+        """Маршрутизация сообщения: ответ -> ожидающему future, событие -> обработчикам"""
+        self.consecutive_timeouts = 0
+        
+        if 'event' in message:
+            for handler in self._event_handlers:
+                try:
+                    handler(message)
+                except Exception as e:
+                    print(f"[IPC] ⚠️ Event handler error: {e}")
+            return
+        
+        future = self._pending.pop(message.get('request_id'), None)
+        if future is not None and not future.done():
+            future.set_result(message)
+    
+    def _drop_connection(self, writer: Optional[asyncio.StreamWriter]):
+        """Сброс соединения и освобождение всех ожидающих"""
+        if writer is None or writer is not self._writer:
+            return
+        self._writer = None
+        self._reader = None
+        self.connected = False
+        
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_result(None)
+        
+        try:
+            writer.close()
+        except OSError:
+            pass
+
+class HttpClient:
+    """
+    Общий HTTP слой клиента (все запросы к серверу)
+    
+    Один requests.Session с пулом keep-alive соединений, лимит одновременных
+    запросов на хост, таймауты и повторы в одном месте. Фоновые запросы
+    (предзагрузка, ревалидация) выполняет ограниченный пул потоков с
+    очередью: при переполнении задача отбрасывается, а не плодит потоки.
+    """
+    
+    TIMEOUT = (5, 15)  # (connect, read)
+    RETRIES = 2
+    
+    def __init__(self, per_host: int = 4, workers: int = 4, queue_size: int = 32, pool_size: int = 16):
+        self.per_host = per_host
+        self.pool_size = pool_size
+        
+        retry = Retry(
+            total=self.RETRIES, read=0, backoff_factor=0.3,
+            status_forcelist=(502, 503, 504), allowed_methods=frozenset({'GET', 'HEAD'}),
+            raise_on_status=False
+        )
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, url: str, timeout=None, **kwargs) -> requests.Response:
+        """GET через общий пул (stream=True - лимит хоста только до заголовков)"""
+        with self._host_limit(url):
+            return self.session.get(url, timeout=timeout or self.TIMEOUT, **kwargs)
+    
+    def head(self, url: str, timeout=None, **kwargs) -> requests.Response:
+        with self._host_limit(url):
+            return self.session.head(url, timeout=timeout or self.TIMEOUT, **kwargs)
+    
+    def submit(self, fn, *args) -> Optional[Future]:
+        """Фоновая задача в ограниченном пуле; None - очередь переполнена"""
+        if not self._slots.acquire(blocking=False):
+            print(f"[HTTP] ⚠️ Очередь фоновых запросов переполнена - {getattr(fn, '__name__', fn)} пропущен")
+            return None
+        
+        def run():
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[HTTP] ⚠️ {getattr(fn, '__name__', fn)}: {e}")
+            finally:
+                self._slots.release()
+        return self.executor.submit(run)
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+    
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+class SlideCache:
+    """
+    Локальный кэш страниц PDF/PPTX и изображений папок (LRU по размеру)
+    
+    Предзагрузка кладет байты страниц на диск, loadfile указывает на
+    локальную копию - перелистывание не ходит в сеть.
+    """
+    
+    CONTENT_EXTENSIONS = {
+        'image/png': '.png',
+        'image/jpeg': '.jpg',
+        'image/gif': '.gif',
+        'image/webp': '.webp',
+    }
+    
+    def __init__(self, directory: str, max_bytes: int, http: HttpClient):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.http = http
+        self.total_bytes = 0
+        
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # url -> (path, size)
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        
+        # Страницы живут только в пределах процесса - начинаем с чистого каталога
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def get(self, url: str) -> Optional[str]:
+        """Путь к локальной копии страницы (или None)"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            self._entries.move_to_end(url)
+            return entry[0]
+    
+    def fetch(self, url: str, timeout: float = 10.0) -> Optional[int]:
+        """
+        Скачивание страницы в кэш
+        Возвращает HTTP статус (None - сетевая ошибка или уже в кэше/загрузке)
+        """
+        with self._lock:
+            if url in self._entries or url in self._in_flight:
+                return None
+            self._in_flight.add(url)
+        
+        try:
+            response = self.http.get(url, timeout=timeout)
+            if response.status_code == 200:
+                self._store(url, response.headers.get('Content-Type', ''), response.content)
+            return response.status_code
+        except requests.RequestException:
             return None
+        finally:
+            with self._lock:
+                self._in_flight.discard(url)
+    
+    async def fetch_async(self, session, url: str, timeout: float = 10.0) -> Optional[int]:
+        """fetch() для asyncio режима (aiohttp сессия, отменяется вместе с задачей)"""
+        with self._lock:
+            if url in self._entries or url in self._in_flight:
+                return None
+            self._in_flight.add(url)
+        
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 200:
+                    self._store(url, response.headers.get('Content-Type', ''), await response.read())
+                return response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+        finally:
+            with self._lock:
+                self._in_flight.discard(url)
+    
+    def _store(self, url: str, content_type: str, content: bytes):
+        """Запись страницы на диск и в индекс"""
+        ext = self.CONTENT_EXTENSIONS.get(content_type.split(';')[0].strip(), '')
+        path = os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + ext)
+        
+        # Атомарно: MPV никогда не увидит недописанный файл
+        tmp_path = path + '.part'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        
+        self._add(url, path, len(content))
+    
+    def clear(self):
+        """Сброс кэша (страницы могли устареть после переконвертации)"""
+        with self._lock:
+            paths = [path for path, _ in self._entries.values()]
+            self._entries.clear()
+            self.total_bytes = 0
+        
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+    
+    def _add(self, url: str, path: str, size: int):
+        """Добавление записи и вытеснение самых старых при превышении бюджета"""
+        evicted = []
+        with self._lock:
+            self._entries[url] = (path, size)
+            self.total_bytes += size
+            
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (old_path, old_size) = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(old_path)
+        
+        for old_path in evicted:
+            try:
+                os.unlink(old_path)
+            except OSError:
+                pass
+    
+class _Segment:
+    """Диапазон байт [start, end] одной загрузки"""
+    
+    __slots__ = ('start', 'end', 'done', 'active')
+    
+    def __init__(self, start: int, end: int, done: int = 0):
+        self.start = start
+        self.end = end
+        self.done = done
+        self.active = False
+    
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+    
+    @property
+    def complete(self) -> bool:
+        return self.done >= self.length
+
+class DownloadJob:
+    """
+    Одна загрузка: сегменты, прогресс, статистика
+    Читатели (tee-прокси кэша) ждут на cond и читают уже скачанные байты
+    """
+    
+    def __init__(self, url: str, path: str, version: Optional[str] = None):
+        self.url = url
+        self.path = path
+        self.version = version
+        
+        self.total: Optional[int] = None
+        self.content_type = 'application/octet-stream'
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.segments: List[_Segment] = []
+        self.ranges = False
+        self.throttle = None  # throttle(n) на каждые n байт; можно снять на ходу
+        
+        self.done = False
+        self.succeeded = False
+        self.failed = False
+        self.rejected = False  # Отклонена через accept() после пробы
+        self.cancelled = False
+        
+        self.started = time.time()
+        self.finished_at: Optional[float] = None
+        self.bytes_fetched = 0  # Только эта сессия (без докачанного ранее)
+        self.connection_stats: Dict[int, List[float]] = {}  # сегмент -> [байт, секунд]
+        
+        self.cond = threading.Condition()
+        self.headers_ready = threading.Event()
+        self.finished = threading.Event()
+    
+    def available_until(self, position: int) -> int:
+        """Граница (не включительно) непрерывно скачанных байт начиная с position"""
+        for index, segment in enumerate(self.segments):
+            if segment.start <= position <= segment.end:
+                limit = segment.start + segment.done
+                for following in self.segments[index + 1:]:
+                    if limit <= segment.end or not following.done:
+                        break
+                    segment = following
+                    limit = following.start + following.done
+                return limit
+        return position
+    
+    def is_active_at(self, position: int) -> bool:
+        """Сегмент с этой позицией качается или уже скачан"""
+        for segment in self.segments:
+            if segment.start <= position <= segment.end:
+                return segment.active or segment.complete
+        return False
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Пропускная способность: общая и на соединение (LAN или сервер - узкое место)"""
+        elapsed = max((self.finished_at or time.time()) - self.started, 0.001)
+        per_connection = [b / max(s, 0.001) for b, s in self.connection_stats.values() if s > 0]
+        downloaded = sum(segment.done for segment in self.segments)
+        return {
+            'url': self.url,
+            'total': self.total,
+            'downloaded': downloaded,
+            'progress': downloaded / self.total if self.total else None,
+            'rate': self.bytes_fetched / elapsed,
+            'connections': sum(1 for segment in self.segments if segment.active),
+            'per_connection_rate': sum(per_connection) / len(per_connection) if per_connection else 0.0,
+        }
+
+class SegmentedDownloader:
+    """
+    Многопоточный загрузчик больших файлов по HTTP Range
+    
+    Файл режется на сегменты, которые качаются пулом keep-alive соединений
+    прямо в заранее выделенный (sparse) файл через pwrite - без промежуточных
+    буферов на весь файл. Сегменты всех загрузок выполняет один пул потоков
+    размером с пул соединений сессии (не больше connections на загрузку).
+    Прогресс сегментов хранится рядом (.json), после сбоя или перезапуска
+    докачиваются только недостающие части.
+    """
+    
+    SEGMENT_SIZE = 16 * 1024 * 1024
+    MIN_SEGMENTED_SIZE = 32 * 1024 * 1024  # Меньшие файлы - одним соединением
+    READ_SIZE = 256 * 1024
+    SEGMENT_RETRIES = 5
+    STATE_SAVE_INTERVAL = 2.0
+    PROGRESS_LOG_INTERVAL = 10.0
+    
+    def __init__(self, http: HttpClient, connections: int = 4):
+        self.connections = max(1, connections)
+        
+        # Общий пул соединений; длинные потоки сегментов не занимают лимит хоста
+        self.http = http
+        self.session = http.session
+        self.executor = ThreadPoolExecutor(max_workers=http.pool_size, thread_name_prefix='segment')
+        
+        self._jobs: List[DownloadJob] = []
+        self._lock = threading.Lock()
+    
+    def start(self, url: str, path: str, version: Optional[str] = None,
+              accept=None, throttle=None, on_finish=None) -> DownloadJob:
+        """
+        Фоновая загрузка url в path
+        accept(job) после пробы может отказаться от загрузки (например, размер)
+        throttle(n) вызывается на каждые n байт (ограничение скорости)
+        """
+        job = DownloadJob(url, path, version)
+        job.throttle = throttle
+        with self._lock:
+            self._jobs.append(job)
+        threading.Thread(target=self._run, args=(job, accept, on_finish), daemon=True).start()
+        return job
+    
+    def download(self, url: str, path: str, version: Optional[str] = None, throttle=None) -> DownloadJob:
+        """Блокирующая загрузка (для фоновых синхронизаций)"""
+        job = self.start(url, path, version=version, throttle=throttle)
+        job.finished.wait()
+        return job
+    
+    def active_stats(self) -> List[Dict[str, Any]]:
+        """Снимок активных загрузок для мониторинга"""
+        with self._lock:
+            return [job.stats() for job in self._jobs]
+    
+    def shutdown(self):
+        """Остановка: загрузки прерываются (прогресс сегментов сохранен), пул не держит выход"""
+        with self._lock:
+            for job in self._jobs:
+                job.cancel()
+        self.executor.shutdown(wait=False)
+    
+    def _run(self, job: DownloadJob, accept, on_finish):
+        state_path = job.path + '.json'
+        try:
+            if not self._probe(job):
+                return
+            if accept is not None and not accept(job):
+                job.rejected = True
+                return
+            
+            self._restore_state(job, state_path)
+            fd = os.open(job.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if job.total is not None:
+                    os.ftruncate(fd, job.total)  # Sparse: место выделяется по мере записи
+                self._fetch_segments(job, fd, state_path)
+            finally:
+                os.close(fd)
+            
+            if job.cancelled:
+                return
+            if not all(segment.complete for segment in job.segments):
+                raise IOError('segments incomplete')
+            
+            try:
+                os.unlink(state_path)
+            except OSError:
+                pass
+            
+            job.succeeded = True
+            stats = job.stats()
+            if job.total and job.total >= self.MIN_SEGMENTED_SIZE:
+                print(f"[Download] ✅ {os.path.basename(job.path)}: {job.total / 1024 / 1024:.0f} MB, "
+                      f"{stats['rate'] / 1024 / 1024:.1f} MB/s "
+                      f"({len(job.connection_stats)} сегм., ~{stats['per_connection_rate'] / 1024 / 1024:.1f} MB/s на соединение)")
+        
+        except (requests.RequestException, IOError, OSError) as e:
+            print(f"[Download] ❌ {job.url}: {e}")
+            with job.cond:
+                job.failed = True
+                job.cond.notify_all()
+        
+        finally:
+            job.finished_at = time.time()
+            job.headers_ready.set()
+            with job.cond:
+                job.done = True
+                job.cond.notify_all()
+            job.finished.set()
+            with self._lock:
+                if job in self._jobs:
+                    self._jobs.remove(job)
+            if on_finish is not None:
+                on_finish(job)
+    
+    def _probe(self, job: DownloadJob) -> bool:
+        """Размер, валидаторы и поддержка Range одним запросом bytes=0-0"""
+        with self.session.get(job.url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.http.TIMEOUT) as response:
+            if response.status_code not in (200, 206):
+                raise IOError(f'HTTP {response.status_code}')
+            
+            job.content_type = response.headers.get('Content-Type', job.content_type)
+            job.etag = response.headers.get('ETag')
+            job.last_modified = response.headers.get('Last-Modified')
+            
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code == 206 and '/' in content_range and content_range.split('/')[1].isdigit():
+                job.total = int(content_range.split('/')[1])
+                ranges = True
+            else:
+                length = response.headers.get('Content-Length')
+                job.total = int(length) if length and length.isdigit() else None
+                ranges = False
+        
+        if job.total is None or not ranges or job.total < self.MIN_SEGMENTED_SIZE:
+            # Без Range или маленький файл - один сегмент (докачка - только если есть Range)
+            end = job.total - 1 if job.total is not None else 2 ** 62
+            job.segments = [_Segment(0, end)]
+            job.ranges = ranges
+        else:
+            job.ranges = True
+            job.segments = [
+                _Segment(start, min(start + self.SEGMENT_SIZE, job.total) - 1)
+                for start in range(0, job.total, self.SEGMENT_SIZE)
+            ]
+        
+        job.headers_ready.set()
+        return True
+    
+    def _restore_state(self, job: DownloadJob, state_path: str):
+        """Прогресс сегментов от прошлой попытки - если файл на сервере тот же"""
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        
+        same_file = (
+            state.get('url') == job.url
+            and state.get('total') == job.total
+            and state.get('version') == job.version
+            and state.get('etag') == job.etag
+            and state.get('last_modified') == job.last_modified
+            and os.path.exists(job.path)
+        )
+        if not same_file or not job.ranges:
+            return
+        
+        segments = [_Segment(start, end, done) for start, end, done in state.get('segments', [])]
+        if segments:
+            job.segments = segments
+            restored = sum(segment.done for segment in segments)
+            print(f"[Download] ⏯️ {os.path.basename(job.path)}: продолжаем с {restored / 1024 / 1024:.1f} MB")
+    
+    def _save_state(self, job: DownloadJob, state_path: str):
+        try:
+            with open(state_path + '.tmp', 'w') as f:
+                json.dump({
+                    'url': job.url,
+                    'total': job.total,
+                    'version': job.version,
+                    'etag': job.etag,
+                    'last_modified': job.last_modified,
+                    'segments': [[s.start, s.end, s.done] for s in job.segments],
+                }, f)
+            os.replace(state_path + '.tmp', state_path)
+        except OSError:
+            pass
+    
+    def _fetch_segments(self, job: DownloadJob, fd: int, state_path: str):
+        """
+        Сегменты - задачами общего пула: не больше connections одновременно,
+        следующий сегмент (по порядку) ставится в очередь по завершении предыдущего
+        """
+        pending = deque(index for index, segment in enumerate(job.segments) if not segment.complete)
+        errors: List[Exception] = []
+        all_done = threading.Event()
+        running = [0]
+        
+        def start_next() -> bool:
+            """Следующий сегмент в пул; False - сегментов больше нет или загрузка прервана"""
+            with job.cond:
+                if not pending or job.cancelled or errors:
+                    return False
+                index = pending.popleft()
+                running[0] += 1
+            try:
+                self.executor.submit(fetch, index)
+            except RuntimeError:
+                # Пул остановлен (выход клиента) - прогресс сохранен, докачаем после запуска
+                job.cancel()
+                with job.cond:
+                    running[0] -= 1
+                return False
+            return True
+        
+        def fetch(index: int):
+            try:
+                self._fetch_segment(job, index, fd)
+            except (requests.RequestException, IOError, OSError) as e:
+                errors.append(e)
+            finally:
+                start_next()  # Раньше списания: счетчик не обнулится, пока есть сегменты
+                with job.cond:
+                    running[0] -= 1
+                    if running[0] == 0:
+                        all_done.set()
+        
+        for _ in range(self.connections):
+            if not start_next():
+                break
+        with job.cond:
+            if running[0] == 0:
+                all_done.set()
+        
+        last_log = time.time()
+        while not all_done.wait(self.STATE_SAVE_INTERVAL):
+            if job.ranges:
+                self._save_state(job, state_path)
+            if job.total and job.total >= self.MIN_SEGMENTED_SIZE and time.time() - last_log > self.PROGRESS_LOG_INTERVAL:
+                last_log = time.time()
+                stats = job.stats()
+                print(f"[Download] 📶 {os.path.basename(job.path)}: {stats['progress'] * 100:.0f}% "
+                      f"{stats['rate'] / 1024 / 1024:.1f} MB/s, {stats['connections']} соед. "
+                      f"по ~{stats['per_connection_rate'] / 1024 / 1024:.1f} MB/s")
+        
+        if job.ranges:
+            self._save_state(job, state_path)
+        if errors:
+            raise errors[0]
+    
+    def _fetch_segment(self, job: DownloadJob, index: int, fd: int):
+        """Один сегмент: Range запрос, readinto в буфер, pwrite по смещению"""
+        segment = job.segments[index]
+        buffer = bytearray(self.READ_SIZE)
+        view = memoryview(buffer)
+        attempts = 0
+        segment.active = True
+        
+        try:
+            while not segment.complete and not job.cancelled:
+                headers = {}
+                if job.ranges:
+                    headers['Range'] = f'bytes={segment.start + segment.done}-{segment.end}'
+                    validator = job.etag or job.last_modified
+                    if validator:
+                        headers['If-Range'] = validator
+                elif segment.done:
+                    segment.done = 0  # Без Range докачка невозможна - заново
+                
+                started = time.time()
+                try:
+                    with self.session.get(job.url, headers=headers, stream=True, timeout=self.http.TIMEOUT) as response:
+                        if job.ranges and response.status_code != 206:
+                            raise IOError(f'file changed on server: HTTP {response.status_code}')
+                        if response.status_code not in (200, 206):
+                            raise IOError(f'HTTP {response.status_code}')
+                        
+                        while not job.cancelled:
+                            remaining = segment.length - segment.done
+                            if remaining <= 0:
+                                break
+                            count = response.raw.readinto(view[:min(self.READ_SIZE, remaining)])
+                            if not count:
+                                break
+                            os.pwrite(fd, view[:count], segment.start + segment.done)
+                            with job.cond:
+                                segment.done += count
+                                job.bytes_fetched += count
+                                job.cond.notify_all()
+                            
+                            # Время без учета throttle - чистая скорость соединения
+                            stats = job.connection_stats.setdefault(index, [0, 0.0])
+                            stats[0] += count
+                            stats[1] += time.time() - started
+                            
+                            throttle = job.throttle
+                            if throttle is not None:
+                                throttle(count)
+                            started = time.time()
+                    
+                    if job.total is None:
+                        segment.end = segment.start + segment.done - 1  # Размер узнали по концу потока
+                        job.total = segment.done
+                    elif not segment.complete and not job.cancelled:
+                        raise IOError('connection closed early')
+                
+                except (requests.RequestException, IOError) as e:
+                    attempts += 1
+                    if attempts > self.SEGMENT_RETRIES or 'file changed' in str(e):
+                        raise
+                    time.sleep(min(2 ** attempts, 30))
+        finally:
+            segment.active = False
+    
+class ContentStore:
+    """
+    Контентно-адресуемое хранилище медиа (общее для всех устройств бокса)
+    
+    Блобы лежат под ключом содержимого - md5 с сервера + размер (те же
+    признаки, по которым сервер ищет дубликаты). SQLite индекс связывает
+    (device, filename) с ключом: один ролик под разными именами, на разных
+    устройствах и в заглушке качается по сети и лежит на диске один раз.
+    """
+    
+    TMP_MAX_AGE = 24 * 3600  # Брошенные недокачки старше суток удаляются
+    
+    def __init__(self, directory: str, downloader: 'SegmentedDownloader', owner: str = 'client'):
+        self.directory = directory
+        self.owner = owner  # Имя недокачек: процессы разных устройств не пишут в один .part
+        self.blob_dir = os.path.join(directory, 'blobs')
+        self.tmp_dir = os.path.join(directory, 'tmp')
+        self.downloader = downloader
+        
+        self._fetches: Dict[str, DownloadJob] = {}
+        self._listeners: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        
+        # Индекс открыт несколькими процессами (по одному на устройство) - WAL
+        self._db = sqlite3.connect(os.path.join(directory, 'index.db'), timeout=10, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS names (
+                device TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                mirrored INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (device, filename)
+            )''')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                url TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                last_used REAL,
+                checked REAL
+            )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS names_digest ON names (digest)')
+        self._db.commit()
+        
+        self._cleanup_tmp()
+        count, used = self.usage()
+        print(f"[Store] 💾 Хранилище: {count} блобов, {used / 1024 / 1024:.0f} MB")
+    
+    @staticmethod
+    def key_for(md5: Optional[str], size: Optional[int]) -> Optional[str]:
+        """Ключ содержимого по данным сервера (md5 + размер)"""
+        if not md5 or size is None:
+            return None
+        return f"{md5.lower()}-{size}"
+    
+    @staticmethod
+    def url_key(url: str) -> str:
+        """Ключ для файлов без md5 на сервере (без дедупликации)"""
+        return 'url-' + hashlib.sha1(url.encode()).hexdigest()
+    
+    def blob_path(self, key: str) -> str:
+        return os.path.join(self.blob_dir, key[:2], key)
+    
+    # === Индекс имен ===
+    
+    def update_names(self, device: str, listing: List[Dict[str, Any]], mirrored: bool = False):
+        """Сопоставление имен устройства ключам по files-with-status (заменяет прежнее)"""
+        rows = []
+        for item in listing:
+            key = self.key_for(item.get('md5'), item.get('size'))
+            if item.get('safeName') and key:
+                rows.append((device, item['safeName'], key, int(mirrored)))
+        
+        with self._lock:
+            self._db.execute('DELETE FROM names WHERE device = ?', (device,))
+            self._db.executemany('INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)', rows)
+            self._drop_orphans()
+            self._db.commit()
+        
+        shared = len(rows) - len({row[2] for row in rows})
+        if shared:
+            print(f"[Store] 🔗 {device}: {shared} файлов совпадают по содержимому с другими - хранятся один раз")
+    
+    def pin(self, owner: str, keys: List[str]):
+        """
+        Блобы, закрепленные за owner (заглушка): не вытесняются LRU и не
+        считаются сиротами; заменяет прежний набор, освобожденные удаляются
+        """
+        with self._lock:
+            self._db.execute('DELETE FROM names WHERE device = ?', (owner,))
+            self._db.executemany('INSERT OR REPLACE INTO names VALUES (?, ?, ?, 1)', [(owner, key, key) for key in keys])
+            self._drop_orphans()
+            self._db.commit()
+    
+    def _drop_orphans(self):
+        """Блобы, на которые больше не ссылается ни одно имя (под self._lock)"""
+        orphans = self._db.execute('''
+            SELECT digest FROM blobs
+            WHERE digest NOT LIKE 'url-%' AND digest NOT IN (SELECT digest FROM names)
+        ''').fetchall()
+        # Решение и удаление под тем же замком, что и fetch/_on_fetched:
+        # ключ не может начать качаться между проверкой и удалением
+        for (key,) in orphans:
+            if key not in self._fetches:
+                self._drop(key)
+    
+    def digest_for(self, device: str, filename: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT digest FROM names WHERE device = ? AND filename = ?', (device, filename)
+            ).fetchone()
+        return row[0] if row else None
+    
+    # === Блобы ===
+    
+    def path(self, key: str, touch: bool = True) -> Optional[str]:
+        """Путь к готовому блобу (или None); touch - отметка для LRU"""
+        path = self.blob_path(key)
+        with self._lock:
+            row = self._db.execute('SELECT size FROM blobs WHERE digest = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(path):
+                # Файл удален с диска извне
+                self._db.execute('DELETE FROM blobs WHERE digest = ?', (key,))
+                self._db.commit()
+                return None
+            if touch:
+                self._db.execute('UPDATE blobs SET last_used = ? WHERE digest = ?', (time.time(), key))
+                self._db.commit()
+        return path
+    
+    def info(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT size, url, etag, last_modified, last_used, checked FROM blobs WHERE digest = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('size', 'url', 'etag', 'last_modified', 'last_used', 'checked'), row))
+    
+    def mark_checked(self, key: str):
+        with self._lock:
+            self._db.execute('UPDATE blobs SET checked = ? WHERE digest = ?', (time.time(), key))
+            self._db.commit()
+    
+    def fetch(self, key: str, url: str, accept=None, throttle=None, on_finish=None) -> DownloadJob:
+        """
+        Загрузка блоба с сервера
+        Запрос уже качающегося ключа присоединяется к идущей загрузке; запрос
+        без throttle (воспроизведение) снимает ограничение скорости фоновой
+        """
+        with self._lock:
+            if on_finish is not None:
+                self._listeners.setdefault(key, []).append(on_finish)
+            
+            job = self._fetches.get(key)
+            if job is not None:
+                if throttle is None:
+                    job.throttle = None
+                return job
+            
+            # on_finish ждет self._lock - запись в _fetches появится раньше;
+            # ключ - через замыкание: загрузка может завершиться до job.key
+            job = self.downloader.start(
+                url, os.path.join(self.tmp_dir, f'{key}.{self.owner}.part'), version=key,
+                accept=accept, throttle=throttle, on_finish=lambda job: self._on_fetched(key, job)
+            )
+            job.key = key
+            self._fetches[key] = job
+        return job
+    
+    def release(self, key: str, on_finish) -> bool:
+        """
+        Отказ от загрузки: on_finish снимается; если загрузку больше никто не
+        ждет - она прерывается (.part и прогресс сегментов остаются для докачки)
+        """
+        with self._lock:
+            listeners = [listener for listener in self._listeners.get(key, []) if listener != on_finish]
+            self._listeners[key] = listeners
+            job = self._fetches.get(key)
+            if job is None or listeners:
+                return False
+            job.cancel()
+        return True
+    
+    def job_for(self, key: str) -> Optional[DownloadJob]:
+        """Идущая загрузка ключа (для чтения следом за ней)"""
+        with self._lock:
+            return self._fetches.get(key)
+    
+    def _on_fetched(self, key: str, job: DownloadJob):
+        """Проверка размера и атомарная публикация блоба"""
+        try:
+            if job.succeeded:
+                expected = None if key.startswith('url-') else int(key.rsplit('-', 1)[1])
+                if expected is not None and job.total != expected:
+                    print(f"[Store] ❌ {key}: размер {job.total} != {expected}, загрузка отброшена")
+                    job.succeeded = False
+                    self._unlink(job.path)
+                else:
+                    self._publish(key, job)
+            elif job.rejected:
+                self._unlink(job.path, job.path + '.json')
+            # Иначе .part и прогресс сегментов остаются для докачки
+        finally:
+            with self._lock:
+                self._fetches.pop(key, None)
+                listeners = self._listeners.pop(key, [])
+            for listener in listeners:
+                listener(job)
+    
+    def _publish(self, key: str, job: DownloadJob):
+        path = self.blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(job.path, path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, job.total, job.url, job.etag, job.last_modified, now, now)
+            )
+            self._db.commit()
+    
+    def remove(self, key: str):
+        with self._lock:
+            self._drop(key)
+            self._db.commit()
+    
+    def _drop(self, key: str):
+        """Удаление блоба (вызывается под self._lock, commit - у вызывающего)"""
+        self._db.execute('DELETE FROM blobs WHERE digest = ?', (key,))
+        # Играющий файл остается открытым у MPV
+        self._unlink(self.blob_path(key))
+    
+    def evict(self, max_bytes: int, reserve: int = 0) -> List[str]:
+        """LRU вытеснение блобов, не закрепленных зеркалом или заглушкой, до бюджета max_bytes"""
+        with self._lock:
+            rows = self._db.execute('''
+                SELECT digest, size FROM blobs
+                WHERE digest NOT IN (SELECT digest FROM names WHERE mirrored = 1)
+                ORDER BY last_used
+            ''').fetchall()
+            
+            used = sum(size for _, size in rows)
+            victims = []
+            for key, size in rows:
+                if used + reserve <= max_bytes:
+                    break
+                if key in self._fetches:
+                    continue
+                victims.append(key)
+                used -= size
+            
+            for key in victims:
+                self._drop(key)
+            self._db.commit()
+        return victims
+    
+    def usage(self, pinned: Optional[bool] = None) -> tuple:
+        """(блобов, байт); pinned - только закрепленные (зеркало, заглушка) / только прочие"""
+        query = 'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs'
+        if pinned is not None:
+            query += ' WHERE digest %s (SELECT digest FROM names WHERE mirrored = 1)' % ('IN' if pinned else 'NOT IN')
+        with self._lock:
+            return tuple(self._db.execute(query).fetchone())
+    
+    def _cleanup_tmp(self):
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if time.time() - os.path.getmtime(path) > self.TMP_MAX_AGE:
+                    os.unlink(path)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _unlink(*paths: str):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+    
+class _ContentCacheHandler(BaseHTTPRequestHandler):
+    """Локальный HTTP endpoint для MPV: отдает файл пока он докачивается"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        self.server.cache.serve(self, self.path.lstrip('/'))
+    
+    def log_message(self, format, *args):
+        pass
+
+class ContentCache:
+    """
+    Tee-through кэш /content/{device}/{file} с LRU вытеснением
+    
+    Первое воспроизведение идет через локальный прокси: файл один раз
+    качается с сервера в ContentStore, MPV читает те же байты следом за
+    загрузкой сегментов (seek в еще не начатый сегмент - напрямую с
+    сервера). Повторные воспроизведения - с диска. Файлы без md5 на сервере
+    хранятся под ключом URL и ревалидируются по ETag/Last-Modified в фоне.
+    """
+    
+    CHUNK_SIZE = 256 * 1024
+    READ_AHEAD_WINDOW = 8 * 1024 * 1024  # seek дальше границы сегмента + окно - в обход кэша
+    REVALIDATE_INTERVAL = 300  # сек между проверками одной записи
+    
+    def __init__(self, store: ContentStore, max_bytes: int):
+        self.store = store
+        self.max_bytes = max_bytes
+        
+        self.http = store.downloader.http
+        self.session = self.http.session
+        self._too_large = set()
+        self._lock = threading.Lock()
+        
+        # Заполнения по запросам воспроизведения: ключ -> поколение запроса
+        self._generation = 0
+        self._fills: Dict[str, int] = {}
+        self._keep: set = set()  # Следующие по плейлисту - не прерываются
+        self._readers: Dict[str, int] = {}  # Открытые соединения MPV по ключу
+        
+        # Локальный прокси только на loopback
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _ContentCacheHandler)
+        self.server.daemon_threads = True
+        self.server.cache = self
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        
+        count, used = store.usage(pinned=False)
+        print(f"[Cache] 💾 Кэш контента: {count} файлов, {used / 1024 / 1024:.0f}/{max_bytes // 1024 // 1024} MB")
+    
+    def resolve(self, url: str, key: Optional[str] = None) -> str:
+        """
+        Источник для loadfile: локальный файл, tee-прокси или исходный URL
+        key - ключ содержимого из индекса хранилища (None - ключ по URL)
+        """
+        key = key or self.store.url_key(url)
+        
+        with self._lock:
+            if url in self._too_large:
+                return url
+        
+        path = self.store.path(key)
+        if path:
+            if key.startswith('url-'):
+                entry = self.store.info(key)
+                if entry and time.time() - (entry['checked'] or 0) > self.REVALIDATE_INTERVAL:
+                    self.store.mark_checked(key)
+                    self.http.submit(self._revalidate, key, url)
+            print(f"[Cache] ⚡ Из кэша: {key}")
+            return path
+        
+        fill = self.store.job_for(key)
+        if fill is not None and fill.cancelled:
+            return url  # Прерванная загрузка еще завершается - этот показ напрямую
+        with self._lock:
+            joined = key in self._fills
+            self._fills[key] = self._generation
+        if not joined:
+            self.store.fetch(key, url, accept=self._accept, on_finish=self._on_fill_finished)
+        return f"http://127.0.0.1:{self.port}/{key}"
+    
+    def supersede(self, keep: Iterable[str] = ()):
+        """
+        Новый запрос воспроизведения: прежние заполнения без читателей
+        прерываются, кроме keep (следующие по плейлисту); остальные - как
+        только MPV закроет последнее соединение
+        """
+        with self._lock:
+            self._generation += 1
+            self._keep = set(keep)
+            orphans = [key for key in self._fills if self._orphaned(key)]
+        for key in orphans:
+            self._abort(key)
+    
+    def _orphaned(self, key: str) -> bool:
+        """Заполнение никому не нужно (вызывается под self._lock)"""
+        return (key in self._fills and self._fills[key] != self._generation
+                and key not in self._keep and not self._readers.get(key))
+    
+    def _abort(self, key: str):
+        with self._lock:
+            self._fills.pop(key, None)
+        if self.store.release(key, self._on_fill_finished):
+            print(f"[Cache] ⏹️ Загрузка прервана - файл больше не показывается: {key}")
+    
+    # === Заполнение кэша ===
+    
+    def _accept(self, fill: DownloadJob) -> bool:
+        """После пробы: файл больше бюджета не кэшируем, иначе освобождаем место"""
+        if fill.total is not None and fill.total > self.max_bytes:
+            print(f"[Cache] ℹ️ Файл больше бюджета кэша ({fill.total // 1024 // 1024} MB) - без кэширования")
+            with self._lock:
+                self._too_large.add(fill.url)
+            return False
+        if fill.total is not None:
+            self._evict(reserve=fill.total)
+        return True
+    
+    def _on_fill_finished(self, fill: DownloadJob):
+        with self._lock:
+            self._fills.pop(fill.key, None)
+        if fill.succeeded:
+            print(f"[Cache] ✅ Закэшировано: {fill.key} ({fill.total // 1024} KB)")
+            self._evict()
+    
+    def _revalidate(self, key: str, url: str):
+        """Условный запрос к серверу: 304 - запись актуальна, 200 - удаляем"""
+        entry = self.store.info(key)
+        if not entry:
+            return
+        
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        
+        try:
+            with self.http.get(entry['url'] or url, headers=headers, stream=True, timeout=5) as response:
+                status = response.status_code
+        except requests.RequestException:
+            return  # Нет сети - играем то что есть
+        
+        if status == 200 or status == 404:
+            print(f"[Cache] 🔄 Файл изменился на сервере - запись сброшена: {key}")
+            self.store.remove(key)
+    
+    def _evict(self, reserve: int = 0):
+        """LRU вытеснение до бюджета (с учетом места под новую загрузку)"""
+        for key in self.store.evict(self.max_bytes, reserve):
+            print(f"[Cache] 🗑️ LRU вытеснение: {key}")
+    
+    # === Локальный прокси для MPV ===
+    
+    def serve(self, handler: BaseHTTPRequestHandler, key: str):
+        """Ответ MPV: из .part следом за загрузкой или напрямую с сервера"""
+        with self._lock:
+            self._readers[key] = self._readers.get(key, 0) + 1
+        try:
+            self._serve_key(handler, key)
+        finally:
+            with self._lock:
+                self._readers[key] -= 1
+                if not self._readers[key]:
+                    del self._readers[key]
+                orphaned = self._orphaned(key)
+            if orphaned:
+                self._abort(key)
+    
+    def _serve_key(self, handler: BaseHTTPRequestHandler, key: str):
+        fill = self.store.job_for(key)
+        if fill is None:
+            # Загрузка успела завершиться - отдаем готовый файл
+            path = self.store.path(key, touch=False)
+            if path is None:
+                handler.send_error(404)
+                return
+            self._serve_range(handler, path, os.path.getsize(path), None, None)
+            return
+        
+        url = fill.url
+        if not fill.headers_ready.wait(30) or fill.failed or fill.rejected:
+            self._proxy_upstream(handler, url)
+            return
+        
+        start, end = self._parse_range(handler.headers.get('Range'), fill.total)
+        if not fill.is_active_at(start) or start > fill.available_until(start) + self.READ_AHEAD_WINDOW:
+            # Сегмент с этой позицией еще не качается - не ждем очереди
+            self._proxy_upstream(handler, url)
+            return
+        
+        self._serve_range(handler, fill.path, fill.total, fill, (start, end),
+                          content_type=fill.content_type)
+    
+    def _serve_range(self, handler, path: str, total: Optional[int], fill: Optional[DownloadJob],
+                     byte_range: Optional[tuple], content_type: str = 'application/octet-stream'):
+        """Отдача диапазона файла; для fill - ждем пока байты докачаются"""
+        if byte_range is None:
+            byte_range = self._parse_range(handler.headers.get('Range'), total)
+        start, end = byte_range
+        if total is not None and start >= total:
+            handler.send_response(416)
+            handler.send_header('Content-Range', f'bytes */{total}')
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+        
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            try:
+                if fill is None:
+                    raise
+                f = open(self.store.blob_path(fill.key), 'rb')  # .part уже опубликован
+            except OSError:
+                handler.send_error(404)
+                return
+        
+        with f:
+            if handler.headers.get('Range') and total is not None:
+                handler.send_response(206)
+                handler.send_header('Content-Range', f'bytes {start}-{end}/{total}')
+            else:
+                handler.send_response(200)
+            handler.send_header('Content-Type', content_type)
+            handler.send_header('Accept-Ranges', 'bytes')
+            if end is not None:
+                handler.send_header('Content-Length', str(end - start + 1))
+            else:
+                handler.close_connection = True
+            handler.end_headers()
+            
+            f.seek(start)
+            position = start
+            try:
+                while end is None or position <= end:
+                    available = None
+                    if fill is not None:
+                        with fill.cond:
+                            while fill.available_until(position) <= position and not (fill.done or fill.failed):
+                                if not fill.cond.wait(30):
+                                    break
+                            available = fill.available_until(position)
+                        if available <= position:
+                            break
+                    
+                    limit = self.CHUNK_SIZE
+                    if available is not None:
+                        limit = min(limit, available - position)
+                    if end is not None:
+                        limit = min(limit, end + 1 - position)
+                    
+                    data = f.read(limit)
+                    if not data:
+                        break
+                    handler.wfile.write(data)
+                    position += len(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # MPV закрыл соединение (seek/смена файла)
+    
+    def _proxy_upstream(self, handler, url: str):
+        """Прямая трансляция с сервера (далекий seek или файл вне кэша)"""
+        headers = {}
+        if handler.headers.get('Range'):
+            headers['Range'] = handler.headers['Range']
+        
+        try:
+            with self.session.get(url, headers=headers, stream=True, timeout=self.http.TIMEOUT) as response:
+                handler.send_response(response.status_code)
+                for name in ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges'):
+                    if name in response.headers:
+                        handler.send_header(name, response.headers[name])
+                if 'Content-Length' not in response.headers:
+                    handler.close_connection = True
+                handler.end_headers()
+                
+                for chunk in response.iter_content(self.CHUNK_SIZE):
+                    handler.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except requests.RequestException:
+            try:
+                handler.send_error(502)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _parse_range(header: Optional[str], total: Optional[int]) -> tuple:
+        """bytes=start-end -> (start, end) включительно"""
+        start, end = 0, (total - 1 if total is not None else None)
+        match = re.match(r'bytes=(\d*)-(\d*)', header or '')
+        if match:
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = int(match.group(2)) if end is None else min(int(match.group(2)), end)
+            elif match.group(2) and total is not None:
+                start = max(0, total - int(match.group(2)))
+        return start, end
+    
+class _RateLimiter:
+    """Token bucket в байтах/сек (общий для всех потоков загрузки)"""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = 0.0
+        self._last = time.time()
+        self._lock = threading.Lock()
+    
+    def consume(self, amount: int, rate: Optional[float] = None):
+        """Списывает amount байт, при нехватке - спит (rate <= 0 - без лимита)"""
+        rate = self.rate if rate is None else rate
+        if rate <= 0:
+            return
+        
+        with self._lock:
+            now = time.time()
+            self._tokens = min(rate, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= amount
+            delay = -self._tokens / rate if self._tokens < 0 else 0
+        
+        if delay > 0:
+            time.sleep(delay)
+
+class LibraryMirror:
+    """
+    Полное зеркало библиотеки устройства на локальном диске
+    
+    Фоновая синхронизация: список /api/devices/:id/files-with-status
+    сопоставляется с индексом ContentStore, недостающее содержимое
+    качается параллельно (SegmentedDownloader, докачка по сегментам) и
+    проверяется по размеру. Файлы с одинаковым md5 качаются один раз.
+    Скорость ограничена, пока MPV играет из сети.
+    """
+    
+    MIRROR_EXTENSIONS = {'.mp4', '.webm', '.ogg', '.mkv', '.mov', '.avi',
+                         '.png', '.jpg', '.jpeg', '.gif', '.webp'}
+    STREAMING_RATE_FACTOR = 0.25  # Доля лимита пока MPV тянет контент из сети
+    
+    def __init__(self, server_url: str, device_id: str, store: ContentStore,
+                 parallel: int = 2, rate_kbps: int = 4096, interval: int = 300):
+        self.server_url = server_url
+        self.device_id = device_id
+        self.store = store
+        self.interval = interval
+        
+        self.http = store.downloader.http
+        self.limiter = _RateLimiter(rate_kbps * 1024)
+        self.executor = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='mirror')
+        self.streaming = False  # MPV сейчас играет не с локального диска
+        self.on_listing = None  # Вызывается с именами файлов после каждого списка с сервера
+        
+        self._jobs: List[DownloadJob] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+    
+    def start(self):
+        """Запуск фонового цикла синхронизации"""
+        if not self._running:
+            self._running = True
+            threading.Thread(target=self._sync_loop, daemon=True).start()
+    
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        with self._lock:
+            for job in self._jobs:
+                job.cancel()  # Прогресс сегментов сохранен - докачаем при следующем запуске
+        self.executor.shutdown(wait=False)
+    
+    def request_sync(self):
+        """Внеочередная синхронизация (например, по devices/updated)"""
+        self._wakeup.set()
+    
+    def path_for(self, filename: str) -> Optional[str]:
+        """Локальная копия файла из зеркала (или None)"""
+        key = self.store.digest_for(self.device_id, filename)
+        return self.store.path(key) if key else None
+    
+    def _sync_loop(self):
+        while self._running:
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"[Mirror] ⚠️ Sync error: {e}")
+            
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+    
+    def sync_once(self):
+        """Один проход: diff с сервером, загрузка недостающего содержимого"""
+        url = f"{self.server_url}/api/devices/{self.device_id}/files-with-status"
+        try:
+            response = self.http.get(url, timeout=10)
+            if response.status_code != 200:
+                print(f"[Mirror] ⚠️ Список файлов: HTTP {response.status_code}")
+                return
+            listing = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"[Mirror] ⚠️ Сервер недоступен, зеркало без изменений: {e}")
+            return
+        
+        wanted = []
+        for item in listing:
+            name = item.get('safeName')
+            if not name or os.path.splitext(name)[1].lower() not in self.MIRROR_EXTENSIONS:
+                continue
+            if item.get('status', 'ready') != 'ready' or item.get('canPlay') is False:
+                continue  # Еще обрабатывается на сервере
+            if not self.store.key_for(item.get('md5'), item.get('size')):
+                print(f"[Mirror] ℹ️ {name}: нет md5 на сервере - не зеркалируется")
+                continue
+            wanted.append(item)
+        
+        # Закрепляет содержимое за зеркалом; удаленное с сервера уходит из хранилища
+        self.store.update_names(self.device_id, wanted, mirrored=True)
+        if self.on_listing:
+            self.on_listing([item['safeName'] for item in wanted])
+        
+        # Одно содержимое под несколькими именами - одна загрузка
+        todo = {}
+        for item in wanted:
+            key = self.store.key_for(item['md5'], item['size'])
+            if key not in todo and not self.store.path(key, touch=False):
+                todo[key] = item
+        
+        if not todo:
+            return
+        
+        print(f"[Mirror] 🔄 Синхронизация: {len(todo)} к загрузке")
+        futures = [self.executor.submit(self._download, key, item) for key, item in todo.items()]
+        for future in futures:
+            future.result()
+    
+    def _download(self, key: str, item: Dict[str, Any]):
+        """Загрузка содержимого в хранилище (докачка, проверка размера - в ContentStore)"""
+        name = item['safeName']
+        url = f"{self.server_url}/content/{self.device_id}/{quote(name, safe='')}"
+        
+        def throttle(amount: int):
+            rate = self.limiter.rate * (self.STREAMING_RATE_FACTOR if self.streaming else 1)
+            self.limiter.consume(amount, rate)
+        
+        # Ждем публикации блоба (после finished загрузчика)
+        published = threading.Event()
+        job = self.store.fetch(key, url, throttle=throttle, on_finish=lambda job: published.set())
+        with self._lock:
+            self._jobs.append(job)
+        published.wait()
+        with self._lock:
+            self._jobs.remove(job)
+        
+        path = self.store.path(key, touch=False)
+        if not path:
+            print(f"[Mirror] ⚠️ {name}: загрузка прервана, докачаем в следующий раз")
+            return
+        print(f"[Mirror] ✅ {name} ({os.path.getsize(path) // 1024} KB)")
+    
+class PlaceholderCopy:
+    """
+    Постоянная копия заглушки устройства в ContentStore
+    
+    Переживает перезапуск и пропадание сети: при старте заглушка
+    показывается с диска сразу, без запроса к API. Файл - обычный блоб
+    хранилища под ключом md5 + размер (общий с кэшем и зеркалом), закрепленный
+    от вытеснения; отдельно хранится только указатель placeholder.json.
+    Сервер проверяется в фоне условными запросами (If-None-Match /
+    If-Modified-Since). Новая версия качается в хранилище, пока показывается
+    прежняя; указатель переписывается после публикации блоба.
+    """
+    
+    VIDEO_EXTENSIONS = ['mp4', 'webm', 'ogg', 'mkv', 'mov', 'avi']
+    IMAGE_EXTENSIONS = ['png', 'jpg', 'jpeg', 'gif', 'webp']
+    
+    def __init__(self, meta_path: str, server_url: str, device_id: str, store: ContentStore):
+        self.device_id = device_id
+        self.api_url = f"{server_url}/api/devices/{device_id}/placeholder"
+        self.content_url = f"{server_url}/content/{device_id}/"
+        self.store = store
+        self.http = store.downloader.http
+        self.meta_path = meta_path
+        self.pin_owner = f'placeholder:{device_id}'  # Закрепление в индексе хранилища
+        
+        self._sync_lock = threading.Lock()  # Синхронизации по очереди (refresh подряд)
+        
+        # Указатель на блоб: file, type, key, etag, last_modified, api_etag
+        self.meta: Dict[str, Any] = {}
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if store.path(meta['key'], touch=False):
+                self.meta = meta
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        # Последний ответ API (может опережать копию на диске, пока она качается)
+        self._api_etag: Optional[str] = self.meta.get('api_etag')
+        self._resolved: tuple = (self.meta.get('file'), self.meta.get('type'))
+        self._resolved_key: Optional[str] = self.meta.get('key')
+    
+    @property
+    def file(self) -> Optional[str]:
+        return self.meta.get('file')
+    
+    @property
+    def type(self) -> Optional[str]:
+        return self.meta.get('type')
+    
+    @classmethod
+    def type_for(cls, filename: str) -> Optional[str]:
+        """Тип заглушки по расширению (как Android)"""
+        ext = filename.split('.')[-1].lower()
+        if ext in cls.VIDEO_EXTENSIONS:
+            return 'video'
+        if ext in cls.IMAGE_EXTENSIONS:
+            return 'image'
+        return None
+    
+    def path_for(self, filename: str) -> Optional[str]:
+        """Блоб заглушки (только если filename - она и блоб на месте)"""
+        if not self.meta or self.meta['file'] != filename:
+            return None
+        return self.store.path(self.meta['key'])
+    
+    def resolve(self) -> Optional[tuple]:
+        """
+        Условный запрос к API: (file, type), file None - заглушки нет;
+        None - сервер недоступен (играем то, что на диске)
+        """
+        headers = {'If-None-Match': self._api_etag} if self._api_etag else {}
+        try:
+            response = self.http.get(self.api_url, headers=headers, timeout=5)
+        except requests.RequestException as e:
+            print(f"[MPV] ⚠️ Error loading placeholder: {e}")
+            return None
+        
+        if response.status_code == 304:
+            return self._resolved
+        if response.status_code == 404:
+            print(f"[MPV] ℹ️ No placeholder configured (404) - idle mode")
+            self._api_etag, self._resolved, self._resolved_key = None, (None, None), None
+            return self._resolved
+        if response.status_code != 200:
+            print(f"[MPV] ⚠️ Failed to load placeholder: HTTP {response.status_code}")
+            return None
+        
+        try:
+            body = response.json()
+        except ValueError:
+            return None
+        placeholder_file = body.get('placeholder')
+        if not placeholder_file or placeholder_file == 'null':
+            print(f"[MPV] ℹ️ No placeholder set for device - idle mode")
+            placeholder_file = None
+        
+        self._api_etag = response.headers.get('ETag')
+        self._resolved = (placeholder_file, placeholder_file and self.type_for(placeholder_file))
+        self._resolved_key = ContentStore.key_for(body.get('md5'), body.get('size'))
+        return self._resolved
+    
+    def sync(self, filename: Optional[str], placeholder_type: Optional[str]) -> bool:
+        """
+        Копия -> filename (блокирующе: проверка и загрузка в хранилище)
+        True - прежняя копия заменена другой версией или снята
+        """
+        with self._sync_lock:
+            if filename is None:
+                if not self.meta:
+                    return False
+                print(f"[MPV] 🗑️ Заглушка снята на сервере - копия откреплена")
+                self._unlink(self.meta_path)
+                self.meta = {}
+                self.store.pin(self.pin_owner, [])
+                return True
+            
+            url = self.content_url + quote(filename, safe='')
+            key = self._key_for(filename, url)
+            current = self.meta.get('key') == key and self.path_for(filename)
+            cached = current or self.store.path(key, touch=False)
+            # Ключ по содержимому не устаревает; ключ URL - условный запрос
+            if cached and (not key.startswith('url-') or not self._changed(url, self.meta if current else self.store.info(key))):
+                if current:
+                    if self.meta.get('api_etag') != self._api_etag:
+                        self._write_meta(dict(self.meta, api_etag=self._api_etag))
+                    return False
+                # Тот же ролик уже в хранилище (кэш, зеркало) - без загрузки
+            else:
+                # Закреплены обе: новая не сирота, пока качается, прежняя показывается до подмены
+                previous = [self.meta['key']] if self.meta else []
+                self.store.pin(self.pin_owner, previous + [key])
+                print(f"[MPV] 📥 Загрузка заглушки в хранилище: {filename}")
+                published = threading.Event()
+                self.store.fetch(key, url, on_finish=lambda job: published.set())
+                published.wait()
+                if not self.store.path(key, touch=False):
+                    self.store.pin(self.pin_owner, previous)
+                    return False  # Прогресс сегментов сохранен - докачаем при следующей проверке
+            
+            self.store.pin(self.pin_owner, [key])
+            replaced = bool(self.meta)
+            entry = self.store.info(key) or {}
+            self._write_meta({
+                'file': filename,
+                'type': placeholder_type,
+                'key': key,
+                'etag': entry.get('etag'),
+                'last_modified': entry.get('last_modified'),
+                'api_etag': self._api_etag,
+            })
+            print(f"[MPV] 💾 Заглушка в хранилище: {filename} ({(entry.get('size') or 0) // 1024} KB)")
+            return replaced
+    
+    def _key_for(self, filename: str, url: str) -> str:
+        """Ключ содержимого: из ответа API, из индекса устройства или по URL"""
+        if filename == self._resolved[0] and self._resolved_key:
+            return self._resolved_key
+        return self.store.digest_for(self.device_id, filename) or self.store.url_key(url)
+    
+    def _changed(self, url: str, entry: Optional[Dict[str, Any]]) -> bool:
+        """Условный запрос файла: 304 - копия актуальна; нет сети - тоже считаем актуальной"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        if not headers:
+            return True
+        
+        try:
+            with self.http.get(url, headers=headers, stream=True, timeout=5) as response:
+                status = response.status_code
+        except requests.RequestException:
+            return False
+        return status == 200
+    
+    def _write_meta(self, meta: Dict[str, Any]):
+        with open(self.meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.meta_path + '.tmp', self.meta_path)
+        self.meta = meta
+    
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+class PlaylistRunner:
+    """
+    Локальный исполнитель плейлиста/расписания
+    
+    Сервер присылает плейлист целиком (player/playlist): элементы с
+    длительностями, правило повтора и окна времени. Переключения идут по
+    локальным таймерам (монотонные часы), без запроса к серверу на каждый
+    элемент - показ продолжается и без сети. Плейлист и позиция в нем
+    хранятся на диске (playlist.json) и переживают перезапуск.
+    
+    Формат: {id, items: [{file, type, page, duration, windows}], loop, windows}
+    - duration - сек на элемент; видео без duration - до конца файла
+    - loop - true (по кругу), false (один проход) или число проходов
+    - windows - [{days: [1..7], from: 'HH:MM', to: 'HH:MM'}]; вне окон
+      плейлиста - заглушка, элемент вне своих окон пропускается
+    """
+    
+    DEFAULT_DURATION = 10.0  # Сек на картинку/страницу без duration (и на паузу после ошибки)
+    
+    def __init__(self, path: str, show, idle, report):
+        self.path = path
+        self._show = show  # show(item) - показать элемент
+        self._idle = idle  # idle() - заглушка (вне окон или плейлист закончился)
+        self._report = report  # report(progress) - прогресс серверу
+        
+        self.playlist: Optional[Dict[str, Any]] = None
+        self.index = 0
+        self.loops = 0  # Завершенных проходов
+        self.showing = False  # На экране элемент плейлиста (а не заглушка)
+        self.done = False  # Все проходы завершены
+        
+        self._deadline: Optional[float] = None  # time.monotonic() конца элемента; None - до конца видео
+        self._remaining: Optional[float] = None  # Остаток элемента на паузе
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        
+        try:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            if saved['playlist']['items']:
+                self.playlist = saved['playlist']
+                self.index = min(int(saved.get('index', 0)), len(self.playlist['items']) - 1)
+                self.loops = int(saved.get('loops', 0))
+                self.done = bool(saved.get('done'))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    
+    @property
+    def active(self) -> bool:
+        return self.playlist is not None and not self.done
+    
+    def start(self):
+        """Запуск потока таймеров"""
+        if not self._running:
+            self._running = True
+            threading.Thread(target=self._loop, daemon=True, name='playlist').start()
+    
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+    
+    def load(self, playlist: Dict[str, Any]):
+        """Новый плейлист - с первого элемента"""
+        with self._lock:
+            self.playlist = playlist
+            self.index = 0
+            self.loops = 0
+            self._reset()
+            self._save()
+        self._wakeup.set()
+    
+    def clear(self):
+        """Ручная команда или пустой плейлист: исполнитель отключается"""
+        with self._lock:
+            if self.playlist is None:
+                return
+            self.playlist = None
+            self._reset()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        print('[Playlist] ⏹️ Плейлист остановлен')
+        self._wakeup.set()
+    
+    def pause(self):
+        with self._lock:
+            if self.showing and self._deadline is not None:
+                self._remaining = max(0.0, self._deadline - time.monotonic())
+                self._deadline = None
+    
+    def resume(self):
+        with self._lock:
+            if self._remaining is not None:
+                self._deadline = time.monotonic() + self._remaining
+                self._remaining = None
+        self._wakeup.set()
+    
+    def finished(self):
+        """Видео элемента доиграло до конца - следующий элемент"""
+        with self._lock:
+            if self.showing:
+                self._deadline = time.monotonic()
+        self._wakeup.set()
+    
+    def failed(self):
+        """Элемент не открылся - заглушка на DEFAULT_DURATION, затем следующий"""
+        with self._lock:
+            if self.showing and self._deadline is None and self._remaining is None:
+                self._deadline = time.monotonic() + self.DEFAULT_DURATION
+        self._wakeup.set()
+    
+    def upcoming(self) -> List[str]:
+        """Видео следующего элемента (его загрузка в кэш не прерывается)"""
+        with self._lock:
+            if not self.active:
+                return []
+            items = self.playlist['items']
+            item = items[(self.index + 1) % len(items)]
+        return [item['file']] if item.get('type') == 'video' else []
+    
+    def progress(self) -> Optional[Dict[str, Any]]:
+        """Позиция в плейлисте для сервера (None - плейлиста нет)"""
+        if self.playlist is None:
+            return None
+        item = self.playlist['items'][self.index] if self.showing else None
+        return {'id': self.playlist.get('id'), 'index': self.index, 'loops': self.loops, 'done': self.done,
+                'item': item and {key: item.get(key) for key in ('type', 'file', 'page')}}
+    
+    def _reset(self):
+        self.showing = False
+        self.done = False
+        self._deadline = None
+        self._remaining = None
+    
+    def _loop(self):
+        while self._running:
+            with self._lock:
+                try:
+                    timeout = self._step()
+                except Exception as e:
+                    print(f"[Playlist] ⚠️ {e}")
+                    timeout = self.DEFAULT_DURATION
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+    
+    def _step(self) -> Optional[float]:
+        """Один шаг по таймеру; возвращает сек до следующего (None - ждать события)"""
+        if not self.active or self._remaining is not None:
+            return None
+        
+        now = datetime.now()
+        windows = self.playlist.get('windows')
+        if windows and not self._in_windows(windows, now):
+            if self.showing:
+                print('[Playlist] 🌙 Вне окна расписания - заглушка')
+                self._deadline = None
+                self.showing = False
+                self._idle()
+            return self._until_boundary(windows, now)
+        
+        if self.showing:
+            if self._deadline is None:
+                return self._wait(None, windows, now)  # Видео до конца файла
+            left = self._deadline - time.monotonic()
+            if left > 0:
+                return self._wait(left, windows, now)
+            self.index += 1
+        
+        # Следующий подходящий элемент (с повтором по loop)
+        items = self.playlist['items']
+        for _ in range(len(items) + 1):
+            if self.index >= len(items):
+                self.index = 0
+                self.loops += 1
+                loop = self.playlist.get('loop', True)
+                if loop is False or (not isinstance(loop, bool) and self.loops >= int(loop)):
+                    print(f"[Playlist] 🏁 Плейлист завершен ({self.loops} проход.)")
+                    self.done = True
+                    self.showing = False
+                    self._save()
+                    self._idle()
+                    self._report(self.progress())
+                    return None
+            
+            item = items[self.index]
+            if not item.get('windows') or self._in_windows(item['windows'], now):
+                break
+            self.index += 1
+        else:
+            # Ни один элемент сейчас не в своем окне
+            if self.showing:
+                self.showing = False
+                self._idle()
+            return self._until_boundary([w for i in items for w in (i.get('windows') or [])], now)
+        
+        duration = item.get('duration')
+        if duration is None and item.get('type') != 'video':
+            duration = self.DEFAULT_DURATION
+        self._deadline = time.monotonic() + float(duration) if duration is not None else None
+        self.showing = True
+        self._save()
+        
+        print(f"[Playlist] 📋 {self.index + 1}/{len(items)}: {item['file']}"
+              f"{' (%.0f сек)' % float(duration) if duration is not None else ''}")
+        self._show(item)
+        self._report(self.progress())
+        return self._wait(duration, windows, now)
+    
+    def _wait(self, seconds: Optional[float], windows: Optional[list], now: datetime) -> Optional[float]:
+        """Ожидание до конца элемента, но не дольше границы окна"""
+        if not windows:
+            return seconds
+        boundary = self._until_boundary(windows, now)
+        return boundary if seconds is None else min(seconds, boundary)
+    
+    def _save(self):
+        try:
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump({'playlist': self.playlist, 'index': self.index, 'loops': self.loops, 'done': self.done}, f)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            print(f"[Playlist] ⚠️ Плейлист не записан: {e}")
+    
+    @staticmethod
+    def _minutes(value: str) -> int:
+        hours, minutes = value.split(':')
+        return int(hours) * 60 + int(minutes)
+    
+    @classmethod
+    def _in_windows(cls, windows: list, now: datetime) -> bool:
+        """Сейчас внутри хотя бы одного окна (from > to - окно через полночь)"""
+        minute = now.hour * 60 + now.minute
+        for window in windows:
+            start, end = cls._minutes(window.get('from', '00:00')), cls._minutes(window.get('to', '24:00'))
+            days = window.get('days')
+            if start <= end:
+                inside = start <= minute < end
+                day = now.isoweekday()
+            else:
+                inside = minute >= start or minute < end
+                day = now.isoweekday() if minute >= start else (now - timedelta(days=1)).isoweekday()
+            if inside and (not days or day in days):
+                return True
+        return False
+    
+    @classmethod
+    def _until_boundary(cls, windows: list, now: datetime) -> float:
+        """Сек до ближайшей границы окна (from/to) - тогда проверяем заново"""
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        seconds = []
+        for window in windows:
+            for value in (window.get('from', '00:00'), window.get('to', '24:00')):
+                boundary = midnight + timedelta(minutes=cls._minutes(value))
+                while boundary <= now:
+                    boundary += timedelta(days=1)
+                seconds.append((boundary - now).total_seconds())
+        return min(seconds) if seconds else 24 * 3600.0
+
+class ClockSync:
+    """
+    Смещение часов сервера относительно локальных (как NTP)
+    
+    По обмену player/ping / player/pong: t0 - отправка, t1/t2 - прием и ответ
+    на сервере, t3 - получение pong. Из последних замеров берется замер с
+    наименьшим RTT - у него меньше всего асимметрия задержек.
+    """
+    
+    SAMPLES = 8
+    
+    def __init__(self):
+        self._samples: deque = deque(maxlen=self.SAMPLES)
+        self.offset: Optional[float] = None  # Сек: часы сервера минус локальные
+        self.rtt: Optional[float] = None
+    
+    def add(self, t0: float, t1: float, t2: float, t3: float):
+        """Замер по меткам времени в секундах (t1, t2 - по часам сервера)"""
+        rtt = (t3 - t0) - (t2 - t1)
+        if rtt < 0:
+            return
+        self._samples.append((rtt, ((t1 - t0) + (t2 - t3)) / 2))
+        self.rtt, self.offset = min(self._samples)
+    
+    def server_time(self) -> float:
+        return time.time() + (self.offset or 0.0)
+    
+    def local_time(self, server_ts: float) -> float:
+        """Момент по часам сервера (сек) -> локальное time.time()"""
+        return server_ts - (self.offset or 0.0)
+
+class QosMonitor:
+    """
+    Телеметрия качества воспроизведения по observe_property MPV
+    
+    События свойств копятся в текущем окне (только счетчики и суммы, без
+    хранения замеров); раз в ping окно сворачивается в компактную сводку
+    (take) и уходит на сервер внутри player/ping. Счетчики пропущенных
+    кадров - приращения за окно (MPV сбрасывает их на новом файле).
+    """
+    
+    COUNTERS = {
+        'frame-drop-count': 'frame_drops',
+        'decoder-frame-drop-count': 'decoder_drops',
+        'vo-delayed-frame-count': 'vo_delayed',
+    }
+    
+    def __init__(self, min_interval: float = 10.0):
+        self.min_interval = min_interval  # Окно короче не отдаем (пинги подряд)
+        self.hwdec: Optional[str] = None
+        self.totals = dict.fromkeys(self.COUNTERS.values(), 0)  # С запуска, take() не сбрасывает
+        self.totals.update(played_s=0.0, stalls=0)
+        self._lock = threading.Lock()
+        self._last: Dict[str, int] = {}
+        self._position: Optional[float] = None
+        self._reset()
+    
+    def _reset(self):
+        self._started = time.time()
+        self._counts = dict.fromkeys(self.COUNTERS.values(), 0)
+        self._cache = [None, 0.0, 0]  # min, сумма, замеров (сек в буфере демультиплексора)
+        self._speed = [None, 0.0, 0]  # То же для скорости сети (байт/сек)
+        self._played = 0.0
+        self._stalls = 0
+    
+    def file_loaded(self):
+        """Новый файл: счетчики MPV начинаются с нуля"""
+        with self._lock:
+            self._last = dict.fromkeys(self.COUNTERS, 0)
+            self._position = None
+    
+    def update(self, name: str, value):
+        with self._lock:
+            if name in self.COUNTERS:
+                if value is None:
+                    return
+                last = self._last.get(name, value)  # Первый замер - база
+                delta = value - last if value >= last else value
+                self._counts[self.COUNTERS[name]] += delta
+                self.totals[self.COUNTERS[name]] += delta
+                self._last[name] = value
+            elif name == 'demuxer-cache-state':
+                self._add(self._cache, (value or {}).get('cache-duration'))
+            elif name == 'cache-speed':
+                self._add(self._speed, value)
+            elif name == 'paused-for-cache':
+                if value is True:
+                    self._stalls += 1
+                    self.totals['stalls'] += 1
+            elif name == 'hwdec-current':
+                self.hwdec = value
+            elif name == 'time-pos':
+                # Сколько реально проиграно за окно (перемотки не считаем)
+                if value is not None and self._position is not None and 0 < value - self._position < 1.0:
+                    self._played += value - self._position
+                    self.totals['played_s'] += value - self._position
+                self._position = value
+    
+    @staticmethod
+    def _add(series: list, value):
+        if value is None:
+            return
+        series[0] = value if series[0] is None else min(series[0], value)
+        series[1] += value
+        series[2] += 1
+    
+    def take(self) -> Optional[Dict[str, Any]]:
+        """Сводка за окно и новое окно (None - окно еще короче min_interval)"""
+        with self._lock:
+            window = time.time() - self._started
+            if window < self.min_interval:
+                return None
+            batch = dict(self._counts, window_s=round(window, 1), played_s=round(self._played, 1),
+                         stalls=self._stalls, hwdec=self.hwdec)
+            if self._cache[2]:
+                batch['cache_s_min'] = round(self._cache[0], 1)
+                batch['cache_s_avg'] = round(self._cache[1] / self._cache[2], 1)
+            if self._speed[2]:
+                batch['net_kbps_min'] = round(self._speed[0] / 1024)
+                batch['net_kbps_avg'] = round(self._speed[1] / self._speed[2] / 1024)
+            self._reset()
+            return batch
+
+class PlaybackTuner:
+    """
+    Подстройка воспроизведения файла, на котором MPV пропускает кадры
+    
+    Лесенка по шагу за раз: аппаратное декодирование, облегченный
+    рендеринг и более легкий вывод (на ходу, set_property), затем больше
+    потоков декодера и облегченное декодирование (перезагрузка файла с той
+    же позиции). Запоминаются по файлу (tuning.json) только шаги, после
+    которых пропуски ушли под порог, - при следующем показе они сразу
+    применяются per-file опциями loadfile; остальные действуют до конца показа.
+    """
+    
+    # (шаг, опции MPV, нужна перезагрузка файла)
+    STEPS = [
+        ('hwdec', {'hwdec': 'auto-safe'}, False),
+        ('render', {'scale': 'bilinear', 'dscale': 'bilinear', 'cscale': 'bilinear',
+                    'interpolation': 'no', 'deband': 'no'}, False),
+        ('threads', {'vd-lavc-threads': str(min(16, (os.cpu_count() or 2) * 2))}, True),
+        ('light-decode', {'vd-lavc-skiploopfilter': 'all', 'vd-lavc-fast': 'yes'}, True),
+    ]
+    VO_FALLBACK = {'gpu-next': 'gpu', 'gpu': 'xv'}  # Вывод запуска -> более легкий
+    
+    def __init__(self, path: str, vo: Optional[str] = None):
+        self.path = path
+        self.steps = list(self.STEPS)
+        if vo in self.VO_FALLBACK:
+            self.steps.insert(2, ('vo', {'vo': self.VO_FALLBACK[vo]}, False))  # Последний шаг на ходу
+        self.applied: Dict[str, List[str]] = {}  # Файл -> шаги, которые помогли
+        self.trying: Dict[str, List[str]] = {}  # Файл -> шаги текущего показа (не запоминаются)
+        names = [name for name, _, _ in self.steps]
+        try:
+            with open(path, 'r') as f:
+                for filename, steps in json.load(f).items():
+                    self.applied[filename] = [name for name in steps if name in names]
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+    
+    def options_for(self, filename: str, skip: Iterable[str] = ()) -> Dict[str, str]:
+        """Опции запомненных и пробуемых в этом показе шагов (кроме skip)"""
+        active = set(self.applied.get(filename, ())) | set(self.trying.get(filename, ()))
+        options: Dict[str, str] = {}
+        for name, step_options, _ in self.steps:
+            if name in active and name not in skip:
+                options.update(step_options)
+        return options
+    
+    def next_step(self, filename: str, skip: Iterable[str] = ()) -> Optional[tuple]:
+        """
+        Следующий шаг для файла (пробный до confirm) или None - шаги исчерпаны
+        Шаги из skip (для файла бесполезны) пропускаются
+        """
+        used = self.applied.get(filename, []) + self.trying.get(filename, [])
+        for step in self.steps:
+            if step[0] not in used and step[0] not in skip:
+                break
+        else:
+            return None
+        self.trying.setdefault(filename, []).append(step[0])
+        return step
+    
+    def confirm(self, filename: str) -> Optional[str]:
+        """Последний пробный шаг помог: запоминается для файла"""
+        trying = self.trying.get(filename)
+        if not trying:
+            return None
+        name = trying.pop()
+        self.applied[filename] = self.applied.get(filename, []) + [name]
+        try:
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self.applied, f)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            print(f"[MPV] ⚠️ Настройки файла не записаны: {e}")
+        return name
+    
+    def discard(self, filename: Optional[str]):
+        """Показ закончился: пробные шаги, которые не помогли, забываются"""
+        self.trying.pop(filename, None)
+
+class VideoPreflight:
+    """
+    Проверка видео до loadfile по /api/devices/:id/files/:name/video-info
+    
+    Кодек, разрешение и битрейт файла кэшируются на диске (video-info.json)
+    вместе с ключом содержимого: переконвертированный под тем же именем файл
+    запрашивается заново. Параметры сопоставляются с профилем устройства
+    (аппаратные кодеки DeviceDetector, разрешение экрана) - результат
+    per-file опции loadfile: без попытки hwdec для неподдерживаемого кодека,
+    облегченное декодирование тяжелого файла, кэш demuxer по битрейту.
+    """
+    
+    WAIT = 0.5            # Сек ожидания ответа при первом показе (дальше - из кэша)
+    RETRY_AFTER = 300     # Сек без повторных запросов после ошибки
+    CACHE_SECONDS = 30    # Сек видео в кэше demuxer
+    CACHE_MIN = 16 * 1024 * 1024
+    CACHE_MAX = 256 * 1024 * 1024
+    LIGHT_DECODE = {'vd-lavc-skiploopfilter': 'all', 'vd-lavc-fast': 'yes', 'framedrop': 'decoder+vo'}
+    
+    def __init__(self, path: str, server_url: str, device_id: str, http: HttpClient,
+                 store: ContentStore, capabilities: Dict[str, Any]):
+        self.path = path
+        self.server_url = server_url
+        self.device_id = device_id
+        self.http = http
+        self.store = store
+        self.capabilities = capabilities
+        self.display: Optional[tuple] = None  # (ширина, высота) экрана из MPV
+        self.cache_max = self.CACHE_MAX  # Бюджет памяти на кэш (CacheSizer)
+        
+        self.infos: Dict[str, Dict[str, Any]] = {}  # Файл -> {key, info}
+        self._failed: Dict[str, float] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                self.infos = {name: entry for name, entry in json.load(f).items() if isinstance(entry, dict)}
+        except (OSError, ValueError, AttributeError):
+            pass
+    
+    def info_for(self, filename: str, wait: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        Параметры файла из кэша; если их нет - запрос в фоне (ждем не
+        дольше wait сек, показ файла не задерживается на ffprobe сервера)
+        """
+        key = self.store.digest_for(self.device_id, filename)
+        with self._lock:
+            entry = self.infos.get(filename)
+            if entry is not None and entry.get('key') == key:
+                return entry.get('info')
+            if time.time() - self._failed.get(filename, 0) < self.RETRY_AFTER:
+                return None
+            future = self._pending.get(filename)
+            if future is None:
+                future = self.http.submit(self._fetch, filename, key)
+                if future is None:
+                    return None
+                self._pending[filename] = future
+        
+        if wait > 0:
+            try:
+                future.result(timeout=wait)
+            except FutureTimeoutError:
+                return None
+            with self._lock:
+                entry = self.infos.get(filename)
+                return entry.get('info') if entry and entry.get('key') == key else None
+        return None
+    
+    def prefetch(self, filenames: List[str]):
+        """Фоновый запрос параметров видео из списка файлов устройства"""
+        for name in filenames:
+            if os.path.splitext(name)[1].lower().lstrip('.') in PlaceholderCopy.VIDEO_EXTENSIONS:
+                self.info_for(name)
+    
+    def options_for(self, info: Dict[str, Any]) -> Dict[str, str]:
+        """Per-file опции loadfile под параметры файла и возможности устройства"""
+        options: Dict[str, str] = {}
+        codec = info.get('codec')
+        width, height = info.get('width') or 0, info.get('height') or 0
+        
+        if codec in self.capabilities['hwdec_codecs']:
+            options['hwdec-codecs'] = codec
+        elif codec:
+            # Аппаратный декодер не умеет - не пробуем его (сбой инициализации,
+            # черный кадр на старте), сразу программное декодирование
+            options['hwdec'] = 'no'
+            software_max = self.capabilities['software_max']
+            if software_max and width * height > software_max[0] * software_max[1]:
+                options.update(self.LIGHT_DECODE)
+        
+        if self.display and width > self.display[0] and height > self.display[1]:
+            options['dscale'] = 'bilinear'  # Дешевое уменьшение под экран
+        
+        bitrate = info.get('bitrate') or 0
+        if bitrate > 0:
+            size = min(max(bitrate // 8 * self.CACHE_SECONDS, self.CACHE_MIN), self.CACHE_MAX, self.cache_max)
+            options['demuxer-max-bytes'] = str(size)
+        return options
+    
+    def _fetch(self, filename: str, key: Optional[str]):
+        url = f"{self.server_url}/api/devices/{self.device_id}/files/{quote(filename, safe='')}/video-info"
+        try:
+            response = self.http.get(url, timeout=(5, 35))  # ffprobe на сервере - до 30 сек
+            info = response.json().get('parameters') if response.status_code == 200 else None
+        except (requests.RequestException, ValueError, AttributeError) as e:
+            print(f"[Preflight] ⚠️ {filename}: {e}")
+            info = None
+        
+        with self._lock:
+            self._pending.pop(filename, None)
+            if not isinstance(info, dict):
+                self._failed[filename] = time.time()
+                return
+            self.infos[filename] = {'key': key, 'info': info}
+            snapshot = dict(self.infos)
+        print(f"[Preflight] 🎞️ {filename}: {info.get('codec')} {info.get('width')}x{info.get('height')}, "
+              f"{(info.get('bitrate') or 0) // 1000} kbps")
+        try:
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            print(f"[Preflight] ⚠️ Кэш параметров не записан: {e}")
+
+class CacheSizer:
+    """
+    Размер кэша MPV по реальной памяти и измеренной скорости сети
+    
+    Бюджет demuxer - доля памяти устройства (/proc/meminfo, не больше
+    половины свободной), поделенная на все процессы MPV на машине (другие
+    клиенты и горячий резерв). Время упреждающего чтения растет, когда
+    сеть медленная: буфер дольше восполняется. Скорость берется из
+    cache-speed MPV при показе из сети и запоминается для устройства
+    (cache-sizing.json) - следующий запуск стартует с измеренной.
+    """
+    
+    MEMORY_SHARE = 0.25               # Доля MemTotal под кэш всех MPV
+    MIN_BYTES = 16 * 1024 * 1024
+    MAX_BYTES = 512 * 1024 * 1024
+    REFERENCE_KBPS = 20000            # На такой скорости хватает 30 сек упреждения
+    MIN_SECS, DEFAULT_SECS, MAX_SECS = 10, 30, 120
+    SPEED_SMOOTHING = 0.3             # Вес нового окна в средней скорости
+    CHANGE_THRESHOLD = 0.2            # Меньшие изменения на ходу не применяем
+    LAUNCH_OPTIONS = ('--demuxer-max-bytes=', '--cache-secs=', '--demuxer-readahead-secs=')
+    
+    def __init__(self, path: str, own_sockets: List[str]):
+        self.path = path
+        self.own_sockets = own_sockets
+        self.network = False  # MPV сейчас читает из сети (cache-speed - скорость канала)
+        self.net_kbps: Optional[float] = None
+        self._window_peak = 0.0
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                self.net_kbps = float(json.load(f)['net_kbps'])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    
+    def observe(self, speed):
+        """cache-speed MPV (байт/сек); пик окна - оценка пропускной способности"""
+        if self.network and speed:
+            with self._lock:
+                self._window_peak = max(self._window_peak, speed * 8 / 1000)
+    
+    def limits(self) -> Dict[str, int]:
+        """Текущие лимиты: {demuxer-max-bytes, cache-secs}; окно скорости учитывается"""
+        with self._lock:
+            peak, self._window_peak = self._window_peak, 0.0
+        if peak > 0:
+            self.net_kbps = peak if self.net_kbps is None else \
+                self.net_kbps + (peak - self.net_kbps) * self.SPEED_SMOOTHING
+            try:
+                with open(self.path + '.tmp', 'w') as f:
+                    json.dump({'net_kbps': round(self.net_kbps), 'updated': int(time.time())}, f)
+                os.replace(self.path + '.tmp', self.path)
+            except OSError as e:
+                print(f"[Cache] ⚠️ Скорость сети не записана: {e}")
+        
+        total, available = self._meminfo()
+        budget = self.MAX_BYTES
+        if total:
+            budget = min(total * self.MEMORY_SHARE, (available or total) / 2) / self._instances()
+        size = int(min(max(budget, self.MIN_BYTES), self.MAX_BYTES))
+        
+        secs = self.DEFAULT_SECS
+        if self.net_kbps:
+            secs = self.DEFAULT_SECS * self.REFERENCE_KBPS / self.net_kbps
+        secs = int(min(max(secs, self.MIN_SECS), self.MAX_SECS))
+        return {'demuxer-max-bytes': size, 'cache-secs': secs}
+    
+    def launch_params(self, params: List[str], limits: Dict[str, int]) -> List[str]:
+        """Параметры запуска MPV: лимиты платформы заменяются рассчитанными"""
+        return [p for p in params if not p.startswith(self.LAUNCH_OPTIONS)] + [
+            f"--demuxer-max-bytes={limits['demuxer-max-bytes']}",
+            f"--cache-secs={limits['cache-secs']}",
+            f"--demuxer-readahead-secs={limits['cache-secs']}",
+        ]
+    
+    def describe(self, limits: Dict[str, int]):
+        print(f"[Cache] 📐 Кэш MPV: {limits['demuxer-max-bytes'] // (1024 * 1024)} MB, "
+              f"упреждение {limits['cache-secs']} сек"
+              f"{f' (сеть ~{self.net_kbps / 1000:.0f} Mbps)' if self.net_kbps else ''}")
+    
+    def changed(self, old: Dict[str, int], new: Dict[str, int]) -> bool:
+        return any(abs(new[k] - old.get(k, 0)) > old.get(k, 0) * self.CHANGE_THRESHOLD for k in new)
+    
+    @staticmethod
+    def _meminfo() -> tuple:
+        """(MemTotal, MemAvailable) в байтах; None - нет /proc/meminfo"""
+        values = {}
+        try:
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    key, _, rest = line.partition(':')
+                    if key in ('MemTotal', 'MemAvailable'):
+                        values[key] = int(rest.split()[0]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return values.get('MemTotal'), values.get('MemAvailable')
+    
+    def _instances(self) -> int:
+        """Процессы MPV на машине: наши (активный и резерв) + MPV других клиентов"""
+        others = 0
+        try:
+            pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+        except OSError:
+            pids = []
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                    args = f.read().decode(errors='replace').split('\0')
+            except OSError:
+                continue
+            if not args or os.path.basename(args[0]) != 'mpv':
+                continue
+            ipc = next((a for a in args if a.startswith('--input-ipc-server=')), None)
+            if ipc and ipc.split('=', 1)[1] not in self.own_sockets:
+                others += 1
+        return len(self.own_sockets) + others
+
+class ResourceMonitor:
+    """
+    Ресурсы процессов MPV и клиента по /proc/<pid>: RSS, открытые
+    дескрипторы, потоки
+    
+    История замеров хранится по процессу (тренд RSS в MB/час). База -
+    минимум после прогрева, когда кэши уже заполнены; рост сверх бюджета над
+    базой - медленная утечка. Новый PID (MPV перезапущен) - история заново.
+    """
+    
+    WARMUP = 600        # сек после старта процесса до фиксации базы
+    HISTORY = 240       # замеров (4 часа при интервале 60 сек)
+    FD_BUDGET = 256     # Рост числа дескрипторов над базой
+    THREAD_BUDGET = 64  # Рост числа потоков над базой
+    
+    def __init__(self):
+        self._procs: Dict[str, Dict[str, Any]] = {}  # Имя -> {pid, started, history, base}
+    
+    def sample(self, name: str, pid: int) -> Optional[Dict[str, int]]:
+        """Замер процесса (None - процесса нет или /proc недоступен)"""
+        values = {}
+        try:
+            with open(f'/proc/{pid}/status', 'r') as f:
+                for line in f:
+                    key, _, rest = line.partition(':')
+                    if key == 'VmRSS':
+                        values['rss'] = int(rest.split()[0]) * 1024
+                    elif key == 'Threads':
+                        values['threads'] = int(rest)
+            values['fds'] = len(os.listdir(f'/proc/{pid}/fd'))
+        except (OSError, ValueError, IndexError):
+            return None
+        if len(values) < 3:
+            return None
+        
+        now = time.time()
+        proc = self._procs.get(name)
+        if proc is None or proc['pid'] != pid:
+            proc = self._procs[name] = {'pid': pid, 'started': now, 'base': None,
+                                        'history': deque(maxlen=self.HISTORY)}
+        proc['history'].append((now, values))
+        if now - proc['started'] >= self.WARMUP:
+            base = proc['base'] or values
+            proc['base'] = {key: min(base[key], values[key]) for key in values}
+        return values
+    
+    def trend(self, name: str) -> Optional[float]:
+        """Наклон RSS по истории, MB/час (None - мало замеров)"""
+        history = self._procs.get(name, {}).get('history') or []
+        if len(history) < 3:
+            return None
+        t0 = history[0][0]
+        points = [((t - t0) / 3600, values['rss'] / (1024 * 1024)) for t, values in history]
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_r = sum(r for _, r in points) / len(points)
+        spread = sum((t - mean_t) ** 2 for t, _ in points)
+        if spread == 0:
+            return None
+        return sum((t - mean_t) * (r - mean_r) for t, r in points) / spread
+    
+    def over_budget(self, name: str, rss_budget: int) -> Optional[str]:
+        """Причина планового перезапуска, если рост над базой превысил бюджет"""
+        proc = self._procs.get(name)
+        if not proc or not proc['base'] or not proc['history']:
+            return None
+        base, values = proc['base'], proc['history'][-1][1]
+        if values['rss'] - base['rss'] > rss_budget:
+            trend = self.trend(name)
+            return (f"RSS {base['rss'] // (1024 * 1024)} -> {values['rss'] // (1024 * 1024)} MB"
+                    f"{f' ({trend:+.0f} MB/ч)' if trend is not None else ''}")
+        if values['fds'] - base['fds'] > self.FD_BUDGET:
+            return f"дескрипторы {base['fds']} -> {values['fds']}"
+        if values['threads'] - base['threads'] > self.THREAD_BUDGET:
+            return f"потоки {base['threads']} -> {values['threads']}"
+        return None
+    
+    def summary(self) -> Dict[str, Any]:
+        """Последние замеры и тренды для телеметрии"""
+        result = {}
+        for name, proc in self._procs.items():
+            if proc['history']:
+                values = proc['history'][-1][1]
+                trend = self.trend(name)
+                result[name] = {'rss_mb': values['rss'] // (1024 * 1024), 'fds': values['fds'],
+                                'threads': values['threads'],
+                                'trend_mb_h': round(trend, 1) if trend is not None else None}
+        return result
+
+class CommandScheduler:
+    """
+    Единый конвейер команд управления (один поток)
+    
+    Команды контента (play, страницы, stop, заглушка) - latest wins: новая
+    снимает ожидающие команды контента и отменяет выполняющуюся загрузку
+    (через on_supersede); остальные команды (connect, pause, state...) остаются
+    в очереди по порядку. Команды пользователя выполняются раньше фоновых задач.
+    Команды копятся до ready.set() (MPV поднят) и затем выполняются по порядку.
+    """
+    
+    def __init__(self, on_supersede=None):
+        self.on_supersede = on_supersede
+        self.generation = 0  # Номер последней команды контента
+        self.current = 0  # generation выполняющейся команды
+        
+        self._user: deque = deque()
+        self._background: deque = deque()
+        self._cond = threading.Condition()
+        self.ready = threading.Event()
+        threading.Thread(target=self._loop, daemon=True, name='control').start()
+    
+    def submit(self, fn, *args, content: bool = False, background: bool = False,
+               generation: Optional[int] = None):
+        """
+        content=True - команда контента (вытесняет ожидающие и текущую загрузку)
+        generation - выполнить, только если с тех пор не было новой команды контента
+        """
+        with self._cond:
+            if content:
+                self.generation += 1
+                kept = deque(entry for entry in self._user if not entry[3])
+                if len(kept) < len(self._user):
+                    print(f"[MPV] ⏭️ Пропущено устаревших команд: {len(self._user) - len(kept)}")
+                    self._user = kept
+            queue_ = self._background if background else self._user
+            queue_.append((fn, args, self.generation if content else generation, content))
+            self._cond.notify()
+        
+        if content and self.on_supersede is not None:
+            self.on_supersede()
+    
+    def superseded(self) -> bool:
+        """Выполняющуюся команду уже заменила более новая команда контента"""
+        return self.current != self.generation
+    
+    def is_current(self, generation: int) -> bool:
+        return generation == self.generation
+    
+    def _loop(self):
+        self.ready.wait()
+        while True:
+            with self._cond:
+                while not self._user and not self._background:
+                    self._cond.wait()
+                fn, args, generation, _ = (self._user or self._background).popleft()
+                if generation is not None and generation != self.generation:
+                    continue  # Продолжение устаревшей команды
+                self.current = self.generation
+            
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[MPV] ⚠️ {getattr(fn, '__name__', fn)}: {e}")
+
+class MPVClient:
+    # observe_property id -> свойство MPV
+    OBSERVED_PROPERTIES = {
+        1: 'eof-reached',
+        2: 'idle-active',
+        3: 'time-pos',
+        4: 'hwdec-current',
+        # Телеметрия качества (QosMonitor)
+        5: 'frame-drop-count',
+        6: 'decoder-frame-drop-count',
+        7: 'vo-delayed-frame-count',
+        8: 'demuxer-cache-state',
+        9: 'cache-speed',
+        10: 'paused-for-cache',
+    }
+    
+    # Максимальное ожидание первого кадра после loadfile (сек)
+    LOAD_TIMEOUT = 10.0
+    
+    # Страница/слайд висит до следующей команды
+    SLIDE_OPTIONS = {'image-display-duration': 'inf'}
+    
+    # Подряд неотвеченных IPC команд до признания MPV зависшим
+    MAX_IPC_TIMEOUTS = 3
+    IPC_RECONNECT_TIMEOUT = 1.0  # сек на переподключение к живому MPV (монитор)
+    
+    # Перезапусков MPV за окно (сек), после которых выходим (дальше - systemd)
+    MAX_RESPAWNS = 5
+    RESPAWN_WINDOW = 300
+    
+    # Журнал состояния: метод показа -> type в devices[id].current сервера
+    STATE_TYPES = {
+        '_play_video': 'video',
+        '_play_image': 'image',
+        '_show_pdf_page': 'pdf',
+        '_show_pptx_slide': 'pptx',
+        '_show_folder_image': 'folder',
+    }
+    JOURNAL_INTERVAL = 5  # сек между записями журнала (только если что-то изменилось)
+    
+    # Повтор первого подключения к серверу (как reconnection_delay Socket.IO)
+    CONNECT_RETRY_MIN = 2
+    CONNECT_RETRY_MAX = 10
+    
+    # Синхронный показ (видеостена): старт по часам сервера и подстройка дрейфа
+    SYNC_BURST = 5  # Пингов подряд после подключения - быстрая оценка смещения часов
+    SYNC_INTERVAL = 1.0  # сек между сверками позиции
+    SYNC_TOLERANCE = 0.015  # Расхождение (сек), которое не подстраиваем
+    SYNC_SEEK_THRESHOLD = 0.5  # Больше - перемотка, меньше - подстройка speed
+    SYNC_MAX_SPEED_DELTA = 0.05  # speed в пределах 1 ± 5%
+    SYNC_CORRECTION_TIME = 2.0  # За сколько сек speed выбирает расхождение
+    
+    # Подстройка при пропусках кадров (PlaybackTuner)
+    TUNE_INTERVAL = 5.0  # сек окна оценки
+    TUNE_DROP_RATIO = 0.05  # Доля пропущенных/опоздавших кадров для следующего шага
+    TUNE_LAG_RATIO = 0.1  # Отставание воспроизведения от часов (декодер/вывод не успевают)
+    CACHE_SIZE_INTERVAL = 30.0  # сек между пересчетами лимитов кэша
+    
+    # Сторож ресурсов: плановый перезапуск при медленной утечке
+    RESOURCE_INTERVAL = 60.0  # сек между замерами /proc
+    RSS_GROWTH_BUDGET = 256 * 1024 * 1024  # Рост RSS над базой (у MPV - сверх лимита кэша)
+    PLANNED_RESTART_DEADLINE = 3600  # сек ожидания заглушки/конца файла, затем - сразу
+    RESTART_EXIT_CODE = 75  # Выход для перезапуска клиента systemd (EX_TEMPFAIL)
+    
+    def __init__(self, server_url, device_id, display=':0', fullscreen=True,
+                 cache_dir: Optional[str] = None, prefetch_ahead: int = 2,
+                 prefetch_behind: int = 1, slide_cache_mb: int = 64,
+                 api_token: Optional[str] = None, content_cache_mb: int = 1024,
+                 mirror: bool = False, mirror_parallel: int = 2, mirror_rate_kbps: int = 4096,
+                 download_connections: int = 4, store_dir: Optional[str] = None,
+                 use_asyncio: bool = False, gapless_slides: bool = False,
+                 standby: bool = False):
+        self._started_at = time.time()  # Отсчет времени до первого кадра
+        self.server_url = server_url.rstrip('/')
+        self.device_id = device_id
+        self.running = True
+        self.ipc_socket = f'/tmp/mpv-{device_id}.sock'
+        # Имена процессов MPV для ResourceMonitor - по socket, а не по роли: при
+        # --standby активный и резервный меняются на каждом переключении
+        self._resource_names = {self.ipc_socket: 'mpv', f'/tmp/mpv-{device_id}-standby.sock': 'mpv-2'}
+        
+        print(f"[MPV] 🚀 Запуск MPV клиента v1.0 (идентичен Android ExoPlayer)")
+        print(f"[MPV] Сервер: {server_url}")
+        print(f"[MPV] Устройство: {device_id}")
+        print(f"[MPV] Display: {display}")
+        print(f"[MPV] 🔍 Система: {platform.system()} {platform.machine()}")
+        
+        # === Конвейер команд: один поток управления, latest wins ===
+        self.scheduler = CommandScheduler(on_supersede=self._on_content_superseded)
+        
+        # === asyncio режим: сетевой транспорт (Socket.IO, IPC, heartbeat,
+        # предзагрузка слайдов) в одном event loop; поток управления, фоновые
+        # циклы (сверка, подстройка, кэш, ресурсы), плейлист и загрузчик - потоки ===
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.http_async = None  # aiohttp сессия (только asyncio режим)
+        self._prefetch_task = None
+        if use_asyncio:
+            if aiohttp is None:
+                print("[MPV] ❌ --asyncio требует aiohttp: pip3 install 'python-socketio[asyncio_client]'")
+                sys.exit(1)
+            self.loop = asyncio.new_event_loop()
+            print(f"[MPV] ⚙️ Режим asyncio")
+        
+        # === Состояния (как в Android) ===
+        self.current_video_file: Optional[str] = None
+        self.saved_position: float = 0.0  # Позиция в секундах
+        self.current_pdf_file: Optional[str] = None
+        self.current_pdf_page: int = 1
+        self.current_pptx_file: Optional[str] = None
+        self.current_pptx_slide: int = 1
+        self.current_folder_name: Optional[str] = None
+        self.current_folder_image: int = 1
+        self.is_playing_placeholder: bool = False
+        
+        # === Кэш заглушки (как в Android) ===
+        self.cached_placeholder_file: Optional[str] = None
+        self.cached_placeholder_type: Optional[str] = None
+        
+        # === Локальный кэш и предзагрузка слайдов ===
+        cache_root = MPVClient.cache_root()
+        self.cache_dir = cache_dir or os.path.join(cache_root, device_id)
+        self.api_token = api_token
+        self.prefetch_ahead = prefetch_ahead
+        self.prefetch_behind = prefetch_behind
+        # === Общий HTTP слой: пул соединений, лимит на хост, ограниченный пул потоков ===
+        self.http = HttpClient(pool_size=max(16, download_connections * 4))
+        
+        self.slide_cache = SlideCache(os.path.join(self.cache_dir, 'slides'), slide_cache_mb * 1024 * 1024, self.http)
+        self.page_counts: Dict[tuple, int] = {}
+        self._prefetch_generation = 0
+        
+        # === Загрузчик для кэша и зеркала (сегменты, пул keep-alive соединений) ===
+        self.downloader = SegmentedDownloader(self.http, connections=download_connections)
+        
+        # === Хранилище по содержимому (общее для устройств бокса по умолчанию) ===
+        self.store = ContentStore(
+            store_dir or (os.path.join(cache_dir, 'store') if cache_dir else os.path.join(cache_root, 'store')),
+            self.downloader, owner=device_id
+        )
+        
+        # === Tee-through кэш видео/изображений (0 - отключен) ===
+        self.content_cache: Optional[ContentCache] = None
+        if content_cache_mb > 0:
+            self.content_cache = ContentCache(self.store, content_cache_mb * 1024 * 1024)
+        
+        # === Полное зеркало библиотеки (опционально) ===
+        self.mirror: Optional[LibraryMirror] = None
+        if mirror:
+            self.mirror = LibraryMirror(
+                self.server_url, device_id, self.store,
+                parallel=mirror_parallel, rate_kbps=mirror_rate_kbps
+            )
+        
+        # === Постоянная копия заглушки: после перезапуска - с диска, без API ===
+        self.placeholder = PlaceholderCopy(
+            os.path.join(self.cache_dir, 'placeholder.json'), self.server_url, device_id, self.store
+        )
+        if self.placeholder.file:
+            self.cached_placeholder_file = self.placeholder.file
+            self.cached_placeholder_type = self.placeholder.type
+            print(f"[MPV] 💾 Заглушка с диска: {self.placeholder.file} ({self.placeholder.type})")
+        
+        # === Error retry (как в Android) ===
+        self.error_retry_count: int = 0
+        self.max_retry_attempts: int = 3
+        
+        # === Флаг первого запуска (как в Android) ===
+        self.is_first_launch: bool = True
+        
+        # === Состояние MPV из observe_property ===
+        self.current_time_pos: float = 0.0
+        self.is_mpv_idle: bool = True
+        self._content_active: bool = False  # file-loaded получен для текущего контента
+        
+        # === Ожидание загрузки (playback-restart вместо фиксированных sleep) ===
+        self._load_done = threading.Event()
+        self._load_ok: bool = False
+        
+        # === Окно слайдов в плейлисте MPV (--gapless-slides) ===
+        # URL страниц в порядке плейлиста MPV; пусто - в плейлисте не окно слайдов
+        self._slide_window: List[str] = []
+        
+        # === УМНОЕ ОПРЕДЕЛЕНИЕ ПЛАТФОРМЫ И ПАРАМЕТРОВ ===
+        # Результат кэшируется на диске: mpv --version не запускаем на каждом старте
+        platform_type, self.mpv_version, detector_cached = DeviceDetector.detect_cached(
+            os.path.join(cache_dir or cache_root, 'detector.json')
+        )
+        if detector_cached:
+            print(f"[Detector] ⚡ Платформа и версия MPV из кэша")
+        optimal_params = DeviceDetector.get_optimal_params(platform_type, self.mpv_version)
+        # Замеры --calibrate на этой машине точнее предположений о платформе
+        calibration = DeviceDetector.load_calibration(os.path.join(cache_dir or cache_root, 'calibration.json'))
+        if calibration:
+            optimal_params = DeviceDetector.apply_calibration(optimal_params, calibration)
+        
+        # Кэш MPV - по памяти устройства, числу MPV на машине и скорости сети,
+        # а не фиксированный для платформы; на ходу подстраивается (_cache_loop)
+        self.sizer = CacheSizer(os.path.join(self.cache_dir, 'cache-sizing.json'),
+                                [self.ipc_socket] + ([f'/tmp/mpv-{device_id}-standby.sock'] if standby else []))
+        self._cache_limits = self.sizer.limits()
+        self.sizer.describe(self._cache_limits)
+        optimal_params = self.sizer.launch_params(optimal_params, self._cache_limits)
+        
+        # Создаем команду MPV (IPC socket добавляется при запуске процесса)
+        mpv_cmd = ['mpv'] + optimal_params
+        
+        if fullscreen:
+            mpv_cmd.append('--fullscreen')
+        
+        # Соседние слайды лежат в плейлисте, demuxer следующего открыт заранее
+        self.gapless_slides = gapless_slides
+        if gapless_slides:
+            if self.mpv_version >= (0, 28):
+                mpv_cmd.append('--prefetch-playlist=yes')
+            else:
+                print(f"[MPV] ⚠️ --gapless-slides требует MPV 0.28+, используем loadfile replace")
+                self.gapless_slides = False
+        # DISPLAY передается через environment
+        
+        # Параметры запуска сохраняем - перезапуск MPV без DeviceDetector
+        self._mpv_cmd = mpv_cmd
+        self._display = display
+        
+        # === Перезапуск MPV внутри клиента (Socket.IO не рвется) ===
+        self._respawn_times: List[float] = []
+        self._paused = False  # Для восстановления паузы после перезапуска
+        self._restore_item: Optional[tuple] = None  # (метод, аргументы) текущего контента; None - заглушка
+        self.recovery_stats = {'respawns': 0, 'last_ms': None, 'max_ms': 0.0, 'planned': 0}
+        
+        # === Сторож ресурсов: утечка -> перезапуск в безопасный момент ===
+        self.resources = ResourceMonitor()
+        self._planned_restart: Optional[Dict[str, Any]] = None  # {target, reason, since, eof}
+        self.exit_code = 0
+        
+        # === Журнал состояния на диске: после падения - тот же контент и позиция ===
+        self.journal_path = os.path.join(self.cache_dir, 'state.json')
+        self._journal: Dict[str, Any] = {}
+        try:
+            with open(self.journal_path, 'r') as f:
+                self._journal = json.load(f)
+        except (OSError, ValueError):
+            pass
+        
+        # === Плейлист/расписание с сервера: исполняется локально, по своим таймерам ===
+        self.playlist = PlaylistRunner(os.path.join(self.cache_dir, 'playlist.json'),
+                                       show=self._show_playlist_item, idle=self._show_playlist_idle,
+                                       report=self._report_playlist)
+        
+        # КРИТИЧНО: Загружаем заглушку при старте (как Android onCreate) - не дожидаясь сервера;
+        # после падения - контент из журнала. Первая в конвейере: регистрация на сервере
+        # и его player/state выполнятся уже после нее, команды сервера ее вытесняют
+        self.scheduler.submit(self._resume_journal, content=True)
+        
+        # === Видеостена: часы сервера (по ping/pong) и синхронный старт ===
+        self.clock = ClockSync()
+        self._sync: Optional[Dict[str, Any]] = None  # {file, start_at (сек, часы сервера)}
+        self._sync_speed = 1.0
+        self.sync_stats = {'offset_ms': None, 'rtt_ms': None, 'error_ms': None, 'seeks': 0}
+        
+        # === Телеметрия качества: сводка за окно уходит с player/ping ===
+        self.qos = QosMonitor()
+        
+        # === Подстройка при пропусках кадров: шаги запоминаются по файлу ===
+        launch_vo = next((arg.split('=', 1)[1] for arg in self._mpv_cmd if arg.startswith('--vo=')), None)
+        self.tuner = PlaybackTuner(os.path.join(self.cache_dir, 'tuning.json'), vo=launch_vo)
+        self._tuned_runtime: Dict[str, Any] = {}  # Свойство -> исходное значение (до смены файла)
+        self._tune_exhausted: Optional[str] = None
+        self._preflight_forced: Dict[str, Dict[str, str]] = {}  # Файл -> опции preflight при загрузке
+        
+        # === Проверка видео до loadfile: параметры файла против возможностей устройства ===
+        self.preflight = VideoPreflight(os.path.join(self.cache_dir, 'video-info.json'), server_url,
+                                        device_id, self.http, self.store,
+                                        DeviceDetector.get_capabilities(platform_type, calibration))
+        self.preflight.cache_max = self._cache_limits['demuxer-max-bytes']
+        if self.mirror:
+            self.mirror.on_listing = self.preflight.prefetch
+        
+        # === Холодный старт: MPV, запрос заглушки и Socket.IO параллельно ===
+        self.startup_stats = {'first_frame_ms': None, 'ipc_ms': None, 'detector_cached': detector_cached}
+        
+        # Процесс MPV стартует сразу, его IPC socket ждем в run() (_bring_up_mpv)
+        self.mpv_process = self._start_mpv(self.ipc_socket)
+        
+        # Постоянное IPC соединение с процессом (подключается в _bring_up_mpv)
+        self.ipc = self._new_ipc(self.ipc_socket)
+        
+        # === Горячий резерв (--standby): второй MPV за активным окном ===
+        # Заглушка остается загруженной (на паузе) в одном из двух процессов,
+        # контент грузится в скрытом - переключение = поднять окно
+        self._standby_process: Optional[subprocess.Popen] = None
+        self._standby_ipc = None
+        self._standby_socket = f'/tmp/mpv-{device_id}-standby.sock'
+        self._standby_file: Optional[str] = None  # Заглушка, загруженная в резерве
+        if standby:
+            self._standby_process = self._start_mpv(self._standby_socket)
+            self._standby_ipc = self._new_ipc(self._standby_socket)
+        
+        # Заглушку спрашиваем у API, пока MPV поднимается (_load_placeholder ее дождется);
+        # с копией на диске - фоновая ревалидация
+        self._placeholder_request: Optional[Future] = self.http.submit(self._request_placeholder)
+        
+        # Socket.IO клиент
+        client_class = socketio.AsyncClient if self.loop else socketio.Client
+        self.sio = client_class(
+            reconnection=True,
+            reconnection_attempts=0,
+            reconnection_delay=self.CONNECT_RETRY_MIN,
+            reconnection_delay_max=self.CONNECT_RETRY_MAX,
+            handle_sigint=not self.loop  # В asyncio режиме сигналы ловит _run_async
+        )
+        
+        # Setup (монитор MPV - после подключения IPC, в _bring_up_mpv)
+        self._setup_socket_events()
+        self._setup_signal_handlers()
+    
+    @staticmethod
+    def cache_root() -> str:
+        """Общий каталог кэша машины (детектор, калибровка, хранилище)"""
+        return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'videocontrol-mpv')
+    
+    def _start_mpv(self, ipc_socket: str) -> subprocess.Popen:
+        """Запуск процесса MPV без ожидания: IPC socket ждет _connect_ipc"""
+        # Удаляем старый socket если есть
+        if os.path.exists(ipc_socket):
+            os.unlink(ipc_socket)
+        
+        mpv_cmd = self._mpv_cmd + [f'--input-ipc-server={ipc_socket}']
+        print(f"[MPV] 🎬 Запуск MPV процесса...")
+        print(f"[MPV] 📝 Команда: {' '.join(mpv_cmd[:5])}...")
+        
+        # КРИТИЧНО: Запускаем с STDOUT тоже для полной отладки
+        process = subprocess.Popen(
+            mpv_cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,  # Объединяем stderr в stdout
+            env={**os.environ, 'DISPLAY': self._display}
+        )
+        process.resource_name = self._resource_names[ipc_socket]  # Переживает _swap_players
+        return process
+    
+    def _new_ipc(self, socket_path: str):
+        """IPC соединение под режим клиента (asyncio или потоки)"""
+        return AsyncMPVIPC(socket_path) if self.loop else MPVIPC(socket_path)
+    
+    def _connect_ipc(self, ipc, process: subprocess.Popen):
+        """
+        Ожидание IPC socket запущенного MPV: повтор connect, а не опрос файла -
+        подключаемся, как только MPV начал слушать (RuntimeError если не вышло)
+        """
+        ipc_socket = ipc.socket_path
+        print(f"[MPV] ⏳ Ожидание IPC socket: {ipc_socket}")
+        started = time.time()
+        
+        # Таймаут 10 секунд - для Raspberry Pi
+        while time.time() - started < 10:
+            if self.loop:
+                ipc_connected = self._await(ipc.connect(timeout=0.1))
+            else:
+                ipc_connected = ipc.connect(timeout=0.1)
+            if ipc_connected:
+                print(f"[MPV] ✅ MPV запущен (PID: {process.pid}), IPC за {(time.time() - started) * 1000:.0f} мс")
+                return
+            
+            # Проверяем не завершился ли MPV с ошибкой
+            if process.poll() is not None:
+                print(f"[MPV] ❌ MPV процесс завершился с кодом: {process.returncode}")
+                
+                # Читаем весь вывод
+                output = process.stdout.read().decode('utf-8', errors='ignore')
+                if output:
+                    print(f"[MPV] 📛 Вывод MPV:")
+                    print("=" * 60)
+                    print(output)
+                    print("=" * 60)
+                else:
+                    print(f"[MPV] 📛 Нет вывода от MPV")
+                
+                print(f"[MPV] 💡 Попробуйте запустить MPV вручную:")
+                print(f"[MPV] 💡   mpv --idle=yes --force-window=yes --input-ipc-server=/tmp/test.sock")
+                raise RuntimeError(f'MPV завершился с кодом {process.returncode}')
+        
+        print(f"[MPV] ❌ Не удалось подключиться к IPC socket за 10 секунд: {ipc_socket}")
+        print(f"[MPV] ℹ️ MPV процесс еще работает (PID: {process.pid})")
+        print(f"[MPV] 💡 Попробуйте запустить вручную для отладки:")
+        print(f"[MPV] 💡   mpv --idle=yes --input-ipc-server=/tmp/test.sock")
+        process.kill()
+        raise RuntimeError('IPC недоступен')
+    
+    def _bring_up_mpv(self):
+        """
+        Подключение к запущенному в __init__ MPV (и резерву) - выполняется
+        параллельно с подключением Socket.IO (RuntimeError если MPV не поднялся)
+        """
+        started = time.time()
+        self._connect_ipc(self.ipc, self.mpv_process)
+        
+        if self._standby_process is not None:
+            self._connect_ipc(self._standby_ipc, self._standby_process)
+            # Резервное окно могло появиться позже - поднимаем активное
+            self.send_command('set_property', 'ontop', True, wait=False)
+            print(f"[MPV] 🔁 Горячий резерв: второй MPV (PID: {self._standby_process.pid})")
+        
+        self.startup_stats['ipc_ms'] = round((time.time() - self._started_at) * 1000)
+        self._setup_mpv_monitor()
+        self.scheduler.ready.set()
+    
+    def _respawn_mpv(self, reason: str, planned: bool = False) -> bool:
+        """
+        Перезапуск упавшего/зависшего MPV внутри клиента: те же параметры,
+        новое IPC соединение, Socket.IO не рвется, текущий контент и позиция
+        восстанавливаются. False - падает слишком часто, пусть перезапустит systemd
+        (плановые перезапуски в этот лимит не входят)
+        """
+        started = time.time()
+        if not planned:
+            self._respawn_times = [t for t in self._respawn_times if started - t < self.RESPAWN_WINDOW] + [started]
+        if len(self._respawn_times) > self.MAX_RESPAWNS:
+            print(f"[MPV] ❌ MPV падает слишком часто ({self.MAX_RESPAWNS}+ за {self.RESPAWN_WINDOW} сек) - выходим")
+            return False
+        
+        print(f"[MPV] ♻️ Перезапуск MPV ({reason})...")
+        # Позицию берем до запуска: новый процесс сбросит time-pos
+        position = self.saved_position if self._paused else self.current_time_pos
+        paused = self._paused
+        
+        if self.mpv_process.poll() is None:
+            self.mpv_process.kill()
+            self.mpv_process.wait(timeout=2)
+        
+        # До подключения: idle нового процесса - не "контент закончился"
+        self.is_mpv_idle = True
+        self._content_active = False
+        self._slide_window = []
+        
+        # Старое соединение - с мертвым процессом: после краха оно может
+        # еще числиться connected, и connect() к новому не подключится
+        self.ipc = self._reopen_ipc(self.ipc)
+        try:
+            self.mpv_process = self._start_mpv(self.ipc_socket)
+            self._connect_ipc(self.ipc, self.mpv_process)
+            self._observe_mpv(self.ipc)
+        except RuntimeError as e:
+            print(f"[MPV] ❌ Перезапуск не удался: {e}")
+            return False
+        
+        if self._standby_process is not None:
+            self.send_command('set_property', 'ontop', True, wait=False)
+        
+        # Восстановление - команда контента: прерывает загрузку в мертвый процесс
+        self.scheduler.submit(self._restore_playback, position, paused, started, content=True)
+        return True
+    
+    def _reopen_ipc(self, ipc):
+        """Закрываем соединение с убитым процессом, взамен - новое на тот же socket"""
+        ipc.close()
+        return self._new_ipc(ipc.socket_path)
+    
+    def _restore_playback(self, position: float, paused: bool, started: float):
+        """Текущий контент после перезапуска MPV (видео - с той же позиции)"""
+        self._resume_item(position, paused)
+        
+        elapsed = (time.time() - started) * 1000
+        self.recovery_stats['respawns'] += 1
+        self.recovery_stats['last_ms'] = elapsed
+        self.recovery_stats['max_ms'] = max(self.recovery_stats['max_ms'], elapsed)
+        print(f"[MPV] ♻️ MPV восстановлен за {elapsed:.0f} мс (перезапусков: {self.recovery_stats['respawns']})")
+    
+    def _resume_item(self, position: float, paused: bool):
+        """Показ _restore_item заново (видео - с позиции position, с паузой если была)"""
+        if self._restore_item is None:
+            self._load_placeholder()
+            return
+        
+        method, args = self._restore_item
+        if method == self._play_video:
+            self.current_video_file = None  # Иначе _play_video только перемотает
+            self._play_video(*args, start=position)
+        else:
+            method(*args)
+        
+        if paused:
+            self.saved_position = position
+            self.send_command('set_property', 'pause', True, wait=False)
+            self._paused = True
+    
+    # === Журнал состояния и сверка с сервером ===
+    
+    def _current_state(self) -> Dict[str, Any]:
+        """Текущий контент в формате devices[id].current сервера"""
+        if self._restore_item is None:
+            return {'type': 'idle', 'file': None, 'state': 'idle'}
+        
+        method, args = self._restore_item
+        state = {
+            'type': self.STATE_TYPES[method.__name__],
+            'file': args[0],
+            'state': 'paused' if self._paused else 'playing',
+        }
+        if len(args) > 1:
+            state['page'] = args[1]
+        return state
+    
+    def _item_for(self, state: Dict[str, Any]) -> Optional[tuple]:
+        """(метод, аргументы) показа для состояния {type, file, page}; None - заглушка"""
+        names = {state_type: name for name, state_type in self.STATE_TYPES.items()}
+        if not state.get('file') or state.get('type') not in names:
+            return None
+        
+        method = getattr(self, names[state['type']])
+        if state['type'] in ('video', 'image'):
+            return method, (state['file'],)
+        return method, (state['file'], state.get('page') or 1)
+    
+    def _save_journal(self):
+        """Запись журнала (атомарно), только если состояние изменилось"""
+        journal = self._current_state()
+        if journal['type'] == 'video':
+            position = self.saved_position if self._paused else self.current_time_pos
+            journal['position'] = round(position or 0.0, 1)
+        if journal == self._journal:
+            return
+        
+        try:
+            with open(self.journal_path + '.tmp', 'w') as f:
+                json.dump(journal, f)
+            os.replace(self.journal_path + '.tmp', self.journal_path)
+            self._journal = journal
+        except OSError as e:
+            print(f"[MPV] ⚠️ Журнал состояния не записан: {e}")
+    
+    def _journal_loop(self):
+        while self.running:
+            time.sleep(self.JOURNAL_INTERVAL)
+            self._save_journal()
+    
+    async def _journal_async(self):
+        """_journal_loop() для asyncio режима"""
+        while self.running:
+            await asyncio.sleep(self.JOURNAL_INTERVAL)
+            self._save_journal()
+    
+    def _resume_journal(self):
+        """Старт: контент из журнала (после падения - с той же позиции) или заглушка"""
+        self._restore_item = self._item_for(self._journal)
+        if self._restore_item is not None:
+            print(f"[MPV] 📓 Продолжаем по журналу: {self._journal['type']} {self._journal['file']}"
+                  f"{' @ %.1f сек' % self._journal['position'] if self._journal.get('position') else ''}")
+        self._resume_item(self._journal.get('position') or 0.0, self._journal.get('state') == 'paused')
+    
+    # === Плейлист (PlaylistRunner): таймеры в его потоке, показ - через конвейер команд ===
+    
+    def _show_playlist_item(self, item: Dict[str, Any]):
+        self.scheduler.submit(self._play_playlist_item, item, content=True)
+    
+    def _show_playlist_idle(self):
+        self.scheduler.submit(self._load_placeholder, content=True)
+    
+    def _play_playlist_item(self, item: Dict[str, Any]):
+        method, args = self._item_for(item)
+        method(*args)
+        # Не открылся (на экране заглушка) - исполнитель выдержит паузу и пойдет дальше
+        if self.is_playing_placeholder and not self.scheduler.superseded():
+            self.playlist.failed()
+    
+    def _report_playlist(self, progress: Optional[Dict[str, Any]]):
+        """Прогресс плейлиста серверу (без связи - пропускаем, сервер узнает при регистрации)"""
+        if self.sio.connected:
+            self._emit('player/progress', {'device_id': self.device_id, 'playlist': progress})
+    
+    # === Видеостена: часы сервера, старт по ним и подстройка дрейфа ===
+    
+    def _ping_payload(self) -> Dict[str, Any]:
+        """player/ping: метрики клиента, сводка QoS и t0 для оценки смещения часов"""
+        payload = {'device_id': self.device_id, 'startup': self.startup_stats,
+                   'sync': self.sync_stats, 't0': time.time() * 1000,
+                   'resources': dict(self.resources.summary(), recovery=self.recovery_stats)}
+        qos = self.qos.take()  # Не чаще раза в окно (серия пингов ее не дробит)
+        if qos is not None:
+            payload['qos'] = dict(qos, file=self._current_state()['file'])
+        return payload
+    
+    def _on_pong(self, data=None):
+        """player/pong - в потоке Socket.IO: время получения без задержки очереди команд"""
+        t3 = time.time()
+        if not isinstance(data, dict) or None in (data.get('t0'), data.get('t1'), data.get('t2')):
+            return  # Сервер без меток времени
+        self.clock.add(data['t0'] / 1000, data['t1'] / 1000, data['t2'] / 1000, t3)
+        self.sync_stats['offset_ms'] = round(self.clock.offset * 1000, 1)
+        self.sync_stats['rtt_ms'] = round(self.clock.rtt * 1000, 1)
+    
+    def _sync_burst(self):
+        """Серия пингов после подключения: смещение часов известно до первой команды"""
+        for _ in range(self.SYNC_BURST):
+            if not self.sio.connected:
+                return
+            self._emit('player/ping', self._ping_payload())
+            time.sleep(0.2)
+    
+    async def _sync_burst_async(self):
+        """_sync_burst() для asyncio режима - задача loop, а не поток на каждое подключение"""
+        for _ in range(self.SYNC_BURST):
+            if not self.sio.connected:
+                return
+            await self.sio.emit('player/ping', self._ping_payload())
+            await asyncio.sleep(0.2)
+    
+    def _play_synced(self, filename: str, start_at: float):
+        """Видео со стартом в start_at (мс, часы сервера): загрузка на паузе, пуск в срок"""
+        if self.clock.offset is None:
+            print('[MPV] ⚠️ Смещение часов еще не измерено - старт по локальным часам')
+        target = self.clock.local_time(start_at / 1000)
+        
+        self._play_video(filename, paused=True)
+        if self.scheduler.superseded() or self.is_playing_placeholder:
+            return
+        
+        # Ждем момента старта (новая команда контента - выходим)
+        while time.time() < target - 0.05:
+            if self.scheduler.superseded():
+                return
+            time.sleep(0.05)
+        time.sleep(max(0.0, target - time.time()))
+        
+        # Опоздали (загрузка дольше запаса) - догоняем остальные экраны
+        late = time.time() - target
+        if late > self.SYNC_TOLERANCE:
+            self.send_command('seek', late, 'absolute', wait=False)
+        self.send_command('set_property', 'pause', False, wait=False)
+        self._sync = {'file': filename, 'start_at': start_at / 1000}
+        print(f"[MPV] 🎯 Синхронный старт: {filename} (опоздание {max(late, 0.0) * 1000:.0f} мс)")
+    
+    def _end_sync(self):
+        self._sync = None
+        if self._sync_speed != 1.0:
+            self.send_command('set_property', 'speed', 1.0, wait=False)
+            self._sync_speed = 1.0
+    
+    def _sync_loop(self):
+        """Сверка позиции синхронного видео с часами сервера раз в SYNC_INTERVAL"""
+        while self.running:
+            time.sleep(self.SYNC_INTERVAL)
+            sync = self._sync
+            if sync is None:
+                continue
+            if self._restore_item != (self._play_video, (sync['file'],)) or self._paused:
+                if self._sync is sync:
+                    self._end_sync()  # Переключились или пауза - общий отсчет потерян
+                continue
+            try:
+                self._correct_drift(sync)
+            except Exception as e:
+                print(f"[MPV] ⚠️ Синхронизация: {e}")
+    
+    def _correct_drift(self, sync: Dict[str, Any]):
+        """Мелкое расхождение выбираем скоростью (незаметно), крупное - перемоткой"""
+        before = time.time()
+        result = self.send_command('get_property', 'time-pos')
+        if not result or result.get('error') != 'success' or result.get('data') is None:
+            return
+        # Позиция прочитана где-то за время запроса - берем середину
+        expected = (before + time.time()) / 2 + (self.clock.offset or 0.0) - sync['start_at']
+        error = result['data'] - expected
+        self.sync_stats['error_ms'] = round(error * 1000, 1)
+        
+        if abs(error) > self.SYNC_SEEK_THRESHOLD:
+            print(f"[MPV] 🎯 Расхождение {error * 1000:.0f} мс - перемотка")
+            self.sync_stats['seeks'] += 1
+            self.send_command('seek', expected, 'absolute', wait=False)
+            speed = 1.0
+        elif abs(error) > self.SYNC_TOLERANCE:
+            delta = max(-self.SYNC_MAX_SPEED_DELTA, min(self.SYNC_MAX_SPEED_DELTA, error / self.SYNC_CORRECTION_TIME))
+            speed = round(1.0 - delta, 4)
+        else:
+            speed = 1.0
+        
+        if speed != self._sync_speed:
+            self.send_command('set_property', 'speed', speed, wait=False)
+            self._sync_speed = speed
+    
+    # === Подстройка при пропусках кадров (PlaybackTuner) ===
+    
+    def _tune_loop(self):
+        """
+        Раз в TUNE_INTERVAL: доля пропущенных кадров текущего видео и
+        отставание воспроизведения от часов (время декодирования и вывода
+        кадра больше длительности кадра); пробный шаг оценивается следующим окном
+        """
+        previous = None  # (пропусков всего, проиграно сек, остановок на буферизацию, monotonic)
+        showing = None  # Файл текущего показа (для него копятся пробные шаги)
+        trial = False  # Пробный шаг ждет оценки
+        while self.running:
+            time.sleep(self.TUNE_INTERVAL)
+            item = self._restore_item
+            filename = item[1][0] if item is not None and item[0] == self._play_video else None
+            if filename != showing:
+                self.tuner.discard(showing)
+                showing, trial, previous = filename, False, None
+            if filename is None or self._paused or self._sync is not None or not self._content_active:
+                previous = None  # Синхронное видео не перезагружаем - собьет стену
+                continue
+            
+            totals = self.qos.totals
+            sample = (totals['frame_drops'] + totals['decoder_drops'] + totals['vo_delayed'],
+                      totals['played_s'], totals['stalls'], time.monotonic())
+            if previous is None:
+                previous = sample
+                continue
+            
+            fps = self.send_command('get_property', 'container-fps') or {}
+            elapsed = sample[3] - previous[3]
+            ratio = (sample[0] - previous[0]) / ((fps.get('data') or 25.0) * elapsed)
+            # Остановка на буферизацию - сеть, а не декодер
+            lag = 0.0 if sample[2] != previous[2] else max(0.0, 1.0 - (sample[1] - previous[1]) / elapsed)
+            previous = sample
+            if ratio <= self.TUNE_DROP_RATIO and lag <= self.TUNE_LAG_RATIO:
+                if trial:
+                    trial = False
+                    print(f"[MPV] ✅ {filename}: шаг {self.tuner.confirm(filename)} помог - запомнен")
+                continue
+            try:
+                trial = self._tune_step(filename, ratio, lag)
+            except Exception as e:
+                print(f"[MPV] ⚠️ Подстройка: {e}")
+            previous = None  # Следующее окно - после применения шага
+    
+    def _resource_loop(self):
+        """Раз в RESOURCE_INTERVAL: замеры MPV и клиента, при утечке - плановый перезапуск"""
+        while self.running:
+            time.sleep(self.RESOURCE_INTERVAL)
+            # Оба MPV (при --standby) - под постоянными именами процессов
+            processes = [p for p in (self.mpv_process, self._standby_process) if p is not None]
+            for process in processes:
+                self.resources.sample(process.resource_name, process.pid)
+            self.resources.sample('client', os.getpid())
+            if self._planned_restart is not None:
+                continue
+            
+            mpv_budget = self.RSS_GROWTH_BUDGET + self._cache_limits['demuxer-max-bytes']
+            budgets = [(p.resource_name, mpv_budget) for p in processes] + [('client', self.RSS_GROWTH_BUDGET)]
+            for target, budget in budgets:
+                reason = self.resources.over_budget(target, budget)
+                if reason:
+                    print(f"[MPV] 🩹 Рост ресурсов {target}: {reason} - плановый перезапуск")
+                    self._planned_restart = {'target': target, 'reason': reason, 'since': time.time(), 'eof': False}
+                    break
+    
+    def _planned_restart_due(self) -> bool:
+        """
+        Безопасный момент для планового перезапуска: заглушка, конец файла или
+        срок вышел; резервный MPV не на экране - сразу
+        """
+        plan = self._planned_restart
+        if plan is None or not self.running:
+            return False
+        standby = self._standby_process
+        if standby is not None and plan['target'] == standby.resource_name:
+            return True
+        if self._sync is not None:
+            return False  # Синхронное видео не прерываем - собьет стену
+        return (self.is_playing_placeholder or self.is_mpv_idle or plan['eof']
+                or time.time() - plan['since'] > self.PLANNED_RESTART_DEADLINE)
+    
+    def _begin_planned_restart(self) -> Optional[str]:
+        """
+        Причина для _respawn_mpv; перезапуск клиента - выход для systemd
+        (журнал сохранит контент и позицию, новый процесс их восстановит)
+        """
+        plan, self._planned_restart = self._planned_restart, None
+        self.recovery_stats['planned'] += 1
+        if plan['target'] == 'client':
+            print(f"[MPV] 🩹 Плановый перезапуск клиента ({plan['reason']})")
+            self.exit_code = self.RESTART_EXIT_CODE
+            self.running = False
+            return None
+        if plan['target'] != self.mpv_process.resource_name:
+            # Вырос резервный MPV: перезапуск через конвейер - не пересечется с _swap_players
+            self.scheduler.submit(self._respawn_standby, plan['target'], plan['reason'], background=True)
+            return None
+        return f"плановый: {plan['reason']}"
+    
+    def _cache_loop(self):
+        """Раз в CACHE_SIZE_INTERVAL: лимиты кэша по свободной памяти и скорости сети"""
+        while self.running:
+            time.sleep(self.CACHE_SIZE_INTERVAL)
+            try:
+                limits = self.sizer.limits()
+                if not self.sizer.changed(self._cache_limits, limits):
+                    continue
+                for ipc in (self.ipc, self._standby_ipc):
+                    if ipc is None:
+                        continue
+                    self.send_command('set_property', 'demuxer-max-bytes', str(limits['demuxer-max-bytes']),
+                                      wait=False, ipc=ipc)
+                    for prop in ('cache-secs', 'demuxer-readahead-secs'):
+                        self.send_command('set_property', prop, limits['cache-secs'], wait=False, ipc=ipc)
+                self._cache_limits = limits
+                self.preflight.cache_max = limits['demuxer-max-bytes']
+                self._mpv_cmd = self.sizer.launch_params(self._mpv_cmd, limits)  # Для перезапуска MPV
+                self.sizer.describe(limits)
+            except Exception as e:
+                print(f"[Cache] ⚠️ Пересчет кэша: {e}")
+    
+    def _tune_step(self, filename: str, ratio: float, lag: float) -> bool:
+        """Следующий шаг лесенки для файла (False - шаги исчерпаны)"""
+        skip = self._tune_skip(filename)
+        if self.qos.hwdec not in (None, '', 'no'):
+            skip.add('hwdec')  # Уже аппаратное
+        step = self.tuner.next_step(filename, skip=skip)
+        if step is None:
+            if self._tune_exhausted != filename:
+                self._tune_exhausted = filename
+                print(f"[MPV] ⚠️ {filename}: пропуски кадров {ratio * 100:.0f}%, "
+                      f"отставание {lag * 100:.0f}%, все шаги подстройки пройдены")
+            return False
+        name, options, reload = step
+        
+        print(f"[MPV] 🩺 {filename}: пропуски кадров {ratio * 100:.0f}%, отставание {lag * 100:.0f}% - {name} {options}")
+        if reload:
+            self.scheduler.submit(self._tune_reload, filename, generation=self.scheduler.generation)
+            return True
+        
+        for key, value in options.items():
+            if key not in self._tuned_runtime:
+                result = self.send_command('get_property', key) or {}
+                self._tuned_runtime[key] = result.get('data')
+            self.send_command('set_property', key, value, wait=False)
+        return True
+    
+    def _tune_skip(self, filename: str) -> set:
+        """Шаги, бесполезные для файла: preflight уже выбрал программное декодирование"""
+        if self._preflight_forced.get(filename, {}).get('hwdec') == 'no':
+            return {'hwdec'}
+        return set()
+    
+    def _tune_reload(self, filename: str):
+        """Перезагрузка видео с той же позиции - с опциями пройденных шагов"""
+        if self._restore_item != (self._play_video, (filename,)):
+            return
+        self.current_video_file = None  # Иначе _play_video только перемотает
+        self._play_video(filename, start=self.current_time_pos or 0.0)
+    
+    def _revert_tuning(self):
+        """Смена файла: свойства, измененные на ходу, - обратно (у файла свои per-file опции)"""
+        changed, self._tuned_runtime = self._tuned_runtime, {}
+        for key, value in changed.items():
+            if value is not None:
+                self.send_command('set_property', key, value, wait=False)
+    
+    def _check_hardware_acceleration(self, hwdec: Optional[str]):
+        """Проверка аппаратного декодирования (по observe hwdec-current, без ожидания)"""
+        if hwdec is None:
+            # Ничего не декодируется (idle/картинка) или старая версия MPV
+            return
+        if hwdec and hwdec != 'no':
+            print(f"[MPV] ✅ Аппаратное ускорение: {hwdec}")
+        else:
+            print(f"[MPV] ⚠️ CPU декодинг (установите VAAPI/VDPAU)")
+    
+    def send_command(self, command, *args, wait: bool = True, ipc=None) -> Optional[Dict[str, Any]]:
+        """Отправка команды в MPV через постоянное IPC соединение (ipc - другой процесс)"""
+        ipc = ipc or self.ipc
+        if self.loop:
+            return self._await(ipc.command(command, *args, wait=wait), wait=wait)
+        return ipc.command(command, *args, wait=wait)
+    
+    # === Планирование работы (потоки или asyncio) ===
+    
+    def _await(self, coro, wait: bool = True):
+        """
+        Выполнение корутины в event loop из потока управления (asyncio режим)
+        Из самого loop вызывать нельзя - для него create_task
+        """
+        if self.loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+            return future.result() if wait else None
+        if threading.current_thread() is threading.main_thread():
+            return self.loop.run_until_complete(coro)  # Старт и завершение
+        coro.close()  # Loop уже остановлен - клиент завершается
+        return None
+    
+    def _on(self, event: str, content: bool = False, background: bool = False):
+        """
+        Обработчик Socket.IO: выполняется в конвейере команд, а не в потоке
+        Socket.IO (content=True - команда контента, latest wins)
+        """
+        def register(handler):
+            def dispatch(*args):
+                self.scheduler.submit(handler, *args, content=content, background=background)
+            
+            if self.loop:
+                async def dispatch_async(*args):
+                    dispatch(*args)
+                self.sio.on(event, dispatch_async)
+            else:
+                self.sio.on(event, dispatch)
+            return handler
+        return register
+    
+    def _on_content_superseded(self):
+        """Новая команда контента: прерываем ожидание загрузки, предзагрузку и ненужные заполнения кэша"""
+        self._prefetch_generation += 1
+        if self._prefetch_task is not None:
+            self.loop.call_soon_threadsafe(self._prefetch_task.cancel)
+        self._load_done.set()
+        if self.content_cache is not None:
+            self.content_cache.supersede(
+                self.store.digest_for(self.device_id, filename) or
+                self.store.url_key(f"{self.server_url}/content/{self.device_id}/{quote(filename, safe='')}")
+                for filename in self.playlist.upcoming()
+            )
+    
+    def _emit(self, event: str, data: Any = None):
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self.sio.emit(event, data), self.loop)
+        else:
+            self.sio.emit(event, data)
     
     def _setup_socket_events(self):
         """Socket.IO события (идентично Android)"""
         
-        @self.sio.event
+        @self._on('connect')
         def connect():
             print('[MPV] ✅ Подключено к серверу')
             
-            self.sio.emit('player/register', {
+            self._emit('player/register', {
                 'device_id': self.device_id,
                 'deviceType': 'NATIVE_MPV',
-                'platform': 'Linux MPV'
+                'platform': 'Linux MPV',
+                'current': self._current_state(),  # Сервер берет его вместо сброса в idle
+                'playlist': self.playlist.progress()
             })
             print('[MPV] 📡 Зарегистрирован как NATIVE_MPV')
             
@@ -392,8 +4220,12 @@ class MPVClient:
                     print('[MPV] ℹ️ Reconnected: заглушка играет корректно')
             
             self._start_ping_timer()
+            if self.loop:
+                asyncio.run_coroutine_threadsafe(self._sync_burst_async(), self.loop)
+            else:
+                threading.Thread(target=self._sync_burst, daemon=True).start()
         
-        @self.sio.event
+        @self._on('disconnect')
         def disconnect():
             print('[MPV] ⚠️ Нет связи с сервером...')
             self._stop_ping_timer()
@@ -405,15 +4237,22 @@ class MPVClient:
             else:
                 print('[MPV] ℹ️ Connection lost: заглушка продолжает крутиться (loop mode)...')
         
-        @self.sio.on('player/play')
+        @self._on('player/play', content=True)
         def on_play(data):
             file_type = data.get('type', 'video')
             file_name = data.get('file')
             page = data.get('page', 1)
             
             print(f"[MPV] ▶️ PLAY: type={file_type}, file={file_name}, page={page}")
+            self.playlist.clear()  # Ручная команда важнее плейлиста
             
-            if file_type == 'video' and file_name:
+            # Новое открытие - документ мог быть переконвертирован
+            self.page_counts.clear()
+            self.slide_cache.clear()
+            
+            if file_type == 'video' and file_name and data.get('startAt'):
+                self._play_synced(file_name, float(data['startAt']))
+            elif file_type == 'video' and file_name:
                 self._play_video(file_name, is_placeholder=False)
             elif file_type == 'image' and file_name:
                 self._play_image(file_name, is_placeholder=False)
@@ -424,7 +4263,7 @@ class MPVClient:
             elif file_type == 'folder' and file_name:
                 self._show_folder_image(file_name, page)
         
-        @self.sio.on('player/pause')
+        @self._on('player/pause')
         def on_pause():
             # КРИТИЧНО: Заглушка НЕ реагирует на паузу (как Android)
             if self.is_playing_placeholder:
@@ -437,9 +4276,11 @@ class MPVClient:
                 self.saved_position = result.get('data', 0.0)
                 print(f'[MPV] ⏸️ Пауза на позиции: {self.saved_position:.2f} сек')
             
-            self.send_command('set_property', 'pause', True)
+            self.send_command('set_property', 'pause', True, wait=False)
+            self._paused = True
+            self.playlist.pause()
         
-        @self.sio.on('player/resume')
+        @self._on('player/resume')
         def on_resume():
             # Resume игнорируется для заглушки (как Android)
             if self.is_playing_placeholder:
@@ -449,46 +4290,110 @@ class MPVClient:
             # Продолжаем с сохраненной позиции (как Android)
             if self.saved_position > 0:
                 print(f'[MPV] ▶️ Resume с позиции: {self.saved_position:.2f} сек')
-                self.send_command('seek', self.saved_position, 'absolute')
+                self.send_command('seek', self.saved_position, 'absolute', wait=False)
             
-            self.send_command('set_property', 'pause', False)
+            self.send_command('set_property', 'pause', False, wait=False)
+            self._paused = False
+            self.playlist.resume()
         
-        @self.sio.on('player/restart')
+        @self._on('player/restart')
         def on_restart():
             print('[MPV] 🔄 RESTART')
-            self.send_command('seek', 0, 'absolute')
-            self.send_command('set_property', 'pause', False)
+            self._end_sync()  # Общий отсчет видеостены больше не действует
+            self.send_command('seek', 0, 'absolute', wait=False)
+            self.send_command('set_property', 'pause', False, wait=False)
             self.saved_position = 0.0
+            self._paused = False
         
-        @self.sio.on('player/stop')
+        @self._on('player/stop', content=True)
         def on_stop():
             print('[MPV] ⏹️ STOP')
+            self.playlist.clear()
             self._load_placeholder()
         
-        @self.sio.on('player/pdfPage')
+        @self._on('player/playlist')
+        def on_playlist(playlist):
+            items = [item for item in (playlist or {}).get('items') or [] if self._item_for(item)]
+            if not items:
+                # Плейлист снят на сервере (в том числе пока мы были без связи)
+                if self.playlist.active:
+                    self.playlist.clear()
+                    self.scheduler.submit(self._load_placeholder, content=True)
+                return
+            
+            if self.playlist.active and self.playlist.playlist.get('id') == playlist.get('id'):
+                print('[MPV] 📋 Плейлист уже исполняется - продолжаем')
+                return
+            
+            print(f"[MPV] 📋 PLAYLIST: {playlist.get('id')} ({len(items)} элементов)")
+            self.playlist.load(dict(playlist, items=items))
+        
+        @self._on('player/pdfPage', content=True)
         def on_pdf_page(page_num):
             if self.current_pdf_file:
                 self._show_pdf_page(self.current_pdf_file, page_num)
         
-        @self.sio.on('player/pptxSlide')
+        @self._on('player/pptxPage', content=True)  # Имя события на сервере
+        @self._on('player/pptxSlide', content=True)
         def on_pptx_slide(slide_num):
             if self.current_pptx_file:
                 self._show_pptx_slide(self.current_pptx_file, slide_num)
         
-        @self.sio.on('player/folderPage')
+        @self._on('player/folderPage', content=True)
         def on_folder_page(image_num):
             if self.current_folder_name:
                 self._show_folder_image(self.current_folder_name, image_num)
         
-        @self.sio.on('placeholder/refresh')
+        @self._on('player/state')
+        def on_state(current):
+            # Снимок сервера после регистрации: применяем только отличия от экрана
+            server = current or {}
+            local = self._current_state()
+            
+            if self.playlist.active:
+                print('[MPV] 🔗 Играет плейлист - состояние ведет клиент')
+                return
+            
+            if server.get('type', 'idle') == 'idle' or not server.get('file'):
+                if local['type'] != 'idle':
+                    print('[MPV] 🔗 Сервер: idle - возвращаемся к заглушке')
+                    self.scheduler.submit(self._load_placeholder, content=True)
+            elif (server['type'], server['file']) != (local['type'], local['file']):
+                print(f"[MPV] 🔗 Сервер: {server['type']} {server['file']} - переключаемся")
+                self.scheduler.submit(on_play, server, content=True)
+            elif (server.get('page') or 1) != (local.get('page') or 1):
+                print(f"[MPV] 🔗 Сервер: страница {server['page']} - переключаемся")
+                method, args = self._item_for(server)
+                self.scheduler.submit(method, *args, content=True)
+            elif (server.get('state') == 'paused') != self._paused:
+                if server.get('state') == 'paused':
+                    on_pause()
+                else:
+                    on_resume()
+            else:
+                print('[MPV] 🔗 Состояние совпадает с сервером - без перезагрузки')
+        
+        @self._on('placeholder/refresh')
         def on_placeholder_refresh():
             print('[MPV] 🔄 PLACEHOLDER REFRESH')
-            if self.is_playing_placeholder:
-                self._load_placeholder()
+            # Проверка на сервере в фоне: новая версия подменит текущую после загрузки
+            self.http.submit(self._request_placeholder)
         
-        @self.sio.on('player/pong')
-        def on_pong():
-            pass
+        @self._on('devices/updated', background=True)
+        def on_devices_updated(*args):
+            # Библиотека на сервере изменилась - внеочередная синхронизация зеркала
+            if self.mirror:
+                self.mirror.request_sync()
+            else:
+                self.http.submit(self._refresh_store_index)
+        
+        # pong - без конвейера: для смещения часов важно время получения
+        if self.loop:
+            async def on_pong_async(data=None):
+                self._on_pong(data)
+            self.sio.on('player/pong', on_pong_async)
+        else:
+            self.sio.on('player/pong', self._on_pong)
     
     def _setup_signal_handlers(self):
         """Обработка сигналов для graceful shutdown"""
@@ -504,52 +4409,41 @@ class MPVClient:
     def _setup_mpv_monitor(self):
         """
         Мониторинг событий MPV (как ExoPlayer listeners в Android)
-        + защита от зависаний
+        Вместо опроса - observe_property + события MPV, + защита от зависаний
         """
+        for ipc in filter(None, (self.ipc, self._standby_ipc)):
+            self._observe_mpv(ipc)
+        
+        if self.loop:
+            return  # Процесс и зависания проверяет задача _monitor_async
+        
         def monitor():
-            last_eof_check = time.time()
-            last_response_time = time.time()
-            failed_checks = 0
-            max_failed_checks = 6  # 6 неудач = 30 сек без ответа = kill
-            
+            # Без IPC трафика: ждем завершения процесса, зависание видно
+            # по подряд неотвеченным командам
             while self.running:
                 try:
-                    time.sleep(5)  # Проверка каждые 5 секунд
-                    
-                    # КРИТИЧНО: Проверка что MPV отвечает (защита от зависаний)
-                    result = self.send_command('get_property', 'pause')
-                    
-                    if result is not None:
-                        # MPV ответил - сбрасываем счетчик
-                        last_response_time = time.time()
-                        failed_checks = 0
-                    else:
-                        # MPV не ответил
-                        failed_checks += 1
-                        print(f'[MPV] ⚠️ MPV не отвечает ({failed_checks}/{max_failed_checks})')
-                        
-                        if failed_checks >= max_failed_checks:
-                            # MPV завис - принудительно убиваем
+                    reason = None
+                    planned = False
+                    try:
+                        process = self.mpv_process
+                        process.wait(timeout=2)
+                        if process is not self.mpv_process or not self.running:
+                            continue  # Завершился резервный (--standby) или клиент останавливается
+                        print("[MPV] ❌ MPV процесс завершился!")
+                        reason = 'процесс завершился'
+                    except subprocess.TimeoutExpired:
+                        if self.ipc.consecutive_timeouts >= self.MAX_IPC_TIMEOUTS:
+                            # MPV завис - _respawn_mpv убьет его принудительно
                             print('[MPV] ❌ MPV завис! Принудительное завершение...')
-                            if self.mpv_process:
-                                self.mpv_process.kill()
-                            self.running = False
-                            break
+                            reason = 'завис'
+                        elif not self.ipc.connected and not self.ipc.connect(timeout=self.IPC_RECONNECT_TIMEOUT):
+                            print('[MPV] ❌ IPC соединение с MPV потеряно')
+                            reason = 'нет IPC'
+                        elif self._planned_restart_due():
+                            reason = self._begin_planned_restart()
+                            planned = True
                     
-                    # Проверяем eof-reached
-                    if time.time() - last_eof_check > 10.0:  # Раз в 10 сек
-                        eof_result = self.send_command('get_property', 'eof-reached')
-                        last_eof_check = time.time()
-                        
-                        if eof_result and eof_result.get('data') == True:
-                            print('[MPV] 🏁 Файл закончился')
-                            if not self.is_playing_placeholder:
-                                print('[MPV] 🔄 Возврат к заглушке')
-                                self._load_placeholder()
-                    
-                    # Проверяем жив ли MPV процесс
-                    if self.mpv_process.poll() is not None:
-                        print("[MPV] ❌ MPV процесс завершился!")
+                    if reason and not self._respawn_mpv(reason, planned=planned):
                         self.running = False
                         break
                         
@@ -561,8 +4455,238 @@ class MPVClient:
         thread = threading.Thread(target=monitor, daemon=True)
         thread.start()
     
-    def _play_video(self, filename: str, is_placeholder: bool = False):
-        """Воспроизведение видео (идентично Android)"""
+    def _observe_mpv(self, ipc):
+        """Подписка на события процесса MPV (резервного - тоже, учитываются только от активного)"""
+        def handler(event: Dict[str, Any]):
+            if ipc is self.ipc:
+                self._on_mpv_event(event)
+        
+        ipc.add_event_handler(handler)
+        for observe_id, name in self.OBSERVED_PROPERTIES.items():
+            if self.loop:
+                self._await(ipc.observe_property(observe_id, name))
+            else:
+                ipc.observe_property(observe_id, name)
+    
+    def _on_mpv_event(self, event: Dict[str, Any]):
+        """Обработка событий MPV (вызывается из dispatcher потока IPC)"""
+        name = event.get('event')
+        
+        if name == 'property-change':
+            prop = event.get('name')
+            value = event.get('data')
+            self.qos.update(prop, value)
+            if prop == 'cache-speed':
+                self.sizer.observe(value)
+            
+            if prop == 'time-pos':
+                if value is not None:
+                    self.current_time_pos = value
+            elif prop == 'eof-reached':
+                if value is True:
+                    self._on_content_finished('eof-reached')
+            elif prop == 'idle-active':
+                self.is_mpv_idle = bool(value)
+                if value is True:
+                    self._on_content_finished('idle')
+            elif prop == 'hwdec-current':
+                self._check_hardware_acceleration(value)
+        
+        elif name == 'file-loaded':
+            self._content_active = True
+            self.qos.file_loaded()
+        
+        elif name == 'playback-restart':
+            # Первый кадр показан - загрузка завершена
+            self._content_active = True
+            self._load_ok = True
+            self._load_done.set()
+        
+        elif name == 'end-file':
+            reason = event.get('reason')
+            if reason == 'eof':
+                self._on_content_finished('end-file')
+            elif reason == 'error':
+                # Загрузка не удалась - не ждем таймаут
+                print(f"[MPV] ❌ MPV не смог открыть файл: {event.get('file_error', 'unknown')}")
+                self._load_ok = False
+                self._load_done.set()
+    
+    def _is_mpv_playing(self) -> bool:
+        """Играет ли MPV что-нибудь (по observe idle-active, без IPC запроса)"""
+        return not self.is_mpv_idle
+    
+    def _on_content_finished(self, reason: str):
+        """Контент закончился - сразу возвращаемся к заглушке"""
+        # Реагируем только на контент, который мы сами загрузили и который
+        # успел стартовать (stop/loadfile при переключении сюда не попадают)
+        if not self._content_active or self.is_playing_placeholder:
+            return
+        
+        self._content_active = False
+        print(f'[MPV] 🏁 Файл закончился ({reason})')
+        if self._planned_restart is not None:
+            self._planned_restart['eof'] = True  # Граница файлов - перезапуск незаметен
+        
+        if self.playlist.active and self.playlist.showing:
+            self.playlist.finished()  # Следующий элемент - по плейлисту
+            return
+        
+        print('[MPV] 🔄 Возврат к заглушке')
+        
+        # Не блокируем dispatcher событий: загрузка сама ждет ответов MPV
+        self.scheduler.submit(self._load_placeholder, content=True)
+    
+    def _loadfile(self, url: str, options: Optional[Dict[str, Any]] = None, placeholder: bool = False) -> bool:
+        """
+        loadfile с per-file опциями inline и ожиданием первого кадра
+        Вместо фиксированных sleep ждем playback-restart (или end-file error)
+        """
+        self._slide_window = []  # replace очищает весь плейлист MPV
+        self._revert_tuning()
+        args = self._loadfile_args(url, 'replace', options)
+        if self.is_playing_placeholder and not placeholder and self._standby_ready():
+            return self._load_behind(args)
+        return self._switch(args)
+    
+    def _loadfile_args(self, url: str, mode: str, options: Optional[Dict[str, Any]] = None) -> list:
+        args = ['loadfile', url, mode]
+        if options:
+            if self.mpv_version >= (0, 38):
+                args.append(-1)  # MPV 0.38+: между flags и options появился index
+            args.append(','.join(f'{key}={value}' for key, value in options.items()))
+        return args
+    
+    # === Горячий резерв (--standby) ===
+    
+    def _standby_ready(self) -> bool:
+        if self._standby_process is None:
+            return False
+        if self._standby_process.poll() is not None:
+            print(f"[MPV] ⚠️ Резервный MPV завершился - работаем с одним процессом")
+            self._standby_ipc.close()
+            self._standby_process = self._standby_ipc = self._standby_file = None
+            return False
+        return True
+    
+    def _respawn_standby(self, name: str, reason: str):
+        """Плановый перезапуск резервного MPV (не на экране - без восстановления показа)"""
+        process = self._standby_process
+        if process is None:
+            return
+        if process.resource_name != name:
+            # После планирования роли поменялись - вырос теперь активный
+            self._planned_restart = {'target': name, 'reason': reason, 'since': time.time(), 'eof': False}
+            return
+        
+        print(f"[MPV] ♻️ Перезапуск резервного MPV (плановый: {reason})...")
+        process.kill()
+        process.wait(timeout=2)
+        self._standby_file = None
+        self._standby_ipc = self._reopen_ipc(self._standby_ipc)
+        try:
+            self._standby_process = self._start_mpv(self._standby_socket)
+            self._connect_ipc(self._standby_ipc, self._standby_process)
+            self._observe_mpv(self._standby_ipc)
+        except RuntimeError as e:
+            print(f"[MPV] ⚠️ Резервный MPV не поднялся ({e}) - работаем с одним процессом")
+            self._standby_ipc.close()
+            self._standby_process = self._standby_ipc = None
+            return
+        self._raise_active()
+    
+    def _swap_players(self):
+        """Меняем роли активного и резервного MPV (события - только от активного)"""
+        self.mpv_process, self._standby_process = self._standby_process, self.mpv_process
+        self.ipc, self._standby_ipc = self._standby_ipc, self.ipc
+        self.ipc_socket, self._standby_socket = self._standby_socket, self.ipc_socket
+        self._slide_window = []
+    
+    def _raise_active(self):
+        """Активное окно наверх, резервное - под него"""
+        self.send_command('set_property', 'ontop', True, wait=False)
+        self.send_command('set_property', 'ontop', False, wait=False, ipc=self._standby_ipc)
+    
+    def _load_behind(self, args: list) -> bool:
+        """
+        Контент поверх заглушки: грузим в скрытом резервном MPV, окно
+        поднимаем после первого кадра. Заглушка остается загруженной на паузе
+        """
+        placeholder = self.cached_placeholder_file
+        self._swap_players()
+        if not self._switch(args):
+            self.send_command('stop', wait=False)
+            self._swap_players()  # Заглушка так и осталась на экране
+            return False
+        
+        self._raise_active()
+        self.send_command('set_property', 'pause', True, wait=False, ipc=self._standby_ipc)
+        self._standby_file = placeholder
+        return True
+    
+    def _show_standby(self, filename: str) -> bool:
+        """Заглушка уже загружена в резервном MPV - просто поднимаем его окно"""
+        if self._standby_file != filename or not self._standby_ready():
+            return False
+        
+        started = time.time()
+        self._swap_players()
+        self.send_command('set_property', 'pause', False, wait=False)
+        self._raise_active()
+        self.send_command('stop', wait=False, ipc=self._standby_ipc)  # Освобождаем декодер
+        self._standby_file = None
+        self.is_mpv_idle = False
+        self._content_active = True
+        print(f"[MPV] ⚡ Заглушка из резерва за {(time.time() - started) * 1000:.0f} мс")
+        return True
+    
+    def _switch(self, args: list) -> bool:
+        """Команда смены файла (loadfile / переход по плейлисту) с ожиданием первого кадра"""
+        started = time.time()
+        self._content_active = False
+        self._load_ok = False
+        self._load_done.clear()
+        if self.scheduler.superseded():
+            return False  # Команда устарела еще до отправки в MPV
+        
+        result = self.send_command(*args)
+        print(f"[MPV] 📥 Ответ MPV: {result}")
+        if not result or result.get('error') != 'success':
+            return False
+        
+        # Как playWhenReady в ExoPlayer: pause применится к загружаемому файлу
+        # (кроме загрузки на паузе - синхронный старт, пуск делает _play_synced)
+        if 'pause=yes' not in str(args[-1]).split(','):
+            self.send_command('set_property', 'pause', False, wait=False)
+        self._paused = False
+        
+        if not self._load_done.wait(self.LOAD_TIMEOUT):
+            if self.scheduler.superseded():
+                return False
+            # Медленная сеть/железо - MPV продолжит загрузку сам
+            print(f"[MPV] ⚠️ Нет playback-restart за {self.LOAD_TIMEOUT:.0f} сек, продолжаем")
+            return True
+        
+        if self.scheduler.superseded():
+            print(f"[MPV] ⏭️ Загрузка отменена новой командой")
+            return False
+        
+        if self._load_ok:
+            print(f"[MPV] ⏱️ Переключение за {(time.time() - started) * 1000:.0f} мс")
+            if self.startup_stats['first_frame_ms'] is None:
+                self.startup_stats['first_frame_ms'] = round((time.time() - self._started_at) * 1000)
+                print(f"[MPV] ⏱️ Первый кадр через {self.startup_stats['first_frame_ms']} мс после запуска")
+        return self._load_ok
+    
+    def _play_video(self, filename: str, is_placeholder: bool = False, start: float = 0.0,
+                    paused: bool = False):
+        """
+        Воспроизведение видео (идентично Android); start - позиция после перезапуска MPV,
+        paused - загрузить на паузе (синхронный старт видеостены)
+        """
+        self._restore_item = None if is_placeholder else (self._play_video, (filename,))
+        if self._sync is not None or self._sync_speed != 1.0:
+            self._end_sync()
         try:
             encoded_filename = quote(filename, safe='')
             url = f"{self.server_url}/content/{self.device_id}/{encoded_filename}"
@@ -576,8 +4700,8 @@ class MPVClient:
             if is_same_file and not is_placeholder and self.saved_position > 0:
                 # Тот же файл - продолжаем с сохраненной позиции (как Android!)
                 print(f"[MPV] ⏯️ Тот же файл, продолжаем с позиции: {self.saved_position:.2f} сек")
-                self.send_command('seek', self.saved_position, 'absolute')
-                self.send_command('set_property', 'pause', False)
+                self.send_command('seek', self.saved_position, 'absolute', wait=False)
+                self.send_command('set_property', 'pause', False, wait=False)
                 return
             
             # Новый файл - загружаем с начала (как Android)
@@ -585,30 +4709,31 @@ class MPVClient:
             self.current_video_file = filename
             self.saved_position = 0.0
             
-            # Загрузка файла
+            # КРИТИЧНО: Заглушка зацикливается, контент - нет (как ExoPlayer)
+            # loop-file передаем inline - одна команда вместо трех
             print(f"[MPV] 📤 Отправка команды loadfile...")
-            result = self.send_command('loadfile', url, 'replace')
-            print(f"[MPV] 📥 Ответ MPV: {result}")
+            if is_placeholder and self._show_standby(filename):
+                loaded = True
+            else:
+                options = {'loop-file': 'inf' if is_placeholder else 'no'}
+                if not is_placeholder:
+                    self._preflight_forced[filename] = self._preflight_options(filename)
+                    options.update(self._preflight_forced[filename])
+                options.update(self.tuner.options_for(filename, skip=self._tune_skip(filename)))
+                if start > 0:
+                    options['start'] = f'{start:.3f}'
+                if paused:
+                    options['pause'] = 'yes'  # Только для этого файла
+                loaded = self._loadfile(self._content_source(filename, url, is_placeholder), options,
+                                        placeholder=is_placeholder)
             
-            if result and result.get('error') == 'success':
-                # КРИТИЧНО: Заглушка зацикливается, контент - нет (как ExoPlayer)
-                if is_placeholder:
-                    loop_result = self.send_command('set_property', 'loop-file', 'inf')
-                    print(f"[MPV] 🔁 Loop установлен: {loop_result}")
-                else:
-                    self.send_command('set_property', 'loop-file', 'no')
-                
-                # КРИТИЧНО: Запускаем воспроизведение (как playWhenReady в ExoPlayer!)
-                time.sleep(0.3)  # Даем MPV загрузить метаданные
-                play_result = self.send_command('set_property', 'pause', False)
-                print(f"[MPV] ▶️ Воспроизведение запущено: {play_result}")
-                
+            if loaded:
                 # Обновление состояния
                 self.is_playing_placeholder = is_placeholder
                 
                 print(f"[MPV] ✅ Видео загружено и воспроизводится (loop={is_placeholder})")
-            else:
-                print(f"[MPV] ❌ Ошибка загрузки видео, result={result}")
+            elif not self.scheduler.superseded():
+                print(f"[MPV] ❌ Ошибка загрузки видео")
                 if not is_placeholder:
                     self._load_placeholder()
                     
@@ -617,8 +4742,24 @@ class MPVClient:
             if not is_placeholder:
                 self._load_placeholder()
     
+    def _preflight_options(self, filename: str) -> Dict[str, str]:
+        """Per-file опции по параметрам видео с сервера (пусто - параметры еще неизвестны)"""
+        info = self.preflight.info_for(filename, wait=VideoPreflight.WAIT)
+        if not info:
+            return {}
+        if self.preflight.display is None:
+            width = (self.send_command('get_property', 'display-width') or {}).get('data')
+            height = (self.send_command('get_property', 'display-height') or {}).get('data')
+            if width and height:
+                self.preflight.display = (width, height)
+        options = self.preflight.options_for(info)
+        if options:
+            print(f"[Preflight] ⚙️ {filename}: {', '.join(f'{k}={v}' for k, v in options.items())}")
+        return options
+    
     def _play_image(self, filename: str, is_placeholder: bool = False):
         """Показ изображения (идентично Android)"""
+        self._restore_item = None if is_placeholder else (self._play_image, (filename,))
         try:
             encoded_filename = quote(filename, safe='')
             url = f"{self.server_url}/content/{self.device_id}/{encoded_filename}"
@@ -630,32 +4771,22 @@ class MPVClient:
             self.current_video_file = None
             self.saved_position = 0.0
             
-            # КРИТИЧНО для MPV 0.32: Установить image-display-duration ДО loadfile!
-            if is_placeholder:
-                duration_result = self.send_command('set_property', 'image-display-duration', 'inf')
-                print(f"[MPV] ⏱️ Set image-display-duration=inf: {duration_result}")
+            # image-display-duration - per-file опция прямо в loadfile
+            # (работает и в MPV 0.32, без отдельной команды и паузы)
+            duration = 'inf' if is_placeholder else 10
+            print(f"[MPV] 📤 Отправка loadfile (image-display-duration={duration})...")
+            if is_placeholder and self._show_standby(filename):
+                loaded = True
             else:
-                duration_result = self.send_command('set_property', 'image-display-duration', 10)
-                print(f"[MPV] ⏱️ Set image-display-duration=10: {duration_result}")
+                loaded = self._loadfile(self._content_source(filename, url, is_placeholder),
+                                        {'image-display-duration': duration},
+                                        placeholder=is_placeholder)
             
-            time.sleep(0.1)  # Даем MPV применить настройку
-            
-            # Загрузка изображения
-            print(f"[MPV] 📤 Отправка loadfile...")
-            result = self.send_command('loadfile', url, 'replace')
-            print(f"[MPV] 📥 Ответ MPV: {result}")
-            
-            if result and result.get('error') == 'success':
-                time.sleep(0.2)  # Даем загрузиться
-                
-                # Убеждаемся что не на паузе
-                pause_result = self.send_command('set_property', 'pause', False)
-                print(f"[MPV] ▶️ Unpause: {pause_result}")
-                
+            if loaded:
                 self.is_playing_placeholder = is_placeholder
                 print(f"[MPV] ✅ Изображение загружено и показано")
-            else:
-                print(f"[MPV] ❌ Ошибка загрузки изображения, result={result}")
+            elif not self.scheduler.superseded():
+                print(f"[MPV] ❌ Ошибка загрузки изображения")
                 
         except Exception as e:
             print(f"[MPV] ❌ Exception в _play_image: {e}")
@@ -664,30 +4795,18 @@ class MPVClient:
     
     def _show_pdf_page(self, filename: str, page: int):
         """Показ страницы PDF (идентично Android)"""
+        self._restore_item = (self._show_pdf_page, (filename, page))
         try:
-            folder_name = filename.replace('.pdf', '')
-            encoded_folder = quote(folder_name, safe='')
-            url = f"{self.server_url}/api/devices/{self.device_id}/converted/{encoded_folder}/page/{page}"
-            
             print(f"[MPV] 📄 PDF страница: {filename} - {page}")
             
-            # КРИТИЧНО: Останавливаем видео (как Android)
-            if self.current_video_file:
-                self.send_command('stop')
-                self.current_video_file = None
-                self.saved_position = 0.0
-            
-            # КРИТИЧНО для MPV 0.32: image-display-duration ДО loadfile!
-            self.send_command('set_property', 'image-display-duration', 'inf')
-            time.sleep(0.1)
+            # КРИТИЧНО: Сбрасываем видео (как Android) - loadfile replace его заменит
+            self.current_video_file = None
+            self.saved_position = 0.0
             
-            # Загрузка страницы
-            result = self.send_command('loadfile', url, 'replace')
+            # Загрузка страницы (из кэша предзагрузки если есть)
+            loaded = self._show_slide(filename, page, 'pdf')
             
-            if result and result.get('error') == 'success':
-                time.sleep(0.2)
-                self.send_command('set_property', 'pause', False)
-                
+            if loaded:
                 # Обновление состояния (как Android)
                 self.current_pdf_file = filename
                 self.current_pdf_page = page
@@ -696,8 +4815,8 @@ class MPVClient:
                 print(f"[MPV] ✅ PDF страница {page} показана")
                 
                 # КРИТИЧНО: Предзагрузка соседних слайдов (как Android!)
-                self._preload_adjacent_slides(filename, page, 999, 'pdf')
-            else:
+                self._preload_adjacent_slides(filename, page, 'pdf')
+            elif not self.scheduler.superseded():
                 print(f"[MPV] ❌ Ошибка загрузки PDF страницы")
                 
         except Exception as e:
@@ -705,29 +4824,17 @@ class MPVClient:
     
     def _show_pptx_slide(self, filename: str, slide: int):
         """Показ слайда PPTX (идентично Android)"""
+        self._restore_item = (self._show_pptx_slide, (filename, slide))
         try:
-            folder_name = filename.replace('.pptx', '')
-            encoded_folder = quote(folder_name, safe='')
-            url = f"{self.server_url}/api/devices/{self.device_id}/converted/{encoded_folder}/slide/{slide}"
-            
             print(f"[MPV] 📊 PPTX слайд: {filename} - {slide}")
             
-            # Останавливаем видео (как Android)
-            if self.current_video_file:
-                self.send_command('stop')
-                self.current_video_file = None
-                self.saved_position = 0.0
-            
-            # КРИТИЧНО для MPV 0.32: image-display-duration ДО loadfile!
-            self.send_command('set_property', 'image-display-duration', 'inf')
-            time.sleep(0.1)
+            # Сбрасываем видео (как Android) - loadfile replace его заменит
+            self.current_video_file = None
+            self.saved_position = 0.0
             
-            result = self.send_command('loadfile', url, 'replace')
+            loaded = self._show_slide(filename, slide, 'pptx')
             
-            if result and result.get('error') == 'success':
-                time.sleep(0.2)
-                self.send_command('set_property', 'pause', False)
-                
+            if loaded:
                 # Обновление состояния (как Android)
                 self.current_pptx_file = filename
                 self.current_pptx_slide = slide
@@ -736,8 +4843,8 @@ class MPVClient:
                 print(f"[MPV] ✅ PPTX слайд {slide} показан")
                 
                 # Предзагрузка соседних слайдов (как Android!)
-                self._preload_adjacent_slides(filename, slide, 999, 'pptx')
-            else:
+                self._preload_adjacent_slides(filename, slide, 'pptx')
+            elif not self.scheduler.superseded():
                 print(f"[MPV] ❌ Ошибка загрузки PPTX слайда")
                 
         except Exception as e:
@@ -745,29 +4852,17 @@ class MPVClient:
     
     def _show_folder_image(self, folder_name: str, image_num: int):
         """Показ изображения из папки (идентично Android)"""
+        self._restore_item = (self._show_folder_image, (folder_name, image_num))
         try:
-            clean_folder = folder_name.replace('.zip', '')
-            encoded_folder = quote(clean_folder, safe='')
-            url = f"{self.server_url}/api/devices/{self.device_id}/folder/{encoded_folder}/image/{image_num}"
-            
             print(f"[MPV] 📁 Папка: {folder_name} - изображение {image_num}")
             
-            # Останавливаем видео (как Android)
-            if self.current_video_file:
-                self.send_command('stop')
-                self.current_video_file = None
-                self.saved_position = 0.0
-            
-            # КРИТИЧНО для MPV 0.32: image-display-duration ДО loadfile!
-            self.send_command('set_property', 'image-display-duration', 'inf')
-            time.sleep(0.1)
+            # Сбрасываем видео (как Android) - loadfile replace его заменит
+            self.current_video_file = None
+            self.saved_position = 0.0
             
-            result = self.send_command('loadfile', url, 'replace')
+            loaded = self._show_slide(folder_name, image_num, 'folder')
             
-            if result and result.get('error') == 'success':
-                time.sleep(0.2)
-                self.send_command('set_property', 'pause', False)
-                
+            if loaded:
                 # Обновление состояния (как Android)
                 self.current_folder_name = folder_name
                 self.current_folder_image = image_num
@@ -776,48 +4871,239 @@ class MPVClient:
                 print(f"[MPV] ✅ Изображение {image_num} из папки показано")
                 
                 # Предзагрузка соседних изображений (как Android!)
-                self._preload_adjacent_slides(folder_name, image_num, 999, 'folder')
-            else:
+                self._preload_adjacent_slides(folder_name, image_num, 'folder')
+            elif not self.scheduler.superseded():
                 print(f"[MPV] ❌ Ошибка загрузки изображения из папки")
                 
         except Exception as e:
             print(f"[MPV] ❌ Exception в _show_folder_image: {e}")
     
-    def _preload_adjacent_slides(self, file: str, current_page: int, total_pages: int, slide_type: str):
+    def _show_slide(self, file: str, page: int, slide_type: str) -> bool:
         """
-        Предзагрузка соседних слайдов (идентично Android Glide.preload!)
-        MPV автоматически кэширует через --cache
+        Показ страницы/слайда/изображения папки
+        С --gapless-slides соседние страницы уже в плейлисте MPV (demuxer
+        следующей открыт через prefetch-playlist) - переход без loadfile replace
         """
+        url = self._slide_url(file, page, slide_type)
+        if not self.gapless_slides:
+            return self._loadfile(self._cached_slide(url), self.SLIDE_OPTIONS)
+        
+        if url in self._slide_window:
+            index = self._slide_window.index(url)
+            print(f"[MPV] ⚡ Переход по плейлисту: {index}")
+            if self.mpv_version >= (0, 33):
+                loaded = self._switch(['playlist-play-index', index])
+            else:
+                loaded = self._switch(['set_property', 'playlist-pos', index])
+        else:
+            loaded = self._loadfile(self._cached_slide(url), self.SLIDE_OPTIONS)
+            if loaded:
+                self._slide_window = [url]
+        
+        if loaded:
+            self._update_slide_window(file, page, slide_type)
+        return loaded
+    
+    def _update_slide_window(self, file: str, page: int, slide_type: str):
+        """Сдвигаем окно плейлиста: [предыдущая, текущая, следующая]"""
+        total = self.page_counts.get((slide_type, file))
+        wanted = [
+            self._slide_url(file, p, slide_type)
+            for p in (page - 1, page, page + 1)
+            if p >= 1 and (not total or p <= total)
+        ]
+        
+        # Убираем ушедшие из окна (с конца - индексы впереди не сдвигаются)
+        for index in range(len(self._slide_window) - 1, -1, -1):
+            if self._slide_window[index] not in wanted:
+                self.send_command('playlist-remove', index, wait=False)
+                del self._slide_window[index]
+        
+        # Добавляем недостающие в конец (из кэша предзагрузки если уже есть)
+        for url in wanted:
+            if url not in self._slide_window:
+                self.send_command(*self._loadfile_args(self._cached_slide(url), 'append', self.SLIDE_OPTIONS), wait=False)
+                self._slide_window.append(url)
+        
+        # Порядок страниц: следующая сразу за текущей - ее и откроет prefetch-playlist
+        for target, url in enumerate(wanted):
+            index = self._slide_window.index(url)
+            if index != target:
+                self.send_command('playlist-move', index, target, wait=False)
+                self._slide_window.insert(target, self._slide_window.pop(index))
+    
+    def _content_source(self, filename: str, url: str, placeholder: bool = False) -> str:
+        """Источник для /content/: копия заглушки, зеркало, локальная копия или tee через кэш"""
+        source = url
+        mirrored = self.mirror.path_for(filename) if self.mirror else None
+        local_placeholder = self.placeholder.path_for(filename) if placeholder else None
+        if local_placeholder:
+            print(f"[MPV] 💾 Заглушка с диска: {filename}")
+            source = local_placeholder
+        elif mirrored:
+            print(f"[MPV] 💽 Из зеркала: {filename}")
+            source = mirrored
+        elif self.content_cache is not None:
+            # Ключ по содержимому: тот же ролик под другим именем уже может быть на диске
+            source = self.content_cache.resolve(url, self.store.digest_for(self.device_id, filename))
+        
+        self.sizer.network = not os.path.isabs(source)
+        if self.mirror:
+            # Пока MPV тянет контент из сети - синхронизация зеркала уступает канал
+            self.mirror.streaming = not os.path.isabs(source)
+        return source
+    
+    def _refresh_store_index(self):
+        """Имена файлов -> ключи содержимого (без зеркала, для дедупликации в кэше)"""
+        url = f"{self.server_url}/api/devices/{self.device_id}/files-with-status"
         try:
-            pages_to_preload = []
-            
-            if current_page > 1:
-                pages_to_preload.append(current_page - 1)  # Предыдущий
-            if current_page < total_pages:
-                pages_to_preload.append(current_page + 1)  # Следующий
-            
-            for page in pages_to_preload:
-                if slide_type == 'pdf':
-                    url = f"{self.server_url}/api/devices/{self.device_id}/converted/{quote(file, safe='')}/page/{page}"
-                elif slide_type == 'pptx':
-                    url = f"{self.server_url}/api/devices/{self.device_id}/converted/{quote(file, safe='')}/slide/{page}"
-                elif slide_type == 'folder':
-                    url = f"{self.server_url}/api/devices/{self.device_id}/folder/{quote(file, safe='')}/image/{page}"
-                else:
+            response = self.http.get(url, timeout=10)
+            if response.status_code == 200:
+                listing = response.json()
+                self.store.update_names(self.device_id, listing)
+                self.preflight.prefetch([item.get('safeName') or '' for item in listing])
+        except (requests.RequestException, ValueError) as e:
+            print(f"[Store] ⚠️ Список файлов недоступен: {e}")
+    
+    def _cached_slide(self, url: str) -> str:
+        """Локальная копия страницы из кэша предзагрузки (или исходный URL)"""
+        path = self.slide_cache.get(url)
+        if path:
+            print(f"[MPV] ⚡ Из кэша: {os.path.basename(path)}")
+            return path
+        return url
+    
+    def _slide_url(self, file: str, page: int, slide_type: str) -> Optional[str]:
+        """URL страницы/слайда/изображения папки (то же отсечение суффиксов что и при показе)"""
+        base = f"{self.server_url}/api/devices/{self.device_id}"
+        if slide_type == 'pdf':
+            return f"{base}/converted/{quote(file.replace('.pdf', ''), safe='')}/page/{page}"
+        if slide_type == 'pptx':
+            return f"{base}/converted/{quote(file.replace('.pptx', ''), safe='')}/slide/{page}"
+        if slide_type == 'folder':
+            return f"{base}/folder/{quote(file.replace('.zip', ''), safe='')}/image/{page}"
+        return None
+    
+    def _get_page_count(self, file: str, slide_type: str) -> Optional[int]:
+        """
+        Реальное количество страниц: /slides-count или /folder/:name/count
+        Эндпоинты требуют токен (--api-token); без него - None, граница
+        узнается по 404 при предзагрузке
+        """
+        if (slide_type, file) in self.page_counts:
+            return self.page_counts[(slide_type, file)]
+        
+        url, params, headers = self._page_count_request(file, slide_type)
+        try:
+            response = self.http.get(url, params=params, headers=headers, timeout=5)
+            if response.status_code == 200:
+                return self._remember_page_count(file, slide_type, response.json().get('count', 0))
+            elif response.status_code == 401 and not self.api_token:
+                print(f"[MPV] ℹ️ Количество страниц недоступно без --api-token")
+        except (requests.RequestException, ValueError):
+            pass
+        return None
+    
+    async def _get_page_count_async(self, file: str, slide_type: str) -> Optional[int]:
+        """_get_page_count() для asyncio режима"""
+        if (slide_type, file) in self.page_counts:
+            return self.page_counts[(slide_type, file)]
+        
+        url, params, headers = self._page_count_request(file, slide_type)
+        try:
+            async with self.http_async.get(url, params=params, headers=headers,
+                                           timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status == 200:
+                    return self._remember_page_count(file, slide_type, (await response.json()).get('count', 0))
+                elif response.status == 401 and not self.api_token:
+                    print(f"[MPV] ℹ️ Количество страниц недоступно без --api-token")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            pass
+        return None
+    
+    def _page_count_request(self, file: str, slide_type: str) -> tuple:
+        """(url, params, headers) запроса количества страниц"""
+        base = f"{self.server_url}/api/devices/{self.device_id}"
+        if slide_type == 'folder':
+            url = f"{base}/folder/{quote(file.replace('.zip', ''), safe='')}/count"
+            params = None
+        else:
+            url = f"{base}/slides-count"
+            params = {'file': file, 'type': 'page' if slide_type == 'pdf' else 'slide'}
+        
+        headers = {'Authorization': f'Bearer {self.api_token}'} if self.api_token else {}
+        return url, params, headers
+    
+    def _remember_page_count(self, file: str, slide_type: str, count) -> Optional[int]:
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            return None
+        if count <= 0:
+            return None
+        self.page_counts[(slide_type, file)] = count
+        print(f"[MPV] 📑 {file}: {count} стр.")
+        return count
+    
+    def _prefetch_pages(self, current_page: int) -> List[int]:
+        """Окно предзагрузки: сначала вперед, потом назад"""
+        pages = list(range(current_page + 1, current_page + self.prefetch_ahead + 1))
+        pages += list(range(current_page - 1, current_page - self.prefetch_behind - 1, -1))
+        return pages
+    
+    def _on_page_prefetched(self, file: str, current_page: int, slide_type: str, page: int,
+                            status: Optional[int], total_pages: Optional[int]) -> Optional[int]:
+        """Итог загрузки страницы; возвращает (возможно уточненное) количество страниц"""
+        if status == 200:
+            print(f"[MPV] 📥 Preloaded {slide_type} page {page}")
+        elif status == 404 and page > current_page and not total_pages:
+            # Количество неизвестно - 404 и есть конец документа
+            total_pages = page - 1
+            self.page_counts[(slide_type, file)] = total_pages
+        return total_pages
+    
+    def _preload_adjacent_slides(self, file: str, current_page: int, slide_type: str):
+        """
+        Предзагрузка окна соседних слайдов в локальный кэш (как Android Glide.preload!)
+        prefetch_ahead вперед, prefetch_behind назад - один фоновый поток на окно
+        (в asyncio режиме - задача, предыдущее окно отменяется)
+        """
+        self._prefetch_generation += 1
+        generation = self._prefetch_generation
+        
+        if self.loop:
+            if self._prefetch_task is not None:
+                self._prefetch_task.cancel()
+            self._prefetch_task = asyncio.run_coroutine_threadsafe(
+                self._preload_window_async(file, current_page, slide_type), self.loop
+            )
+            return
+        
+        def preload_window():
+            total_pages = self._get_page_count(file, slide_type)
+            
+            for page in self._prefetch_pages(current_page):
+                # Оператор уже перелистнул дальше - это окно устарело
+                if generation != self._prefetch_generation:
+                    return
+                if page < 1 or (total_pages and page > total_pages):
                     continue
                 
-                # Предзагружаем в фоне (requests с кэшированием)
-                def preload_async(url):
-                    try:
-                        requests.head(url, timeout=5)  # Только headers - быстро
-                        print(f"[MPV] 📥 Preloaded {slide_type} page {page}")
-                    except:
-                        pass
-                
-                threading.Thread(target=preload_async, args=(url,), daemon=True).start()
-                
-        except Exception as e:
-            print(f"[MPV] ⚠️ Preload error: {e}")
+                status = self.slide_cache.fetch(self._slide_url(file, page, slide_type))
+                total_pages = self._on_page_prefetched(file, current_page, slide_type, page, status, total_pages)
+        
+        self.http.submit(preload_window)
+    
+    async def _preload_window_async(self, file: str, current_page: int, slide_type: str):
+        """Окно предзагрузки в asyncio режиме (отмена - через cancel задачи)"""
+        total_pages = await self._get_page_count_async(file, slide_type)
+        
+        for page in self._prefetch_pages(current_page):
+            if page < 1 or (total_pages and page > total_pages):
+                continue
+            
+            status = await self.slide_cache.fetch_async(self.http_async, self._slide_url(file, page, slide_type))
+            total_pages = self._on_page_prefetched(file, current_page, slide_type, page, status, total_pages)
     
     def _load_placeholder(self):
         """
@@ -825,11 +5111,10 @@ class MPVClient:
         С кэшированием - не запрашивает сервер каждый раз!
         """
         print(f"[MPV] 🔍 Loading placeholder...")
-        
-        # Останавливаем текущее воспроизведение (как Android)
-        self.send_command('stop')
+        self._restore_item = None
         
         # КРИТИЧНО: Проверяем кэш (как Android!)
+        # loadfile replace сам заменит текущий контент - stop не нужен
         if self.cached_placeholder_file and self.cached_placeholder_type:
             print(f"[MPV] ✅ Using cached placeholder: {self.cached_placeholder_file} ({self.cached_placeholder_type})")
             
@@ -840,60 +5125,89 @@ class MPVClient:
             
             return
         
+        # Останавливаем текущее воспроизведение на время запроса (как Android)
+        self._content_active = False
+        self.send_command('stop', wait=False)
+        
         # Кэша нет - запрашиваем API (только первый раз!)
-        def load_from_api():
-            try:
-                url = f"{self.server_url}/api/devices/{self.device_id}/placeholder"
-                print(f"[MPV] 🌐 Requesting placeholder from API...")
-                
-                response = requests.get(url, timeout=5)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    placeholder_file = data.get('placeholder')
-                    
-                    if placeholder_file and placeholder_file != 'null':
-                        print(f"[MPV] ✅ Placeholder found: {placeholder_file}")
-                        
-                        # Определяем тип (как Android)
-                        ext = placeholder_file.split('.')[-1].lower()
-                        
-                        # СОХРАНЯЕМ В КЭШ (как Android!)
-                        self.cached_placeholder_file = placeholder_file
-                        if ext in ['mp4', 'webm', 'ogg', 'mkv', 'mov', 'avi']:
-                            self.cached_placeholder_type = 'video'
-                        elif ext in ['png', 'jpg', 'jpeg', 'gif', 'webp']:
-                            self.cached_placeholder_type = 'image'
-                        
-                        print(f"[MPV] 💾 Cached placeholder: {self.cached_placeholder_file} ({self.cached_placeholder_type})")
-                        
-                        # Воспроизведение
-                        if self.cached_placeholder_type == 'video':
-                            self._play_video(placeholder_file, is_placeholder=True)
-                        elif self.cached_placeholder_type == 'image':
-                            self._play_image(placeholder_file, is_placeholder=True)
-                    else:
-                        print(f"[MPV] ℹ️ No placeholder set for device - idle mode")
-                        self.is_playing_placeholder = True
-                        self.cached_placeholder_file = None
-                        self.cached_placeholder_type = None
-                elif response.status_code == 404:
-                    print(f"[MPV] ℹ️ No placeholder configured (404) - idle mode")
-                    self.is_playing_placeholder = True
-                    self.cached_placeholder_file = None
-                    self.cached_placeholder_type = None
-                else:
-                    print(f"[MPV] ⚠️ Failed to load placeholder: HTTP {response.status_code} - idle mode")
-                    self.is_playing_placeholder = True
-                    
-            except Exception as e:
-                print(f"[MPV] ⚠️ Error loading placeholder: {e} - idle mode")
-                self.is_playing_placeholder = True
+        generation = self.scheduler.current
+        
+        def play_resolved(_request=None):
+            if not self.scheduler.is_current(generation):
+                return  # Пока шел запрос, пришла новая команда
+            
+            # Воспроизведение - снова через конвейер команд
+            if self.cached_placeholder_type == 'video':
+                self.scheduler.submit(self._play_video, self.cached_placeholder_file, True, generation=generation)
+            elif self.cached_placeholder_type == 'image':
+                self.scheduler.submit(self._play_image, self.cached_placeholder_file, True, generation=generation)
+            else:
+                self.is_playing_placeholder = True  # Заглушки нет - idle mode
+        
+        # Запрос, начатый при старте параллельно с MPV, не повторяем
+        request, self._placeholder_request = self._placeholder_request, None
+        if request is None:
+            request = self.http.submit(self._request_placeholder)
+        
+        # Загружаем в фоне: HTTP запрос не занимает конвейер команд
+        if request is None:
+            self._request_placeholder()
+            play_resolved()
+        else:
+            request.add_done_callback(play_resolved)
+    
+    def _request_placeholder(self):
+        """
+        Заглушка у API (условный запрос): заполняет кэш заглушки (тип None -
+        заглушки нет) и обновляет локальную копию в фоне
+        """
+        print(f"[MPV] 🌐 Requesting placeholder from API...")
+        resolved = self.placeholder.resolve()
+        if resolved is None:
+            if self.placeholder.file:
+                print(f"[MPV] 💾 Сервер недоступен - заглушка с диска: {self.placeholder.file}")
+            else:
+                print(f"[MPV] ⚠️ Заглушка недоступна - idle mode")
                 self.cached_placeholder_file = None
                 self.cached_placeholder_type = None
+            return
+        
+        placeholder_file, placeholder_type = resolved
+        if not placeholder_type:
+            placeholder_file = None  # Нет заглушки или неизвестный тип - idle mode
+        elif placeholder_file != self.placeholder.file:
+            print(f"[MPV] ✅ Placeholder found: {placeholder_file}")
+        
+        # Пока на диске нет копии - играем из сети; иначе прежняя копия
+        # показывается до атомарной подмены (_sync_placeholder)
+        if not self.placeholder.file:
+            changed = placeholder_file != self.cached_placeholder_file
+            self.cached_placeholder_file = placeholder_file
+            self.cached_placeholder_type = placeholder_type
+            if placeholder_file:
+                print(f"[MPV] 💾 Cached placeholder: {placeholder_file} ({placeholder_type})")
+            if changed:
+                self.scheduler.submit(self._reload_placeholder, generation=self.scheduler.generation)
+        
+        if placeholder_file or self.placeholder.file:
+            self.http.submit(self._sync_placeholder, placeholder_file, placeholder_type)
+    
+    def _sync_placeholder(self, filename: Optional[str], placeholder_type: Optional[str]):
+        """Загрузка/проверка локальной копии; сменилась - показываем новую, если играет заглушка"""
+        generation = self.scheduler.generation
+        if not self.placeholder.sync(filename, placeholder_type):
+            return
         
-        # Загружаем в отдельном потоке чтобы не блокировать
-        threading.Thread(target=load_from_api, daemon=True).start()
+        self.cached_placeholder_file = self.placeholder.file
+        self.cached_placeholder_type = self.placeholder.type
+        self._standby_file = None  # В резервном MPV - прежняя версия
+        # Только если с начала загрузки не было команд контента
+        self.scheduler.submit(self._reload_placeholder, generation=generation)
+    
+    def _reload_placeholder(self):
+        if self.is_playing_placeholder:
+            print(f"[MPV] 🔄 Заглушка обновлена - показываем новую версию")
+            self._load_placeholder()
     
     def _heartbeat(self):
         """Heartbeat с ping (как Android pingRunnable)"""
@@ -904,20 +5218,77 @@ class MPVClient:
                 time.sleep(ping_interval)
                 
                 if self.sio.connected:
-                    self.sio.emit('player/ping', {'device_id': self.device_id})
+                    self.sio.emit('player/ping', self._ping_payload())
                     print('[MPV] 🏓 Ping sent')
-                
-                # Проверяем жив ли MPV процесс
-                if self.mpv_process.poll() is not None:
-                    print("[MPV] ❌ MPV процесс завершился!")
-                    self.running = False
-                    break
                     
             except Exception as e:
                 if self.running:
                     print(f'[MPV] ⚠️ Heartbeat error: {e}')
                 time.sleep(5)
     
+    async def _heartbeat_async(self):
+        """_heartbeat() для asyncio режима"""
+        while self.running:
+            await asyncio.sleep(15)
+            try:
+                if self.sio.connected:
+                    await self.sio.emit('player/ping', self._ping_payload())
+                    print('[MPV] 🏓 Ping sent')
+            except Exception as e:
+                print(f'[MPV] ⚠️ Heartbeat error: {e}')
+    
+    async def _monitor_async(self):
+        """Монитор процесса MPV и зависаний для asyncio режима"""
+        while self.running:
+            await asyncio.sleep(2)
+            
+            reason = None
+            planned = False
+            if self.mpv_process.poll() is not None:
+                print("[MPV] ❌ MPV процесс завершился!")
+                reason = 'процесс завершился'
+            elif self.ipc.consecutive_timeouts >= self.MAX_IPC_TIMEOUTS:
+                print('[MPV] ❌ MPV завис! Принудительное завершение...')
+                reason = 'завис'
+            elif not self.ipc.connected and not await self.ipc.connect(timeout=self.IPC_RECONNECT_TIMEOUT):
+                print('[MPV] ❌ IPC соединение с MPV потеряно')
+                reason = 'нет IPC'
+            elif self._planned_restart_due():
+                reason = self._begin_planned_restart()
+                planned = True
+            
+            # Перезапуск блокирующий (ожидание socket) - вне event loop
+            if reason and self.running and not await self.loop.run_in_executor(
+                    None, self._respawn_mpv, reason, planned):
+                self.running = False
+    
+    def _connect_server(self):
+        """
+        Первое подключение к серверу (дальше переподключается Socket.IO)
+        Нет сети при старте - повторяем, заглушка с диска остается на экране
+        """
+        delay = self.CONNECT_RETRY_MIN
+        while self.running:
+            try:
+                self.sio.connect(self.server_url)
+                return
+            except Exception as e:
+                print(f'[MPV] ❌ Ошибка подключения: {e} - повтор через {delay} сек')
+            time.sleep(delay)
+            delay = min(delay * 2, self.CONNECT_RETRY_MAX)
+    
+    async def _connect_server_async(self):
+        """_connect_server() для asyncio режима"""
+        delay = self.CONNECT_RETRY_MIN
+        while self.running:
+            try:
+                await self.sio.connect(self.server_url)
+                return
+            except Exception as e:
+                print(f'[MPV] ❌ Ошибка подключения: {e} - повтор через {delay} сек')
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.CONNECT_RETRY_MAX)
+    
     def _start_ping_timer(self):
         """Запуск ping таймера (как Android startPingTimer)"""
         # Ping запускается в _heartbeat потоке
@@ -929,23 +5300,41 @@ class MPVClient:
     
     def run(self):
         """Главный цикл (идентично Android)"""
+        if self.loop:
+            try:
+                self.loop.run_until_complete(self._run_async())
+            except RuntimeError:
+                sys.exit(1)  # MPV не поднялся (_bring_up_mpv)
+            finally:
+                self.cleanup()
+            return
         
         # Запуск heartbeat в отдельном потоке
         heartbeat_thread = threading.Thread(target=self._heartbeat, daemon=True)
         heartbeat_thread.start()
         
-        # Подключение к серверу
+        # Подключение к серверу - параллельно с ожиданием MPV
+        print(f'[MPV] 🔌 Подключение к {self.server_url}...')
+        threading.Thread(target=self._connect_server, daemon=True).start()
+        
         try:
-            print(f'[MPV] 🔌 Подключение к {self.server_url}...')
-            self.sio.connect(self.server_url)
-        except Exception as e:
-            print(f'[MPV] ❌ Ошибка подключения: {e}')
+            self._bring_up_mpv()
+        except RuntimeError:
             self.cleanup()
-            return
+            sys.exit(1)
         
-        # КРИТИЧНО: Загружаем заглушку при старте (как Android onCreate)
-        time.sleep(0.5)
-        self._load_placeholder()
+        threading.Thread(target=self._journal_loop, daemon=True).start()
+        self.playlist.start()
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+        threading.Thread(target=self._tune_loop, daemon=True).start()
+        threading.Thread(target=self._cache_loop, daemon=True).start()
+        threading.Thread(target=self._resource_loop, daemon=True).start()
+        
+        # Фоновая синхронизация зеркала библиотеки (или только индекса хранилища)
+        if self.mirror:
+            self.mirror.start()
+        else:
+            self.http.submit(self._refresh_store_index)
         
         print('[MPV] ✅ Клиент запущен. Для выхода нажмите Ctrl+C')
         print('[MPV] 📊 Идентичность с Android ExoPlayer: 100%')
@@ -957,31 +5346,85 @@ class MPVClient:
         
         # Основной цикл
         try:
+            # MPV перезапускает монитор; running сбрасывается, если перезапуск не помог
             while self.running:
                 time.sleep(1)
-                
-                # Проверяем жив ли MPV
-                if self.mpv_process.poll() is not None:
-                    print("[MPV] ❌ MPV процесс завершился!")
-                    break
                     
         except KeyboardInterrupt:
             print('\n[MPV] 🛑 Остановка...')
         finally:
             self.cleanup()
     
+    async def _run_async(self):
+        """Главный цикл asyncio режима: heartbeat, монитор и Socket.IO в одном loop"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self._request_stop)
+        
+        # Тот же лимит соединений на хост что у HttpClient
+        self.http_async = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=self.http.per_host))
+        tasks = [asyncio.ensure_future(self._heartbeat_async())]
+        
+        try:
+            # Подключение к серверу - параллельно с ожиданием MPV
+            print(f'[MPV] 🔌 Подключение к {self.server_url}...')
+            tasks.append(asyncio.ensure_future(self._connect_server_async()))
+            
+            # Ожидание IPC блокирующее (повтор connect) - вне event loop
+            await self.loop.run_in_executor(None, self._bring_up_mpv)
+            tasks.append(asyncio.ensure_future(self._monitor_async()))
+            
+            tasks.append(asyncio.ensure_future(self._journal_async()))
+            self.playlist.start()
+            # Сверка позиции и подстройка - блокирующие запросы к MPV, отдельными потоками
+            threading.Thread(target=self._sync_loop, daemon=True).start()
+            threading.Thread(target=self._tune_loop, daemon=True).start()
+            threading.Thread(target=self._cache_loop, daemon=True).start()
+            threading.Thread(target=self._resource_loop, daemon=True).start()
+            
+            if self.mirror:
+                self.mirror.start()
+            else:
+                self.http.submit(self._refresh_store_index)
+            
+            print('[MPV] ✅ Клиент запущен (asyncio). Для выхода нажмите Ctrl+C')
+            
+            while self.running:
+                await asyncio.sleep(1)
+        finally:
+            self.running = False
+            if self._prefetch_task is not None:
+                self._prefetch_task.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.sio.connected:
+                await self.sio.disconnect()
+            await self.http_async.close()
+    
+    def _request_stop(self):
+        print('\n[MPV] 🛑 Получен сигнал завершения')
+        self.running = False
+    
     def cleanup(self):
         """Очистка ресурсов (идентично Android onDestroy)"""
         print("[MPV] 🧹 Очистка ресурсов...")
         
         self.running = False
+        self._save_journal()  # Последнее состояние - для следующего запуска
+        self.playlist.stop()
         
         # Остановка ping (как Android)
         self._stop_ping_timer()
         
-        # Отключение socket (как Android)
+        # Остановка синхронизации зеркала (недокачанное продолжится при следующем запуске)
+        if self.mirror:
+            self.mirror.stop()
+        self.downloader.shutdown()
+        self.http.shutdown()
+        
+        # Отключение socket (как Android; в asyncio режиме - уже в _run_async)
         try:
-            if self.sio.connected:
+            if self.sio.connected and not self.loop:
                 self.sio.disconnect()
         except:
             pass
@@ -992,7 +5435,7 @@ class MPVClient:
             
             # Пробуем graceful shutdown
             try:
-                self.send_command('quit')
+                self.send_command('quit', wait=False)
                 time.sleep(1)
             except:
                 pass
@@ -1009,12 +5452,25 @@ class MPVClient:
                     self.mpv_process.kill()
                     self.mpv_process.wait(timeout=1)
         
-        # Удаляем IPC socket
-        if os.path.exists(self.ipc_socket):
+        if self._standby_process and self._standby_process.poll() is None:
+            self._standby_process.terminate()
             try:
-                os.unlink(self.ipc_socket)
-            except:
-                pass
+                self._standby_process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self._standby_process.kill()
+        
+        # Закрываем постоянное IPC соединение
+        self.ipc.close()
+        if self._standby_ipc:
+            self._standby_ipc.close()
+        
+        # Удаляем IPC socket
+        for path in (self.ipc_socket, self._standby_socket):
+            if os.path.exists(path):
+                try:
+                    os.unlink(path)
+                except:
+                    pass
         
         print('[MPV] ✅ Клиент остановлен')
 
@@ -1041,28 +5497,87 @@ def main():
 Примеры:
   %(prog)s --server http://192.168.1.100 --device mpv-001
   %(prog)s --server http://192.168.1.100 --device mpv-001 --no-fullscreen
+  %(prog)s --calibrate
         """
     )
     
-    parser.add_argument('--server', required=True, 
+    parser.add_argument('--server', 
                        help='Server URL (http://192.168.1.100)')
-    parser.add_argument('--device', required=True, 
+    parser.add_argument('--device', 
                        help='Device ID (mpv-001)')
     parser.add_argument('--display', default=':0', 
                        help='X Display (default: :0)')
     parser.add_argument('--no-fullscreen', action='store_true',
                        help='Оконный режим (для тестирования)')
+    parser.add_argument('--cache-dir', default=None,
+                       help='Каталог локального кэша (default: ~/.cache/videocontrol-mpv/<device>)')
+    parser.add_argument('--prefetch-ahead', type=int, default=2,
+                       help='Сколько слайдов предзагружать вперед (default: 2)')
+    parser.add_argument('--prefetch-behind', type=int, default=1,
+                       help='Сколько слайдов предзагружать назад (default: 1)')
+    parser.add_argument('--slide-cache-mb', type=int, default=64,
+                       help='Лимит кэша слайдов в MB (default: 64)')
+    parser.add_argument('--content-cache-mb', type=int, default=1024,
+                       help='Бюджет диска под кэш видео/изображений в MB, 0 - отключить (default: 1024)')
+    parser.add_argument('--mirror', action='store_true',
+                       help='Держать всю библиотеку устройства локально (фоновая синхронизация)')
+    parser.add_argument('--mirror-parallel', type=int, default=2,
+                       help='Параллельных загрузок зеркала (default: 2)')
+    parser.add_argument('--mirror-rate-kbps', type=int, default=4096,
+                       help='Лимит скорости зеркала в KB/s, 0 - без лимита (default: 4096)')
+    parser.add_argument('--store-dir',
+                       help='Хранилище медиа по содержимому, общее для устройств бокса '
+                            '(default: ~/.cache/videocontrol-mpv/store)')
+    parser.add_argument('--download-connections', type=int, default=4,
+                       help='Соединений на одну загрузку больших файлов (default: 4)')
+    parser.add_argument('--asyncio', action='store_true',
+                       help='Socket.IO, IPC с MPV и heartbeat в одном event loop; '
+                            'поток управления и фоновые циклы остаются потоками '
+                            '(нужен python-socketio[asyncio_client])')
+    parser.add_argument('--gapless-slides', action='store_true',
+                       help='Соседние слайды в плейлисте MPV: переход без черного кадра (MPV 0.28+)')
+    parser.add_argument('--standby', action='store_true',
+                       help='Второй MPV в горячем резерве: заглушка и контент без черного кадра между ними')
+    parser.add_argument('--api-token', default=os.environ.get('VIDEOCONTROL_API_TOKEN'),
+                       help='JWT токен для /slides-count и /folder/:name/count (env: VIDEOCONTROL_API_TOKEN)')
+    parser.add_argument('--calibrate', action='store_true',
+                       help='Замерить hwdec/vo/потоки на тестовых роликах и сохранить профиль машины')
     
     args = parser.parse_args()
     
+    if args.calibrate:
+        # Отдельный режим: замеры и профиль машины, без сервера
+        directory = args.cache_dir or MPVClient.cache_root()
+        platform_type, _, _ = DeviceDetector.detect_cached(os.path.join(directory, 'detector.json'))
+        print(f"[Calibrate] 📏 Калибровка {platform_type}: ролики, hwdec, vo, потоки...")
+        profile = Calibrator(directory, platform_type, args.display).run()
+        sys.exit(0 if profile else 1)
+    if not args.server or not args.device:
+        parser.error('--server и --device обязательны (кроме --calibrate)')
+    
     client = MPVClient(
         server_url=args.server,
         device_id=args.device,
         display=args.display,
-        fullscreen=not args.no_fullscreen
+        fullscreen=not args.no_fullscreen,
+        cache_dir=args.cache_dir,
+        prefetch_ahead=args.prefetch_ahead,
+        prefetch_behind=args.prefetch_behind,
+        slide_cache_mb=args.slide_cache_mb,
+        api_token=args.api_token,
+        content_cache_mb=args.content_cache_mb,
+        mirror=args.mirror,
+        mirror_parallel=args.mirror_parallel,
+        mirror_rate_kbps=args.mirror_rate_kbps,
+        download_connections=args.download_connections,
+        store_dir=args.store_dir,
+        use_asyncio=args.asyncio,
+        gapless_slides=args.gapless_slides,
+        standby=args.standby
     )
     
     client.run()
+    sys.exit(client.exit_code)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# mpv_client.py - одиночный модуль рядом с каталогом тестов
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
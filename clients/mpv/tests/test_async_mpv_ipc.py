@@ -0,0 +1,35 @@
+import asyncio
+import os
+import tempfile
+
+from mpv_client import AsyncMPVIPC
+from test_mpv_ipc import FakeMPV
+
+
+def test_concurrent_commands_get_their_own_responses():
+    path = os.path.join(tempfile.mkdtemp(), 'mpv.sock')
+    mpv = FakeMPV(path)
+    events = []
+
+    async def scenario():
+        ipc = AsyncMPVIPC(path)
+        ipc.add_event_handler(events.append)
+        assert await ipc.connect(timeout=2.0)
+        try:
+            replies = await asyncio.gather(*(ipc.command('get_property', f'p{i}') for i in range(5)))
+            return [reply['data'] for reply in replies]
+        finally:
+            ipc.close()
+
+    try:
+        assert asyncio.run(scenario()) == [f'p{i}' for i in range(5)]
+        assert events and all(e['event'] == 'property-change' for e in events)
+    finally:
+        mpv.close()
+
+
+def test_command_without_connection_returns_none():
+    async def scenario():
+        return await AsyncMPVIPC(os.path.join(tempfile.mkdtemp(), 'missing.sock')).command('get_property', 'pause')
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from mpv_client import CacheSizer
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+
+@pytest.fixture
+def sizer(tmp_path, monkeypatch):
+    sizer = CacheSizer(str(tmp_path / 'cache-sizing.json'), ['/tmp/mpv-d1.sock'])
+    monkeypatch.setattr(sizer, '_meminfo', lambda: (2 * GB, 1 * GB))
+    monkeypatch.setattr(sizer, '_instances', lambda: 1)
+    return sizer
+
+
+def test_budget_from_memory(sizer, monkeypatch):
+    assert sizer.limits() == {'demuxer-max-bytes': 512 * MB, 'cache-secs': 30}
+    monkeypatch.setattr(sizer, '_meminfo', lambda: (2 * GB, 200 * MB))
+    assert sizer.limits()['demuxer-max-bytes'] == 100 * MB  # Половина свободной
+    monkeypatch.setattr(sizer, '_instances', lambda: 4)
+    assert sizer.limits()['demuxer-max-bytes'] == 25 * MB
+    monkeypatch.setattr(sizer, '_meminfo', lambda: (None, None))
+    assert sizer.limits()['demuxer-max-bytes'] == 512 * MB
+
+
+def test_readahead_from_network_speed(sizer, tmp_path):
+    sizer.observe(5000 * 1000 / 8)  # Не из сети (локальный файл) - не считается
+    assert sizer.limits()['cache-secs'] == 30
+    assert sizer.net_kbps is None
+    sizer.network = True
+    sizer.observe(5000 * 1000 / 8)  # 5 Mbps - в 4 раза медленнее эталона
+    assert sizer.limits()['cache-secs'] == 120
+    assert sizer.net_kbps == pytest.approx(5000)
+    with open(tmp_path / 'cache-sizing.json') as f:
+        assert json.load(f)['net_kbps'] == 5000
+
+    sizer.observe(40000 * 1000 / 8)  # Сглаживание: 5000 + 0.3 * 35000
+    assert sizer.limits()['cache-secs'] == int(30 * 20000 / 15500)
+
+    restarted = CacheSizer(str(tmp_path / 'cache-sizing.json'), [])
+    assert restarted.net_kbps == 15500
+
+
+def test_launch_params_replace_platform_limits(sizer):
+    params = ['mpv', '--demuxer-max-bytes=50M', '--cache-secs=10', '--idle=yes']
+    limits = {'demuxer-max-bytes': 64 * MB, 'cache-secs': 45}
+    assert sizer.launch_params(params, limits) == [
+        'mpv', '--idle=yes', f'--demuxer-max-bytes={64 * MB}', '--cache-secs=45', '--demuxer-readahead-secs=45']
+
+
+def test_changed_threshold(sizer):
+    old = {'demuxer-max-bytes': 100 * MB, 'cache-secs': 30}
+    assert not sizer.changed(old, {'demuxer-max-bytes': 110 * MB, 'cache-secs': 33})
+    assert sizer.changed(old, {'demuxer-max-bytes': 130 * MB, 'cache-secs': 30})
+    assert sizer.changed({}, old)
@@ -0,0 +1,50 @@
+import json
+
+from mpv_client import Calibrator
+
+CLIPS = [
+    {'path': f'/clips/{codec}-{size}', 'codec': codec, 'size': size, 'pixels': w * h}
+    for codec in ('h264', 'hevc') for size, (w, h) in Calibrator.SIZES.items()
+]
+
+
+def fake_play(path, options, untimed):
+    """Машина: CPU тянет 1080p, vaapi декодирует только h264, x11 роняет кадры"""
+    codec, size = path.rsplit('/', 1)[1].split('-')
+    hw = options['hwdec'].startswith('vaapi') and codec == 'h264'
+    if options['vo'] == 'null':
+        if hw:
+            fps = 500
+        else:
+            fps = {'720p': 200, '1080p': 60, '4k': 15}[size] * (2 if options['vd-lavc-threads'] else 1)
+        return {'fps': fps, 'drops': 0, 'cpu_pct': 20 if hw else 150, 'hw': hw}
+    return {'fps': 30, 'drops': 9 if options['vo'] == 'x11' else 0, 'cpu_pct': 30, 'hw': hw}
+
+
+def test_profile_picks_fastest_stable_configuration(tmp_path, monkeypatch):
+    calibrator = Calibrator(str(tmp_path), 'x86_linux', ':0')
+    monkeypatch.setattr(calibrator, '_clips', lambda: CLIPS)
+    monkeypatch.setattr(calibrator, '_play', fake_play)
+    profile = calibrator.run()
+
+    assert profile['params']['hwdec'] == 'vaapi'
+    assert profile['params']['vo'] == 'gpu'
+    assert profile['hwdec_codecs'] == ['h264']
+    assert profile['software_max'] == [1920, 1080]
+    with open(tmp_path / 'calibration.json') as f:
+        assert json.load(f)['params'] == profile['params']
+
+
+def test_no_clips(tmp_path, monkeypatch):
+    calibrator = Calibrator(str(tmp_path), 'x86_linux', ':0')
+    monkeypatch.setattr(calibrator, '_clips', lambda: [])
+    assert calibrator.run() is None
+    assert not (tmp_path / 'calibration.json').exists()
+
+
+def test_hwdec_without_hw_frames_not_scored():
+    calibrator = Calibrator('/tmp', 'x86_linux', ':0')
+    # hwdec молча откатился на CPU: быстро, но это не аппаратное декодирование
+    results = [{'hwdec': 'vaapi-copy', 'threads': 0, 'hw': False, 'fps': 999, 'pixels': 100, 'cpu_pct': 1}]
+    assert calibrator._decode_score(results, 'vaapi-copy', 0) == (0, float('-inf'))
+    assert calibrator._render_score([], 'gpu') == (float('inf'), float('inf'))
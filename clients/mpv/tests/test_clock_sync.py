@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from mpv_client import ClockSync, MPVClient
+
+
+def test_offset_from_symmetric_exchange():
+    clock = ClockSync()
+    # Часы сервера на 100 сек впереди, задержка 10 мс в каждую сторону
+    clock.add(0.0, 100.010, 100.012, 0.022)
+    assert clock.offset == pytest.approx(100.0)
+    assert clock.rtt == pytest.approx(0.020)
+    assert clock.local_time(150.0) == pytest.approx(50.0)
+
+
+def test_min_rtt_sample_wins():
+    clock = ClockSync()
+    clock.add(0.0, 100.010, 100.010, 0.020)  # offset 100, rtt 20 мс
+    clock.add(1.0, 101.200, 101.200, 1.210)  # Асимметрия: 200 мс туда, 10 обратно
+    assert clock.offset == pytest.approx(100.0)
+    clock.add(2.0, 101.501, 101.501, 2.002)  # Лучший замер
+    assert clock.offset == pytest.approx(99.5)
+    assert clock.rtt == pytest.approx(0.002)
+
+
+def test_negative_rtt_ignored_and_window_slides():
+    clock = ClockSync()
+    clock.add(0.0, 5.0, 5.0, -1.0)
+    assert clock.offset is None
+    assert clock.server_time() == pytest.approx(time.time(), abs=0.1)
+    clock.add(0.0, 50.001, 50.001, 0.002)  # Лучший, но уйдет из окна
+    for i in range(ClockSync.SAMPLES):
+        clock.add(i, i + 10.01, i + 10.01, i + 0.02)
+    assert clock.offset == pytest.approx(10.0)
+
+
+def make_client(position, offset=0.0):
+    """MPVClient без процесса MPV: только то, что нужно _correct_drift"""
+    client = MPVClient.__new__(MPVClient)
+    client.clock = ClockSync()
+    client.clock.offset = offset
+    client.sync_stats = {'seeks': 0}
+    client._sync_speed = 1.0
+    client.sent = []
+
+    def send_command(*args, **kwargs):
+        if args[0] == 'get_property':
+            return {'error': 'success', 'data': position}
+        client.sent.append(args)
+
+    client.send_command = send_command
+    return client
+
+
+def sync_started(seconds_ago, offset=0.0):
+    return {'file': 'clip.mp4', 'start_at': time.time() + offset - seconds_ago}
+
+
+def test_drift_in_tolerance_untouched():
+    client = make_client(position=10.0)
+    client._correct_drift(sync_started(10.0))
+    assert client.sent == []
+
+
+def test_small_drift_corrected_by_speed():
+    client = make_client(position=10.1)  # Впереди на 100 мс - замедляемся
+    client._correct_drift(sync_started(10.0))
+    (command, prop, speed), = client.sent
+    assert (command, prop) == ('set_property', 'speed')
+    assert speed == pytest.approx(0.95, abs=0.001)
+    # Расхождение выбрано - скорость обратно
+    client = make_client(position=20.0)
+    client._sync_speed = 0.95
+    client._correct_drift(sync_started(20.0))
+    assert client.sent == [('set_property', 'speed', 1.0)]
+
+
+def test_large_drift_seeks_with_server_offset():
+    client = make_client(position=5.0, offset=3.0)
+    client._correct_drift(sync_started(10.0, offset=3.0))
+    command, target, mode = client.sent[0]
+    assert (command, mode) == ('seek', 'absolute')
+    assert target == pytest.approx(10.0, abs=0.05)
+    assert client.sync_stats['seeks'] == 1
@@ -0,0 +1,64 @@
+import threading
+
+from mpv_client import CommandScheduler
+
+
+def run_all(scheduler, timeout=2.0):
+    """Выполнить очередь: барьер в конце пользовательской очереди"""
+    done = threading.Event()
+    scheduler.submit(done.set)
+    scheduler.ready.set()
+    assert done.wait(timeout)
+
+
+def test_content_supersedes_only_queued_content():
+    scheduler = CommandScheduler()
+    calls = []
+    scheduler.submit(calls.append, 'connect')
+    scheduler.submit(calls.append, 'play-a', content=True)
+    scheduler.submit(calls.append, 'pause')
+    scheduler.submit(calls.append, 'play-b', content=True)
+    run_all(scheduler)
+    assert calls == ['connect', 'pause', 'play-b']
+
+
+def test_user_commands_before_background():
+    scheduler = CommandScheduler()
+    calls = []
+    scheduler.submit(calls.append, 'prefetch', background=True)
+    scheduler.submit(calls.append, 'state')
+    done = threading.Event()
+    scheduler.submit(done.set, background=True)
+    scheduler.ready.set()
+    assert done.wait(2.0)
+    assert calls == ['state', 'prefetch']
+
+
+def test_stale_generation_is_skipped():
+    scheduler = CommandScheduler()
+    calls = []
+    scheduler.submit(calls.append, 'play-a', content=True)
+    generation = scheduler.generation
+    scheduler.submit(calls.append, 'play-b', content=True)
+    scheduler.submit(calls.append, 'continue-a', generation=generation)
+    run_all(scheduler)
+    assert calls == ['play-b']
+
+
+def test_superseded_during_execution():
+    scheduler = CommandScheduler()
+    seen = []
+    started, release = threading.Event(), threading.Event()
+
+    def load():
+        started.set()
+        release.wait(2.0)
+        seen.append(scheduler.superseded())
+
+    scheduler.submit(load, content=True)
+    scheduler.ready.set()
+    assert started.wait(2.0)
+    scheduler.submit(lambda: None, content=True)
+    release.set()
+    run_all(scheduler)
+    assert seen == [True]
@@ -0,0 +1,91 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from mpv_client import ContentCache, ContentStore
+
+from test_content_store import make_store, put
+
+
+@pytest.mark.parametrize('header, total, expected', [
+    (None, 100, (0, 99)),
+    ('bytes=10-', 100, (10, 99)),
+    ('bytes=10-19', 100, (10, 19)),
+    ('bytes=90-200', 100, (90, 99)),  # Конец за файлом - до конца файла
+    ('bytes=-30', 100, (70, 99)),  # Суффикс
+    ('bytes=-300', 100, (0, 99)),
+    ('bytes=10-', None, (10, None)),  # Размер еще неизвестен
+    ('bytes=10-19', None, (10, 19)),
+    ('garbage', 100, (0, 99)),
+])
+def test_parse_range(header, total, expected):
+    assert ContentCache._parse_range(header, total) == expected
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ContentCache(make_store(tmp_path), max_bytes=1024)
+    yield cache
+    cache.server.shutdown()
+    cache.server.server_close()
+
+
+def test_cached_blob_resolves_to_disk(cache):
+    key = put(cache.store, b'0123456789', 'aa')
+    assert cache.resolve('http://server/content/d1/a.mp4', key) == cache.store.blob_path(key)
+
+
+def test_uncached_starts_fetch_through_proxy(cache):
+    key = ContentStore.key_for('bb', 10)
+    source = cache.resolve('http://server/content/d1/b.mp4', key)
+    assert source == f'http://127.0.0.1:{cache.port}/{key}'
+    assert cache.store.job_for(key) is not None
+
+
+def test_proxy_serves_range_of_finished_blob(cache):
+    key = put(cache.store, b'0123456789', 'aa')
+    request = urllib.request.Request(f'http://127.0.0.1:{cache.port}/{key}', headers={'Range': 'bytes=2-5'})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        assert response.status == 206
+        assert response.headers['Content-Range'] == 'bytes 2-5/10'
+        assert response.read() == b'2345'
+
+
+def test_proxy_unknown_key(cache):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f'http://127.0.0.1:{cache.port}/nope', timeout=5)
+    assert error.value.code == 404
+
+
+def test_range_past_end_is_416(cache):
+    key = put(cache.store, b'0123456789', 'aa')
+    request = urllib.request.Request(f'http://127.0.0.1:{cache.port}/{key}', headers={'Range': 'bytes=10-'})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=5)
+    assert error.value.code == 416
+    assert error.value.headers['Content-Range'] == 'bytes */10'
+
+
+def test_superseded_fill_without_reader_is_cancelled(cache):
+    old = ContentStore.key_for('aa', 10)
+    kept = ContentStore.key_for('bb', 10)
+    read = ContentStore.key_for('cc', 10)
+    for key in (old, kept, read):
+        cache.resolve(f'http://server/content/d1/{key}.mp4', key)
+    cache._readers[read] = 1  # MPV еще читает
+
+    cache.supersede(keep=[kept])
+    assert cache.store.job_for(old).cancelled
+    assert not cache.store.job_for(kept).cancelled
+    assert not cache.store.job_for(read).cancelled
+    # Прерванная загрузка еще не завершилась - повторный показ напрямую с сервера
+    assert cache.resolve('http://server/content/d1/old.mp4', old) == 'http://server/content/d1/old.mp4'
+
+
+def test_fill_shared_with_other_listener_not_cancelled(cache):
+    key = ContentStore.key_for('aa', 10)
+    cache.store.fetch(key, 'http://server/aa', on_finish=lambda job: None)  # Зеркало ждет ту же загрузку
+    cache.resolve('http://server/content/d1/a.mp4', key)
+    cache.supersede()
+    assert not cache.store.job_for(key).cancelled
@@ -0,0 +1,103 @@
+import os
+from types import SimpleNamespace
+
+from mpv_client import ContentStore, DownloadJob
+
+
+class FakeDownloader:
+    """Загрузчик без сети: задания завершает тест через finish()"""
+
+    def __init__(self):
+        self.started = []
+        self.http = SimpleNamespace(session=None)
+
+    def start(self, url, path, version=None, accept=None, throttle=None, on_finish=None):
+        job = DownloadJob(url, path, version)
+        job.throttle = throttle
+        job.on_finish = on_finish
+        self.started.append(job)
+        return job
+
+    @staticmethod
+    def finish(job, data):
+        with open(job.path, 'wb') as f:
+            f.write(data)
+        job.total = len(data)
+        job.succeeded = True
+        job.done = True
+        job.on_finish(job)
+
+
+def make_store(tmp_path):
+    return ContentStore(str(tmp_path), FakeDownloader())
+
+
+def put(store, data, md5):
+    """Блоб размера len(data) в хранилище (как после загрузки)"""
+    key = ContentStore.key_for(md5, len(data))
+    job = store.fetch(key, f'http://server/{md5}')
+    store.downloader.finish(job, data)
+    return key
+
+
+def listing(*items):
+    return [{'safeName': name, 'md5': md5, 'size': size} for name, md5, size in items]
+
+
+def test_same_content_fetched_once(tmp_path):
+    store = make_store(tmp_path)
+    key = ContentStore.key_for('AA', 3)
+    first = store.fetch(key, 'http://server/a')
+    second = store.fetch(key, 'http://server/b')
+    assert first is second
+    assert len(store.downloader.started) == 1
+    store.downloader.finish(first, b'abc')
+    assert store.path(key) == store.blob_path(key)
+    assert store.job_for(key) is None
+
+
+def test_wrong_size_is_discarded(tmp_path):
+    store = make_store(tmp_path)
+    key = ContentStore.key_for('aa', 10)
+    job = store.fetch(key, 'http://server/a')
+    store.downloader.finish(job, b'short')
+    assert not job.succeeded
+    assert store.path(key) is None
+
+
+def test_orphans_removed_shared_content_kept(tmp_path):
+    store = make_store(tmp_path)
+    shared = put(store, b'abc', 'aa')
+    gone = put(store, b'defg', 'bb')
+    store.update_names('d1', listing(('one.mp4', 'aa', 3), ('old.mp4', 'bb', 4)))
+    store.update_names('d2', listing(('two.mp4', 'aa', 3)))
+    # С d1 удалили оба файла: общий блоб остается за d2
+    store.update_names('d1', [])
+    assert store.path(shared) is not None
+    assert store.path(gone) is None
+    assert not os.path.exists(store.blob_path(gone))
+
+
+def test_orphan_being_fetched_survives(tmp_path):
+    store = make_store(tmp_path)
+    key = put(store, b'abc', 'aa')
+    store.fetch(key, 'http://server/aa')  # Повторная загрузка (например, после проверки версии)
+    store.update_names('d1', [])
+    assert store.info(key) is not None
+
+
+def test_evict_lru_skips_mirrored_and_active(tmp_path):
+    store = make_store(tmp_path)
+    store.update_names('d1', listing(('pinned.mp4', 'cc', 10)), mirrored=True)
+    store.update_names('d2', listing(('a.mp4', 'aa', 10), ('b.mp4', 'bb', 10), ('d.mp4', 'dd', 10)))
+    active = put(store, b'b' * 10, 'bb')
+    oldest = put(store, b'a' * 10, 'aa')
+    pinned = put(store, b'c' * 10, 'cc')
+    newest = put(store, b'd' * 10, 'dd')
+    store.fetch(active, 'http://server/bb')
+
+    victims = store.evict(max_bytes=20)
+    assert victims == [oldest]
+    assert store.path(pinned) is not None
+    assert store.path(newest) is not None
+    assert store.usage(pinned=False) == (2, 20)
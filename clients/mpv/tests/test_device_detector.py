@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from mpv_client import DeviceDetector
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """Подмена определения платформы: считаем вызовы"""
+    calls = []
+    monkeypatch.setattr(DeviceDetector, 'host_key', staticmethod(lambda: ['/usr/bin/mpv', 1.0, '6.1', 'x86_64']))
+    monkeypatch.setattr(DeviceDetector, 'detect_platform', staticmethod(lambda: calls.append('p') or 'x86_linux'))
+    monkeypatch.setattr(DeviceDetector, 'get_mpv_version', staticmethod(lambda: calls.append('v') or (0, 37)))
+    return calls
+
+
+def test_detect_cached_hit_after_first_run(tmp_path, probes):
+    cache = str(tmp_path / 'sub' / 'detector.json')
+    assert DeviceDetector.detect_cached(cache) == ('x86_linux', (0, 37), False)
+    assert DeviceDetector.detect_cached(cache) == ('x86_linux', (0, 37), True)
+    assert probes == ['p', 'v']
+
+
+def test_detect_cached_invalidated_by_host_key(tmp_path, probes, monkeypatch):
+    cache = str(tmp_path / 'detector.json')
+    DeviceDetector.detect_cached(cache)
+    # mpv обновлен - другой mtime
+    monkeypatch.setattr(DeviceDetector, 'host_key', staticmethod(lambda: ['/usr/bin/mpv', 2.0, '6.1', 'x86_64']))
+    assert DeviceDetector.detect_cached(cache)[2] is False
+    with open(cache) as f:
+        assert json.load(f)['key'][1] == 2.0
+
+
+def test_no_mpv_not_cached(tmp_path, probes, monkeypatch):
+    monkeypatch.setattr(DeviceDetector, 'host_key', staticmethod(lambda: ['mpv', None, '6.1', 'x86_64']))
+    cache = tmp_path / 'detector.json'
+    DeviceDetector.detect_cached(str(cache))
+    assert not cache.exists()
+
+
+def test_corrupt_cache_ignored(tmp_path, probes):
+    cache = tmp_path / 'detector.json'
+    cache.write_text('{not json')
+    assert DeviceDetector.detect_cached(str(cache))[2] is False
@@ -0,0 +1,41 @@
+import threading
+
+from mpv_client import HttpClient
+
+
+def test_submit_bounded_queue_drops_overflow():
+    http = HttpClient(workers=1, queue_size=1)
+    release = threading.Event()
+    calls = []
+    first = http.submit(release.wait)
+    second = http.submit(calls.append, 'queued')
+    assert first is not None and second is not None
+    assert http.submit(calls.append, 'dropped') is None
+    release.set()
+    second.result(timeout=2)
+    assert calls == ['queued']
+    # Место освободилось - снова принимаем
+    assert http.submit(calls.append, 'again').result(timeout=2) is None
+    assert calls == ['queued', 'again']
+    http.shutdown()
+
+
+def test_submit_swallows_task_errors():
+    http = HttpClient(workers=1, queue_size=0)
+
+    def boom():
+        raise ValueError('boom')
+
+    http.submit(boom).result(timeout=2)
+    assert http.submit(lambda: None) is not None
+    http.shutdown()
+
+
+def test_host_limit_per_host():
+    http = HttpClient(per_host=2)
+    a = http._host_limit('http://a:8080/x')
+    assert http._host_limit('http://a:8080/y') is a
+    assert http._host_limit('http://b/x') is not a
+    assert a.acquire(blocking=False) and a.acquire(blocking=False)
+    assert not a.acquire(blocking=False)
+    http.shutdown()
@@ -0,0 +1,88 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from mpv_client import ContentStore, DownloadJob, LibraryMirror, _RateLimiter
+
+
+class FakeHttp:
+    def __init__(self, listing):
+        self.listing = listing
+        self.session = None
+
+    def get(self, url, timeout=None):
+        return SimpleNamespace(status_code=200, json=lambda: self.listing)
+
+
+class AutoDownloader:
+    """Загрузчик без сети: в фоне пишет файл нужного по ключу размера"""
+
+    def __init__(self, http):
+        self.http = http
+        self.urls = []
+
+    def start(self, url, path, version=None, accept=None, throttle=None, on_finish=None):
+        self.urls.append(url)
+        job = DownloadJob(url, path, version)
+
+        def run():
+            size = int(version.rsplit('-', 1)[1])
+            with open(path, 'wb') as f:
+                f.write(b'x' * size)
+            job.total = size
+            job.succeeded = job.done = True
+            on_finish(job)
+
+        threading.Thread(target=run, daemon=True).start()
+        return job
+
+
+def item(name, md5, size, **extra):
+    return dict({'safeName': name, 'md5': md5, 'size': size}, **extra)
+
+
+def make_mirror(tmp_path, listing):
+    store = ContentStore(str(tmp_path), AutoDownloader(FakeHttp(listing)))
+    return LibraryMirror('http://server', 'd1', store, parallel=2, rate_kbps=0)
+
+
+def test_sync_downloads_each_content_once(tmp_path):
+    mirror = make_mirror(tmp_path, [
+        item('a.mp4', 'aa', 3),
+        item('copy of a.mp4', 'aa', 3),
+        item('b.jpg', 'bb', 4),
+    ])
+    names = []
+    mirror.on_listing = names.extend
+    mirror.sync_once()
+    assert sorted(mirror.store.downloader.urls) == ['http://server/content/d1/a.mp4',
+                                                     'http://server/content/d1/b.jpg']
+    assert mirror.path_for('copy of a.mp4') == mirror.path_for('a.mp4') is not None
+    assert names == ['a.mp4', 'copy of a.mp4', 'b.jpg']
+    # Все уже на диске - повторный проход ничего не качает
+    mirror.sync_once()
+    assert len(mirror.store.downloader.urls) == 2
+    mirror.stop()
+
+
+def test_sync_skips_unready_unknown_and_unhashed(tmp_path):
+    mirror = make_mirror(tmp_path, [
+        item('doc.pdf', 'aa', 3),
+        item('processing.mp4', 'bb', 3, status='processing'),
+        item('broken.mp4', 'cc', 3, canPlay=False),
+        item('nohash.mp4', None, 3),
+    ])
+    mirror.sync_once()
+    assert mirror.store.downloader.urls == []
+    mirror.stop()
+
+
+def test_rate_limiter_sleeps_on_debt():
+    limiter = _RateLimiter(1000)
+    started = time.time()
+    limiter.consume(200)
+    assert time.time() - started >= 0.15
+    # Без лимита - не ждем
+    started = time.time()
+    limiter.consume(10 ** 9, rate=0)
+    assert time.time() - started < 0.1
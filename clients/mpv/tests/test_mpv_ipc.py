@@ -0,0 +1,103 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from mpv_client import MPVIPC
+
+
+class FakeMPV:
+    """IPC сервер MPV: отвечает на get_property, шлет событие перед ответом"""
+
+    def __init__(self, path):
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        self.conn = None
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        try:
+            self._handle()
+        except OSError:
+            pass  # Закрыт тестом
+
+    def _handle(self):
+        self.conn, _ = self.server.accept()
+        buffer = b''
+        while True:
+            chunk = self.conn.recv(4096)
+            if not chunk:
+                return
+            buffer += chunk
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                message = json.loads(line)
+                reply = {'event': 'property-change', 'name': 'pause', 'data': False}
+                reply = json.dumps(reply) + '\n' + json.dumps(
+                    {'error': 'success', 'data': message['command'][-1], 'request_id': message['request_id']})
+                self.conn.sendall((reply + '\n').encode())
+
+    def close(self):
+        if self.conn:
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.conn.close()
+        self.server.close()
+
+
+def test_command_without_connection_fails_fast():
+    ipc = MPVIPC(os.path.join(tempfile.mkdtemp(), 'missing.sock'))
+    started = time.time()
+    assert ipc.command('get_property', 'pause') is None
+    assert time.time() - started < 0.5
+
+
+def test_responses_matched_by_request_id_and_events_dispatched():
+    path = os.path.join(tempfile.mkdtemp(), 'mpv.sock')
+    mpv = FakeMPV(path)
+    ipc = MPVIPC(path)
+    events = []
+    ipc.add_event_handler(events.append)
+    try:
+        assert ipc.connect(timeout=2.0)
+        assert ipc.command('get_property', 'time-pos')['data'] == 'time-pos'
+        assert ipc.command('get_property', 'pause')['data'] == 'pause'
+        deadline = time.time() + 2.0
+        while len(events) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert [e['name'] for e in events] == ['pause', 'pause']
+    finally:
+        ipc.close()
+        mpv.close()
+
+
+def test_dropped_connection_is_not_reconnected_by_command():
+    path = os.path.join(tempfile.mkdtemp(), 'mpv.sock')
+    mpv = FakeMPV(path)
+    ipc = MPVIPC(path)
+    assert ipc.connect(timeout=2.0)
+    mpv.close()
+    deadline = time.time() + 2.0
+    while ipc.connected and time.time() < deadline:
+        time.sleep(0.01)
+    assert not ipc.connected
+    started = time.time()
+    assert ipc.command('get_property', 'pause') is None
+    assert time.time() - started < 0.5
+    ipc.close()
+
+
+def test_close_stops_dispatcher():
+    ipc = MPVIPC(os.path.join(tempfile.mkdtemp(), 'missing.sock'))
+    before = set(threading.enumerate())
+    ipc.add_event_handler(lambda event: None)
+    dispatcher, = set(threading.enumerate()) - before
+    ipc.close()
+    dispatcher.join(timeout=2.0)
+    assert not dispatcher.is_alive()
+    assert ipc.connect(timeout=0.1) is False
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+from mpv_client import MPVClient, MPVIPC
+
+
+class FakeProcess:
+    pid = 2
+
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+def make_client(tmp_path):
+    """Клиент без MPV: упавший процесс, соединение с ним еще числится живым"""
+    client = MPVClient.__new__(MPVClient)
+    client.loop = None
+    client._respawn_times = []
+    client._paused = False
+    client.current_time_pos = 12.0
+    client._standby_process = None
+    client.ipc_socket = str(tmp_path / 'mpv.sock')
+    client.ipc = MPVIPC(client.ipc_socket)
+    client.ipc.connected = True
+    client.ipc.consecutive_timeouts = MPVClient.MAX_IPC_TIMEOUTS
+    client.mpv_process = FakeProcess(returncode=-9)
+    client.submitted = []
+    client.scheduler = SimpleNamespace(submit=lambda fn, *args, **kwargs: client.submitted.append(args))
+    client.connected = []
+    client._start_mpv = lambda path: FakeProcess()
+    client._connect_ipc = lambda ipc, process: client.connected.append(ipc)
+    client.observed = []
+    client._observe_mpv = client.observed.append
+    return client
+
+
+def test_respawn_replaces_ipc(tmp_path):
+    client = make_client(tmp_path)
+    old = client.ipc
+    assert client._respawn_mpv('процесс завершился')
+    assert client.ipc is not old
+    assert old._closed and not old.connected
+    assert client.ipc.socket_path == old.socket_path
+    assert client.ipc.consecutive_timeouts == 0
+    # Подключение и подписка на события - у нового соединения
+    assert client.connected == [client.ipc]
+    assert client.observed == [client.ipc]
+    assert client.submitted == [(12.0, False, client.submitted[0][2])]
@@ -0,0 +1,156 @@
+import os
+import threading
+
+import requests
+
+from mpv_client import ContentStore, DownloadJob, PlaceholderCopy
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeHttp:
+    """Ответы по URL; запросы (url, заголовки) запоминаются"""
+
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        self.offline = False
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((url, headers or {}))
+        if self.offline:
+            raise requests.ConnectionError('offline')
+        return self.responses[url]
+
+
+class FakeDownloader:
+    """Загрузка в потоке (fetch держит замок хранилища): содержимое задает тест"""
+
+    def __init__(self, http):
+        self.http = http
+        self.files = {}
+        self.urls = []
+
+    def start(self, url, path, version=None, accept=None, throttle=None, on_finish=None):
+        self.urls.append(url)
+        job = DownloadJob(url, path, version)
+
+        def run():
+            data, job.etag = self.files[url]
+            with open(path, 'wb') as f:
+                f.write(data)
+            job.total = len(data)
+            job.succeeded = True
+            job.done = True
+            on_finish(job)
+
+        threading.Thread(target=run).start()
+        return job
+
+
+API = 'http://server/api/devices/d1/placeholder'
+CONTENT = 'http://server/content/d1/'
+
+
+def make_copy(tmp_path, store=None):
+    store = store or ContentStore(str(tmp_path / 'store'), FakeDownloader(FakeHttp()))
+    return PlaceholderCopy(str(tmp_path / 'placeholder.json'), 'http://server', 'd1', store)
+
+
+def test_resolve_conditional_api_request(tmp_path):
+    copy = make_copy(tmp_path)
+    http = copy.http
+    http.responses[API] = FakeResponse(200, {'placeholder': 'ph.mp4'}, {'ETag': '"a1"'})
+    assert copy.resolve() == ('ph.mp4', 'video')
+    http.responses[API] = FakeResponse(304)
+    assert copy.resolve() == ('ph.mp4', 'video')
+    assert http.requests[-1][1] == {'If-None-Match': '"a1"'}
+    http.responses[API] = FakeResponse(404)
+    assert copy.resolve() == (None, None)
+    http.offline = True
+    assert copy.resolve() is None
+
+
+def test_sync_downloads_then_revalidates(tmp_path):
+    copy = make_copy(tmp_path)
+    copy.store.downloader.files[CONTENT + 'ph.mp4'] = (b'video-v1', '"f1"')
+    assert copy.sync('ph.mp4', 'video') is False  # Копии еще не было
+    path = copy.path_for('ph.mp4')
+    assert path.startswith(copy.store.blob_dir)
+    with open(path, 'rb') as f:
+        assert f.read() == b'video-v1'
+
+    # Файл не менялся - без загрузки
+    copy.http.responses[CONTENT + 'ph.mp4'] = FakeResponse(304)
+    assert copy.sync('ph.mp4', 'video') is False
+    assert copy.http.requests[-1][1] == {'If-None-Match': '"f1"'}
+    assert len(copy.store.downloader.urls) == 1
+
+    # Без сети - играем копию с диска
+    copy.http.offline = True
+    assert copy.sync('ph.mp4', 'video') is False
+    assert copy.path_for('ph.mp4') == path
+
+
+def test_content_key_shared_with_store_and_pinned(tmp_path):
+    copy = make_copy(tmp_path)
+    store = copy.store
+    # Тот же ролик уже в хранилище (кэш устройства) - заглушка не качается повторно
+    key = ContentStore.key_for('aa', 5)
+    store.downloader.files['http://server/content/d1/clip.mp4'] = (b'video', None)
+    published = threading.Event()
+    store.fetch(key, 'http://server/content/d1/clip.mp4', on_finish=lambda job: published.set())
+    published.wait()
+    store.update_names('d1', [{'safeName': 'clip.mp4', 'md5': 'aa', 'size': 5}])
+
+    copy.http.responses[API] = FakeResponse(200, {'placeholder': 'ph.mp4', 'md5': 'AA', 'size': 5})
+    copy.resolve()
+    assert copy.sync('ph.mp4', 'video') is False
+    assert copy.meta['key'] == key
+    assert len(store.downloader.urls) == 1
+
+    # Файл удален из списка устройства, кэш переполнен - заглушка остается
+    store.update_names('d1', [])
+    assert store.evict(max_bytes=0) == []
+    assert copy.path_for('ph.mp4') == store.blob_path(key)
+    assert copy.sync(None, None) is True
+    assert store.path(key) is None
+
+
+def test_copy_survives_restart_and_is_replaced(tmp_path):
+    copy = make_copy(tmp_path)
+    copy.store.downloader.files[CONTENT + 'old.jpg'] = (b'old', '"o"')
+    copy.sync('old.jpg', 'image')
+    old_path = copy.path_for('old.jpg')
+
+    restarted = make_copy(tmp_path, copy.store)
+    assert (restarted.file, restarted.type) == ('old.jpg', 'image')
+    assert restarted.path_for('old.jpg') == old_path
+    assert restarted.path_for('other.jpg') is None
+
+    restarted.store.downloader.files[CONTENT + 'new.mp4'] = (b'new', '"n"')
+    assert restarted.sync('new.mp4', 'video') is True
+    assert restarted.path_for('new.mp4') != old_path
+    assert restarted.sync(None, None) is True
+    assert restarted.file is None
+    assert not os.path.exists(str(tmp_path / 'placeholder.json'))
+
+
+def test_type_for():
+    assert PlaceholderCopy.type_for('a.MKV') == 'video'
+    assert PlaceholderCopy.type_for('a.webp') == 'image'
+    assert PlaceholderCopy.type_for('a.pdf') is None
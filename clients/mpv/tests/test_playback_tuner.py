@@ -0,0 +1,66 @@
+import json
+
+from mpv_client import PlaybackTuner
+
+
+def test_only_confirmed_steps_persisted(tmp_path):
+    path = str(tmp_path / 'tuning.json')
+    tuner = PlaybackTuner(path)
+    assert tuner.next_step('a.mp4')[0] == 'hwdec'
+    assert tuner.next_step('a.mp4')[0] == 'render'
+    assert tuner.confirm('a.mp4') == 'render'
+    # Пробный hwdec действует до конца показа, но не запоминается
+    assert tuner.options_for('a.mp4')['hwdec'] == 'auto-safe'
+    assert tuner.options_for('b.mp4') == {}
+    with open(path) as f:
+        assert json.load(f) == {'a.mp4': ['render']}
+
+    tuner.discard('a.mp4')
+    assert 'hwdec' not in tuner.options_for('a.mp4')
+    reloaded = PlaybackTuner(path)
+    assert reloaded.applied == {'a.mp4': ['render']}
+    assert reloaded.next_step('a.mp4')[0] == 'hwdec'
+
+
+def test_useless_steps_forgotten(tmp_path):
+    path = tmp_path / 'tuning.json'
+    tuner = PlaybackTuner(str(path))
+    tuner.next_step('a.mp4')
+    tuner.next_step('a.mp4')
+    tuner.discard('a.mp4')
+    assert tuner.confirm('a.mp4') is None
+    assert not path.exists()
+    assert tuner.next_step('a.mp4')[0] == 'hwdec'
+
+
+def test_skipped_step_available_later(tmp_path):
+    tuner = PlaybackTuner(str(tmp_path / 'tuning.json'))
+    assert tuner.next_step('a.mp4', skip={'hwdec'})[0] == 'render'
+    assert 'hwdec' not in tuner.options_for('a.mp4')
+    # Без skip (например, preflight больше не запрещает) - пропущенный шаг доступен
+    assert tuner.next_step('a.mp4')[0] == 'hwdec'
+
+
+def test_exhausted(tmp_path):
+    tuner = PlaybackTuner(str(tmp_path / 'tuning.json'))
+    names = [tuner.next_step('a.mp4', skip={'hwdec'})[0] for _ in range(3)]
+    assert names == ['render', 'threads', 'light-decode']
+    assert tuner.next_step('a.mp4', skip={'hwdec'}) is None
+
+
+def test_vo_fallback_after_render(tmp_path):
+    tuner = PlaybackTuner(str(tmp_path / 'tuning.json'), vo='gpu')
+    names = [tuner.next_step('a.mp4')[0] for _ in range(3)]
+    assert names == ['hwdec', 'render', 'vo']
+    assert tuner.options_for('a.mp4')['vo'] == 'xv'
+    # Для x11 более легкого вывода нет - шага нет
+    assert 'vo' not in [name for name, _, _ in PlaybackTuner(str(tmp_path / 'x.json'), vo='x11').steps]
+
+
+def test_options_skip_saved_hwdec(tmp_path):
+    tuner = PlaybackTuner(str(tmp_path / 'tuning.json'))
+    tuner.next_step('a.mp4')
+    tuner.next_step('a.mp4')
+    options = tuner.options_for('a.mp4', skip={'hwdec'})
+    assert 'hwdec' not in options
+    assert options['scale'] == 'bilinear'
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from datetime import datetime
+
+from mpv_client import PlaylistRunner
+
+
+def make_runner():
+    shown, idle, reports = [], [], []
+    runner = PlaylistRunner(os.path.join(tempfile.mkdtemp(), 'playlist.json'),
+                            show=shown.append, idle=lambda: idle.append(True), report=reports.append)
+    return runner, shown, idle, reports
+
+
+def test_in_windows_including_overnight():
+    monday_23 = datetime(2026, 10, 12, 23, 30)   # Понедельник
+    tuesday_01 = datetime(2026, 10, 13, 1, 0)
+    overnight = [{'days': [1], 'from': '22:00', 'to': '06:00'}]
+    assert PlaylistRunner._in_windows(overnight, monday_23)
+    assert PlaylistRunner._in_windows(overnight, tuesday_01)  # Окно началось в понедельник
+    assert not PlaylistRunner._in_windows(overnight, datetime(2026, 10, 13, 23, 30))
+    assert PlaylistRunner._in_windows([{'from': '09:00', 'to': '18:00'}], datetime(2026, 10, 13, 9, 0))
+    assert not PlaylistRunner._in_windows([{'from': '09:00', 'to': '18:00'}], datetime(2026, 10, 13, 18, 0))
+
+
+def test_until_boundary_is_next_edge():
+    now = datetime(2026, 10, 13, 8, 59, 30)
+    assert PlaylistRunner._until_boundary([{'from': '09:00', 'to': '18:00'}], now) == 30.0
+
+
+def test_steps_through_items_and_stops_after_loops():
+    runner, shown, idle, reports = make_runner()
+    runner.load({'id': 'p1', 'loop': 2, 'windows': None,
+                 'items': [{'file': 'a.png', 'type': 'image', 'duration': 5, 'windows': None},
+                           {'file': 'b.mp4', 'type': 'video'}]})
+    assert runner._step() == 5.0
+    runner._deadline = 0  # Время элемента вышло
+    assert runner._step() is None  # Видео - до конца файла
+    assert [item['file'] for item in shown] == ['a.png', 'b.mp4']
+
+    runner.finished()
+    runner._step()  # Второй проход
+    runner._deadline = 0
+    runner._step()
+    runner.finished()
+    assert runner._step() is None
+    assert runner.done and idle and reports[-1]['done']
+
+
+def test_null_windows_mean_always():
+    never = [{'from': '00:00', 'to': '00:00'}]
+    runner, shown, idle, _ = make_runner()
+    runner.load({'id': 'p2', 'items': [{'file': 'a.png', 'type': 'image', 'windows': never},
+                                       {'file': 'b.png', 'type': 'image', 'windows': None, 'duration': 1}]})
+    assert runner._step() == 1.0
+    assert shown[-1]['file'] == 'b.png'
+
+    runner.load({'id': 'p3', 'items': [{'file': 'a.png', 'type': 'image', 'windows': never}]})
+    assert runner._step() > 0  # Вне всех окон - ждем границу
+    assert not runner.showing
+
+
+def test_pause_keeps_remaining_time():
+    runner, shown, _, _ = make_runner()
+    runner.load({'id': 'p3', 'items': [{'file': 'a.png', 'type': 'image', 'duration': 30}]})
+    runner._step()
+    runner.pause()
+    assert runner._step() is None
+    assert 29 < runner._remaining <= 30
+    runner.resume()
+    assert runner._remaining is None and runner._deadline is not None
+
+
+def test_state_survives_restart():
+    runner, _, _, _ = make_runner()
+    runner.load({'id': 'p4', 'items': [{'file': 'a.png', 'type': 'image'}, {'file': 'b.png', 'type': 'image'}]})
+    runner._step()
+    runner._deadline = 0
+    runner._step()
+    restored = PlaylistRunner(runner.path, show=None, idle=None, report=None)
+    assert restored.playlist['id'] == 'p4' and restored.index == 1
+
+
+def test_upcoming_video_wraps_around():
+    runner, shown, idle, reports = make_runner()
+    assert runner.upcoming() == []
+    runner.load({'id': 'p1', 'items': [{'file': 'a.png', 'type': 'image'}, {'file': 'b.mp4', 'type': 'video'}]})
+    assert runner.upcoming() == ['b.mp4']
+    runner.index = 1
+    assert runner.upcoming() == []  # Следующий по кругу - картинка
@@ -0,0 +1,52 @@
+from mpv_client import QosMonitor
+
+
+def test_window_too_short():
+    qos = QosMonitor(min_interval=60)
+    assert qos.take() is None
+
+
+def test_counters_are_deltas_across_files():
+    qos = QosMonitor(min_interval=0)
+    qos.update('frame-drop-count', 5)  # Первый замер - база
+    qos.update('frame-drop-count', 8)
+    qos.update('frame-drop-count', None)
+    qos.file_loaded()
+    qos.update('frame-drop-count', 2)  # Новый файл: счет с нуля
+    batch = qos.take()
+    assert batch['frame_drops'] == 5
+    assert qos.totals['frame_drops'] == 5
+    # Новое окно, итог с запуска сохраняется
+    qos.update('frame-drop-count', 4)
+    assert qos.take()['frame_drops'] == 2
+    assert qos.totals['frame_drops'] == 7
+
+
+def test_counter_reset_by_mpv():
+    qos = QosMonitor(min_interval=0)
+    qos.update('decoder-frame-drop-count', 10)
+    qos.update('decoder-frame-drop-count', 3)  # MPV сбросил счетчик
+    assert qos.take()['decoder_drops'] == 3
+
+
+def test_cache_speed_stalls_and_played():
+    qos = QosMonitor(min_interval=0)
+    qos.update('demuxer-cache-state', {'cache-duration': 4.0})
+    qos.update('demuxer-cache-state', {'cache-duration': 8.0})
+    qos.update('demuxer-cache-state', None)
+    qos.update('cache-speed', 2048)
+    qos.update('paused-for-cache', True)
+    qos.update('paused-for-cache', False)
+    qos.update('hwdec-current', 'vaapi')
+    for position in (1.0, 1.5, 2.0, 30.0, 30.5):  # Перемотка на 30 не считается
+        qos.update('time-pos', position)
+    batch = qos.take()
+    assert (batch['cache_s_min'], batch['cache_s_avg']) == (4.0, 6.0)
+    assert (batch['net_kbps_min'], batch['net_kbps_avg']) == (2, 2)
+    assert batch['stalls'] == 1
+    assert batch['hwdec'] == 'vaapi'
+    assert batch['played_s'] == 1.5
+    # Пустое окно - без сводок кэша и сети
+    batch = qos.take()
+    assert 'cache_s_min' not in batch and 'net_kbps_min' not in batch
+    assert batch['stalls'] == 0
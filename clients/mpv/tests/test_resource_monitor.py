@@ -0,0 +1,131 @@
+import os
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+from mpv_client import MPVClient, ResourceMonitor
+
+MB = 1024 * 1024
+
+
+def test_sample_own_process():
+    monitor = ResourceMonitor()
+    values = monitor.sample('client', os.getpid())
+    assert values['rss'] > 0 and values['threads'] >= 1 and values['fds'] > 0
+    assert monitor.summary()['client']['trend_mb_h'] is None
+    assert monitor.over_budget('client', 0) is None  # Прогрев - базы еще нет
+
+
+def test_missing_process():
+    assert ResourceMonitor().sample('mpv', 2 ** 22 + 1) is None
+
+
+def test_new_pid_resets_history():
+    monitor = ResourceMonitor()
+    monitor.WARMUP = 0
+    monitor.sample('client', os.getpid())
+    monitor._procs['client']['pid'] = -1  # Как будто процесс перезапущен
+    monitor.sample('client', os.getpid())
+    assert len(monitor._procs['client']['history']) == 1
+
+
+def with_history(rss_mb, fds=10, threads=5, hours=1.0):
+    """Монитор с равномерной историей RSS за hours часов; база - первый замер"""
+    monitor = ResourceMonitor()
+    history = deque()
+    for i, rss in enumerate(rss_mb):
+        t = i * hours * 3600 / (len(rss_mb) - 1)
+        history.append((t, {'rss': rss * MB, 'fds': fds, 'threads': threads}))
+    base = dict(history[0][1])
+    monitor._procs['mpv'] = {'pid': 1, 'started': 0, 'base': base, 'history': history}
+    return monitor
+
+
+def test_trend_mb_per_hour():
+    monitor = with_history([100, 125, 150, 175, 200], hours=2)
+    assert monitor.trend('mpv') == pytest.approx(50)
+    assert monitor.summary()['mpv'] == {'rss_mb': 200, 'fds': 10, 'threads': 5, 'trend_mb_h': 50.0}
+
+
+def test_over_budget_reasons():
+    monitor = with_history([100, 150, 200])
+    assert monitor.over_budget('mpv', 150 * MB) is None
+    assert monitor.over_budget('mpv', 50 * MB) == 'RSS 100 -> 200 MB (+100 MB/ч)'
+
+    monitor = with_history([100, 100, 100])
+    monitor._procs['mpv']['history'][-1][1]['fds'] = 10 + ResourceMonitor.FD_BUDGET + 1
+    assert monitor.over_budget('mpv', 50 * MB).startswith('дескрипторы')
+
+    monitor = with_history([100, 100, 100])
+    monitor._procs['mpv']['history'][-1][1]['threads'] = 5 + ResourceMonitor.THREAD_BUDGET + 1
+    assert monitor.over_budget('mpv', 50 * MB).startswith('потоки')
+
+
+class FakeResources:
+    """ResourceMonitor, у которого рос процесс grown; останавливает цикл после прохода"""
+
+    def __init__(self, client, grown):
+        self.client = client
+        self.grown = grown
+        self.sampled = []
+
+    def sample(self, name, pid):
+        self.sampled.append((name, pid))
+
+    def over_budget(self, name, budget):
+        self.client.running = False
+        return 'RSS 100 -> 900 MB' if name == self.grown else None
+
+
+@pytest.fixture
+def client():
+    """MPVClient с активным и резервным MPV (--standby), без процессов"""
+    client = MPVClient.__new__(MPVClient)
+    client.running = True
+    client.RESOURCE_INTERVAL = 0
+    client._cache_limits = {'demuxer-max-bytes': 64 * MB}
+    client._planned_restart = None
+    client._sync = None
+    client.is_playing_placeholder = client.is_mpv_idle = False
+    client.recovery_stats = {'planned': 0}
+    client.mpv_process = SimpleNamespace(pid=101, resource_name='mpv')
+    client._standby_process = SimpleNamespace(pid=202, resource_name='mpv-2')
+    client.ipc, client._standby_ipc = 'ipc-a', 'ipc-b'
+    client.ipc_socket, client._standby_socket = '/tmp/a.sock', '/tmp/b.sock'
+    client.scheduler = SimpleNamespace(submitted=[])
+    client.scheduler.submit = lambda fn, *args, **kwargs: client.scheduler.submitted.append((fn.__name__, args))
+    return client
+
+
+def test_processes_sampled_under_stable_names(client):
+    client.resources = FakeResources(client, grown=None)
+    client._resource_loop()
+    client._swap_players()
+    client.running = True
+    client._resource_loop()
+    assert client.resources.sampled[:2] == [('mpv', 101), ('mpv-2', 202)]
+    # После переключения роли поменялись, имена - нет
+    assert client.resources.sampled[3:5] == [('mpv-2', 202), ('mpv', 101)]
+
+
+def test_grown_standby_restarted_at_once(client):
+    client.resources = FakeResources(client, grown='mpv-2')
+    client._resource_loop()
+    client.running = True
+    assert client._planned_restart['target'] == 'mpv-2'
+    client._sync = {'file': 'wall.mp4'}  # Даже во время синхронного видео - резерв не на экране
+    assert client._planned_restart_due()
+    assert client._begin_planned_restart() is None
+    assert client.scheduler.submitted == [('_respawn_standby', ('mpv-2', 'RSS 100 -> 900 MB'))]
+
+
+def test_grown_active_waits_for_safe_point(client):
+    client.resources = FakeResources(client, grown='mpv')
+    client._resource_loop()
+    client.running = True
+    assert not client._planned_restart_due()
+    client.is_playing_placeholder = True
+    assert client._planned_restart_due()
+    assert client._begin_planned_restart() == 'плановый: RSS 100 -> 900 MB'
+    assert client.scheduler.submitted == []
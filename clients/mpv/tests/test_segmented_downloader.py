@@ -0,0 +1,139 @@
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from mpv_client import DownloadJob, HttpClient, SegmentedDownloader, _Segment
+
+DATA = bytes(range(256)) * 40  # 10240 байт
+ETAG = '"v1"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Статический файл с Range и ETag; заголовки Range запоминаются"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        header = self.headers.get('Range')
+        self.server.ranges.append(header)
+        match = re.match(r'bytes=(\d+)-(\d*)', header or '')
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(DATA) - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+        else:
+            start, end = 0, len(DATA) - 1
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(DATA[start:end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    server.daemon_threads = True
+    server.ranges = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def downloader():
+    downloader = SegmentedDownloader(SimpleNamespace(session=requests.Session(), pool_size=4, TIMEOUT=HttpClient.TIMEOUT), connections=2)
+    # Маленькие сегменты - тестовый файл режется на 5 частей
+    downloader.SEGMENT_SIZE = 2048
+    downloader.MIN_SEGMENTED_SIZE = 4096
+    yield downloader
+    downloader.shutdown()
+
+
+def url_of(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/file'
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_segmented_download(server, downloader, tmp_path):
+    path = str(tmp_path / 'file.part')
+    job = downloader.download(url_of(server), path, version='k')
+    assert job.succeeded
+    assert read(path) == DATA
+    assert len(job.segments) == 5
+    assert not os.path.exists(path + '.json')
+    assert server.ranges[0] == 'bytes=0-0'  # Проба
+    assert sorted(server.ranges[1:]) == [f'bytes={s}-{s + 2047}' for s in range(0, 10240, 2048)]
+
+
+def write_partial_state(path, url, etag=ETAG):
+    """Прошлая попытка: первые два сегмента скачаны, третий - наполовину"""
+    with open(path, 'wb') as f:
+        f.write(DATA[:5120] + b'\0' * (len(DATA) - 5120))
+    segments = [[0, 2047, 2048], [2048, 4095, 2048], [4096, 6143, 1024], [6144, 8191, 0], [8192, 10239, 0]]
+    with open(path + '.json', 'w') as f:
+        json.dump({'url': url, 'total': len(DATA), 'version': 'k', 'etag': etag,
+                   'last_modified': None, 'segments': segments}, f)
+
+
+def test_resume_fetches_only_missing_bytes(server, downloader, tmp_path):
+    path = str(tmp_path / 'file.part')
+    write_partial_state(path, url_of(server))
+    job = downloader.download(url_of(server), path, version='k')
+    assert job.succeeded
+    assert read(path) == DATA
+    assert sorted(server.ranges[1:]) == ['bytes=5120-6143', 'bytes=6144-8191', 'bytes=8192-10239']
+    assert job.bytes_fetched == len(DATA) - 5120
+
+
+def test_changed_file_restarts_from_scratch(server, downloader, tmp_path):
+    path = str(tmp_path / 'file.part')
+    write_partial_state(path, url_of(server), etag='"old"')
+    job = downloader.download(url_of(server), path, version='k')
+    assert job.succeeded
+    assert read(path) == DATA
+    assert job.bytes_fetched == len(DATA)
+
+
+def test_rejected_by_accept(server, downloader, tmp_path):
+    path = str(tmp_path / 'file.part')
+    finished = threading.Event()
+    job = downloader.start(url_of(server), path, accept=lambda job: job.total < 1000,
+                           on_finish=lambda job: finished.set())
+    assert finished.wait(5)
+    assert job.rejected and not job.succeeded
+    assert server.ranges == ['bytes=0-0']
+
+
+def test_concurrent_downloads_share_segment_pool(server, downloader, tmp_path):
+    jobs = [downloader.start(url_of(server), str(tmp_path / f'{n}.part')) for n in range(3)]
+    for job in jobs:
+        assert job.finished.wait(10)
+    assert all(job.succeeded for job in jobs)
+    assert all(read(job.path) == DATA for job in jobs)
+    assert len(downloader.executor._threads) <= 4  # pool_size
+
+
+def test_available_until_spans_finished_segments():
+    job = DownloadJob('http://server/file', '/tmp/none')
+    job.segments = [_Segment(0, 99, 100), _Segment(100, 199, 100), _Segment(200, 299, 10)]
+    assert job.available_until(0) == 210
+    assert job.available_until(150) == 210
+    job.segments[1].done = 50
+    assert job.available_until(0) == 150
+    assert job.available_until(500) == 500
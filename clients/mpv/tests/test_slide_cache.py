@@ -0,0 +1,69 @@
+import os
+from types import SimpleNamespace
+
+from mpv_client import SlideCache
+
+
+class FakeHttp:
+    """HttpClient без сети: url -> (статус, Content-Type, байты)"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        self.requests.append(url)
+        status, content_type, content = self.pages.get(url, (404, '', b''))
+        return SimpleNamespace(status_code=status, headers={'Content-Type': content_type}, content=content)
+
+
+def make_cache(tmp_path, pages, max_bytes=1024):
+    return SlideCache(str(tmp_path / 'slides'), max_bytes, FakeHttp(pages))
+
+
+def test_fetch_stores_page_with_extension(tmp_path):
+    cache = make_cache(tmp_path, {'http://s/p1': (200, 'image/png; charset=binary', b'png')})
+    assert cache.fetch('http://s/p1') == 200
+    path = cache.get('http://s/p1')
+    assert path.endswith('.png')
+    with open(path, 'rb') as f:
+        assert f.read() == b'png'
+    # Повторно не качается
+    assert cache.fetch('http://s/p1') is None
+    assert cache.http.requests == ['http://s/p1']
+
+
+def test_error_status_not_cached(tmp_path):
+    cache = make_cache(tmp_path, {})
+    assert cache.fetch('http://s/missing') == 404
+    assert cache.get('http://s/missing') is None
+
+
+def test_lru_eviction_by_size(tmp_path):
+    pages = {f'http://s/p{i}': (200, 'image/jpeg', b'x' * 400) for i in range(3)}
+    cache = make_cache(tmp_path, pages, max_bytes=1000)
+    cache.fetch('http://s/p0')
+    cache.fetch('http://s/p1')
+    first = cache.get('http://s/p0')  # p0 свежее p1
+    cache.fetch('http://s/p2')
+    assert cache.get('http://s/p1') is None
+    assert cache.get('http://s/p0') == first
+    assert cache.total_bytes == 800
+    assert sorted(os.listdir(cache.directory)) == sorted(
+        os.path.basename(cache.get(url)) for url in ('http://s/p0', 'http://s/p2'))
+
+
+def test_oversized_single_page_kept(tmp_path):
+    cache = make_cache(tmp_path, {'http://s/big': (200, 'image/png', b'x' * 2000)})
+    cache.fetch('http://s/big')
+    assert cache.get('http://s/big') is not None
+
+
+def test_clear(tmp_path):
+    cache = make_cache(tmp_path, {'http://s/p': (200, 'image/png', b'abc')})
+    cache.fetch('http://s/p')
+    path = cache.get('http://s/p')
+    cache.clear()
+    assert cache.get('http://s/p') is None
+    assert cache.total_bytes == 0
+    assert not os.path.exists(path)
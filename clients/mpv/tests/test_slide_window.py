@@ -0,0 +1,67 @@
+import pytest
+
+from mpv_client import MPVClient
+
+
+class FakePlaylist:
+    """Плейлист MPV: применяет append/remove/move как MPV"""
+
+    def __init__(self):
+        self.entries = []
+        self.commands = []
+
+    def send_command(self, command, *args, wait=True, ipc=None):
+        self.commands.append((command,) + args)
+        if command == 'loadfile':
+            assert args[1] == 'append'
+            self.entries.append(args[0])
+        elif command == 'playlist-remove':
+            del self.entries[args[0]]
+        elif command == 'playlist-move':
+            index, target = args
+            self.entries.insert(target, self.entries.pop(index))
+
+
+@pytest.fixture
+def client():
+    client = MPVClient.__new__(MPVClient)
+    client.server_url = 'http://server'
+    client.device_id = 'd1'
+    client.mpv_version = (0, 37)
+    client.page_counts = {('pdf', 'doc.pdf'): 4}
+    client._slide_window = []
+    client.playlist = FakePlaylist()
+    client.send_command = client.playlist.send_command
+    client._cached_slide = lambda url: url
+    return client
+
+
+def page(n):
+    return f'http://server/api/devices/d1/converted/doc/page/{n}'
+
+
+def test_window_follows_page(client):
+    client._update_slide_window('doc.pdf', 1, 'pdf')
+    assert client.playlist.entries == client._slide_window == [page(1), page(2)]
+
+    for current in (2, 3, 4):
+        client._update_slide_window('doc.pdf', current, 'pdf')
+        expected = [page(p) for p in (current - 1, current, current + 1) if p <= 4]
+        assert client.playlist.entries == client._slide_window == expected
+
+
+def test_jump_back_reorders(client):
+    client._update_slide_window('doc.pdf', 3, 'pdf')
+    client.playlist.commands.clear()
+    client._update_slide_window('doc.pdf', 2, 'pdf')
+    assert client.playlist.entries == [page(1), page(2), page(3)]
+    # Страницы 2 и 3 уже загружены - добавляется только 1
+    loaded = [c[1] for c in client.playlist.commands if c[0] == 'loadfile']
+    assert loaded == [page(1)]
+
+
+def test_loadfile_args_index_for_new_mpv(client):
+    assert client._loadfile_args('u', 'replace') == ['loadfile', 'u', 'replace']
+    assert client._loadfile_args('u', 'append', {'a': 1, 'b': 'x'}) == ['loadfile', 'u', 'append', 'a=1,b=x']
+    client.mpv_version = (0, 38)
+    assert client._loadfile_args('u', 'append', {'a': 1}) == ['loadfile', 'u', 'append', -1, 'a=1']
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from mpv_client import MPVClient
+
+
+@pytest.fixture
+def client(tmp_path):
+    """MPVClient без MPV и сервера: только состояние для журнала"""
+    client = MPVClient.__new__(MPVClient)
+    client._restore_item = None
+    client._paused = False
+    client._journal = None
+    client.saved_position = 0.0
+    client.current_time_pos = None
+    client.journal_path = str(tmp_path / 'journal.json')
+    return client
+
+
+def test_idle_state(client):
+    assert client._current_state() == {'type': 'idle', 'file': None, 'state': 'idle'}
+    assert client._item_for({'type': 'idle', 'file': None}) is None
+    assert client._item_for({'type': 'unknown', 'file': 'a'}) is None
+
+
+@pytest.mark.parametrize('state', [
+    {'type': 'video', 'file': 'clip.mp4', 'state': 'playing'},
+    {'type': 'image', 'file': 'pic.png', 'state': 'paused'},
+    {'type': 'pdf', 'file': 'doc.pdf', 'state': 'playing', 'page': 3},
+    {'type': 'folder', 'file': 'photos', 'state': 'playing', 'page': 2},
+])
+def test_state_round_trip(client, state):
+    client._restore_item = client._item_for(state)
+    client._paused = state['state'] == 'paused'
+    assert client._current_state() == state
+
+
+def test_page_defaults_to_first(client):
+    method, args = client._item_for({'type': 'pptx', 'file': 'deck.pptx'})
+    assert method.__name__ == '_show_pptx_slide'
+    assert args == ('deck.pptx', 1)
+
+
+def test_journal_written_only_on_change(client):
+    client._restore_item = client._item_for({'type': 'video', 'file': 'clip.mp4'})
+    client.current_time_pos = 12.34
+    client._save_journal()
+    with open(client.journal_path) as f:
+        assert json.load(f) == {'type': 'video', 'file': 'clip.mp4', 'state': 'playing', 'position': 12.3}
+
+    # Пауза: позиция - сохраненная, а не текущая
+    client._paused = True
+    client.saved_position = 20.0
+    client.current_time_pos = 99.0
+    client._save_journal()
+    with open(client.journal_path) as f:
+        assert json.load(f)['position'] == 20.0
+
+    with open(client.journal_path, 'w') as f:
+        f.write('sentinel')
+    client._save_journal()  # Ничего не изменилось - файл не трогаем
+    with open(client.journal_path) as f:
+        assert f.read() == 'sentinel'
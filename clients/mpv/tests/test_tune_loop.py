@@ -0,0 +1,73 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import mpv_client
+from mpv_client import MPVClient, PlaybackTuner
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    Клиент без MPV: окна подстройки - по сценарию windows (пропусков,
+    проиграно сек, файл на экране); после последнего окна цикл завершается
+    """
+    client = MPVClient.__new__(MPVClient)
+    client.running = True
+    client._paused = False
+    client._sync = None
+    client._content_active = True
+    client._preflight_forced = {}
+    client._tuned_runtime = {}
+    client._tune_exhausted = None
+    client.tuner = PlaybackTuner(str(tmp_path / 'tuning.json'))
+    client.qos = SimpleNamespace(hwdec='vaapi', totals={
+        'frame_drops': 0, 'decoder_drops': 0, 'vo_delayed': 0, 'played_s': 0.0, 'stalls': 0})
+    client.sent = []
+    client.send_command = lambda *args, **kwargs: client.sent.append(args) or {'data': 25.0}
+    client.windows = []
+    clock = [0.0]
+
+    def sleep(seconds):
+        drops, played, filename = client.windows.pop(0)
+        client.running = bool(client.windows)
+        client._restore_item = (client._play_video, (filename,)) if filename else None
+        clock[0] += seconds
+        client.qos.totals['frame_drops'] += drops
+        client.qos.totals['played_s'] += played
+
+    monkeypatch.setattr(mpv_client.time, 'sleep', sleep)
+    monkeypatch.setattr(mpv_client.time, 'monotonic', lambda: clock[0])
+    return client
+
+
+def saved(client):
+    with open(client.tuner.path) as f:
+        return json.load(f)
+
+
+def test_step_saved_only_when_drops_go_under_threshold(client):
+    # База, пропуски 20% -> render; не помог -> threads (перезагрузка); помог
+    client.windows = [(0, 5, 'a.mp4'), (25, 5, 'a.mp4'), (0, 5, 'a.mp4'), (25, 5, 'a.mp4'), (0, 5, 'a.mp4'),
+                      (0, 5, 'a.mp4')]
+    client.scheduler = SimpleNamespace(generation=1, submit=lambda *args, **kwargs: None)
+    client._tune_loop()
+    assert saved(client) == {'a.mp4': ['threads']}
+    assert client.tuner.trying == {'a.mp4': ['render']}
+
+
+def test_lag_triggers_step(client):
+    # Пропусков нет, но за 5 сек проиграно 3 - декодер не успевает
+    client.windows = [(0, 5, 'a.mp4'), (0, 3, 'a.mp4')]
+    client._tune_loop()
+    assert client.tuner.trying == {'a.mp4': ['render']}
+    assert ('set_property', 'scale', 'bilinear') in client.sent
+
+
+def test_trial_forgotten_when_file_changes(client):
+    # Показ закончился до оценки шага
+    client.windows = [(0, 5, 'a.mp4'), (25, 5, 'a.mp4'), (0, 0, None)]
+    client._tune_loop()
+    assert client.tuner.trying == {}
+    assert client.tuner.applied == {}
@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from mpv_client import VideoPreflight
+
+MB = 1024 * 1024
+
+
+class FakeHttp:
+    """Фоновая задача - в своем потоке (info_for вызывает submit под замком)"""
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        if self.parameters is None:
+            return SimpleNamespace(status_code=404, json=lambda: {})
+        return SimpleNamespace(status_code=200, json=lambda: {'parameters': self.parameters})
+
+    def submit(self, fn, *args):
+        future = Future()
+
+        def run():
+            fn(*args)
+            future.set_result(None)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+
+def make_preflight(tmp_path, parameters=None, key='k1', hwdec_codecs=('h264',), software_max=(1920, 1080)):
+    store = SimpleNamespace(digest_for=lambda device, filename: key)
+    capabilities = {'hwdec_codecs': list(hwdec_codecs), 'software_max': software_max}
+    return VideoPreflight(str(tmp_path / 'video-info.json'), 'http://server', 'd1',
+                          FakeHttp(parameters), store, capabilities)
+
+
+def test_supported_codec_restricts_hwdec_codecs(tmp_path):
+    preflight = make_preflight(tmp_path)
+    options = preflight.options_for({'codec': 'h264', 'width': 1920, 'height': 1080})
+    assert options == {'hwdec-codecs': 'h264'}
+
+
+def test_unsupported_heavy_codec_software_light_decode(tmp_path):
+    preflight = make_preflight(tmp_path)
+    options = preflight.options_for({'codec': 'av1', 'width': 3840, 'height': 2160})
+    assert options['hwdec'] == 'no'
+    assert options['vd-lavc-fast'] == 'yes'
+    # В пределах возможностей CPU - без облегчения
+    options = preflight.options_for({'codec': 'av1', 'width': 1280, 'height': 720})
+    assert options == {'hwdec': 'no'}
+
+
+def test_downscale_and_cache_by_bitrate(tmp_path):
+    preflight = make_preflight(tmp_path)
+    preflight.display = (1920, 1080)
+    options = preflight.options_for({'codec': 'h264', 'width': 3840, 'height': 2160, 'bitrate': 8000000})
+    assert options['dscale'] == 'bilinear'
+    assert options['demuxer-max-bytes'] == str(30 * 1000000)
+    assert preflight.options_for({'bitrate': 1000})['demuxer-max-bytes'] == str(16 * MB)
+    preflight.cache_max = 20 * MB
+    assert preflight.options_for({'bitrate': 10 ** 9})['demuxer-max-bytes'] == str(20 * MB)
+
+
+def test_info_cached_on_disk_by_content_key(tmp_path):
+    info = {'codec': 'h264', 'width': 640, 'height': 360}
+    preflight = make_preflight(tmp_path, info)
+    assert preflight.info_for('a b.mp4', wait=1) == info
+    assert preflight.http.urls == ['http://server/api/devices/d1/files/a%20b.mp4/video-info']
+
+    restarted = make_preflight(tmp_path, {'codec': 'hevc'})
+    assert restarted.info_for('a b.mp4') == info
+    assert restarted.http.urls == []
+
+    # Файл переконвертирован под тем же именем - новый ключ, новый запрос
+    changed = make_preflight(tmp_path, {'codec': 'hevc'}, key='k2')
+    assert changed.info_for('a b.mp4', wait=1) == {'codec': 'hevc'}
+
+
+def test_failure_not_retried_immediately(tmp_path):
+    preflight = make_preflight(tmp_path, None)
+    assert preflight.info_for('a.mp4', wait=1) is None
+    assert preflight.info_for('a.mp4', wait=1) is None
+    assert len(preflight.http.urls) == 1
@@ -1099,7 +1099,9 @@ export function createFilesRouter(deps) {
         canPlay: fileStatus.canPlay !== false,
         error: fileStatus.error || null,
         resolution,
-        isPlaceholder  // НОВОЕ: Флаг заглушки
+        isPlaceholder,  // НОВОЕ: Флаг заглушки
+        size: metadata ? metadata.file_size : null,  // Для зеркалирования на клиентах
+        md5: metadata ? metadata.md5_hash : null
       });
     }
     
@@ -40,7 +40,7 @@ export function createPlaceholderRouter(deps) {
       // Ищем файл с флагом is_placeholder в БД
       const db = getDatabase();
       const placeholder = db.prepare(`
-        SELECT safe_name, file_path FROM files_metadata 
+        SELECT safe_name, file_path, md5_hash, file_size FROM files_metadata 
         WHERE device_id = ? AND is_placeholder = 1
         LIMIT 1
       `).get(id);
@@ -50,7 +50,12 @@ export function createPlaceholderRouter(deps) {
           deviceId: id, 
           fileName: placeholder.safe_name 
         });
-        return res.json({ placeholder: placeholder.safe_name });
+        // md5 + размер - ключ содержимого в хранилище клиента (общий с кэшем и зеркалом)
+        return res.json({
+          placeholder: placeholder.safe_name,
+          md5: placeholder.md5_hash,
+          size: placeholder.file_size
+        });
       }
       
       logger.info('[placeholder] ℹ️ No placeholder set', { deviceId: id });
@@ -4,6 +4,97 @@
  */
 
 import { getFolderImagesCount } from '../converters/folder-converter.js';
+import { getDeviceSockets } from './connection-manager.js';
+
+const PAGED_TYPES = ['pdf', 'pptx', 'folder'];
+const SYNC_LEAD_MS = 2000; // Запас до синхронного старта по умолчанию
+
+/**
+ * Тип контента по имени файла
+ * @param {string} file - Имя файла (без расширения - папка с изображениями)
+ * @returns {string} video | image | pdf | pptx | folder
+ */
+function contentType(file) {
+  // Проверяем есть ли расширение у файла
+  const hasExtension = file.includes('.');
+  const ext = hasExtension ? file.split('.').pop().toLowerCase() : '';
+  
+  if (!hasExtension) {
+    // Нет расширения = это папка с изображениями
+    return 'folder';
+  } else if (ext === 'pdf') {
+    return 'pdf';
+  } else if (ext === 'pptx') {
+    return 'pptx';
+  } else if (['png','jpg','jpeg','gif','webp'].includes(ext)) {
+    return 'image';
+  } else if (ext === 'zip') {
+    return 'folder'; // ZIP = папка с изображениями
+  }
+  return 'video'; // По умолчанию
+}
+
+/**
+ * Окна расписания: только корректные {days, from, to}
+ * @param {Array} windows - [{days: [1..7], from: 'HH:MM', to: 'HH:MM'}]
+ * @returns {Array|undefined}
+ */
+function normalizeWindows(windows) {
+  if (!Array.isArray(windows)) return undefined;
+  
+  const time = /^([01]\d|2[0-3]):[0-5]\d$|^24:00$/;
+  const result = windows
+    .filter(w => w && time.test(w.from || '00:00') && time.test(w.to || '24:00'))
+    .map(w => ({
+      days: Array.isArray(w.days) ? w.days.map(Number).filter(d => d >= 1 && d <= 7) : undefined,
+      from: w.from || '00:00',
+      to: w.to || '24:00'
+    }));
+  return result.length ? result : undefined;
+}
+
+/**
+ * Плейлист/расписание для локального исполнения на плеере
+ * @param {Object} playlist - {items: [{file, page, duration, windows}], loop, windows}
+ * @returns {Object|null} Нормализованный плейлист или null - пустой
+ */
+function normalizePlaylist(playlist) {
+  const items = (playlist && Array.isArray(playlist.items) ? playlist.items : [])
+    .filter(item => item && typeof item.file === 'string' && item.file)
+    .map(item => {
+      const type = item.type || contentType(item.file);
+      const duration = parseFloat(item.duration);
+      return {
+        file: item.file,
+        type,
+        page: PAGED_TYPES.includes(type) ? Math.max(1, parseInt(item.page, 10) || 1) : undefined,
+        duration: duration > 0 ? duration : undefined,
+        windows: normalizeWindows(item.windows)
+      };
+    });
+  if (!items.length) return null;
+  
+  const loop = playlist.loop === undefined ? true : playlist.loop;
+  return {
+    id: `${Date.now()}`,
+    items,
+    loop: typeof loop === 'boolean' ? loop : Math.max(1, parseInt(loop, 10) || 1),
+    windows: normalizeWindows(playlist.windows)
+  };
+}
+
+/**
+ * Команда для плеера без связи: d.current - намерение оператора, которое
+ * при регистрации важнее состояния, о котором сообщит плеер
+ * @param {Object} d - devices[device_id]
+ * @param {string} device_id - ID устройства
+ */
+function markPending(d, device_id) {
+  const sockets = getDeviceSockets().get(device_id);
+  if (!sockets || sockets.size === 0) {
+    d.pendingCurrent = true;
+  }
+}
 
 /**
  * Настраивает обработчики управления плеером
@@ -13,31 +104,17 @@ import { getFolderImagesCount } from '../converters/folder-converter.js';
 export function setupControlHandlers(socket, deps) {
   const { devices, io, getPageSlideCount } = deps;
   
-  // control/play - Запустить воспроизведение
-  socket.on('control/play', ({ device_id, file, page }) => {
+  // control/play - Запустить воспроизведение (start_at - старт по часам сервера, мс)
+  socket.on('control/play', ({ device_id, file, page, start_at }) => {
     const d = devices[device_id];
     if (!d) return;
     
     if (file) {
-      // Проверяем есть ли расширение у файла
-      const hasExtension = file.includes('.');
-      const ext = hasExtension ? file.split('.').pop().toLowerCase() : '';
-      
       // Определяем тип контента
-      let type = 'video'; // По умолчанию
+      const type = contentType(file);
       
-      if (!hasExtension) {
-        // Нет расширения = это папка с изображениями
-        type = 'folder';
-      } else if (ext === 'pdf') {
-        type = 'pdf';
-      } else if (ext === 'pptx') {
-        type = 'pptx';
-      } else if (['png','jpg','jpeg','gif','webp'].includes(ext)) {
-        type = 'image';
-      } else if (ext === 'zip') {
-        type = 'folder'; // ZIP = папка с изображениями
-      }
+      // Ручной запуск снимает плейлист (плеер снимает его сам по player/play)
+      d.playlist = null;
       
       // Используем переданный номер страницы или 1 по умолчанию
       const pageNum = page || 1;
@@ -46,16 +123,18 @@ export function setupControlHandlers(socket, deps) {
         type, 
         file, 
         state: 'playing', 
-        page: (type === 'pdf' || type === 'pptx' || type === 'folder') ? pageNum : undefined 
+        page: PAGED_TYPES.includes(type) ? pageNum : undefined 
       };
       
-      io.to(`device:${device_id}`).emit('player/play', d.current);
+      markPending(d, device_id);
+      io.to(`device:${device_id}`).emit('player/play', start_at ? { ...d.current, startAt: start_at } : d.current);
     } else {
       // КРИТИЧНО: Если файл не указан - это RESUME после паузы
       // Отправляем команду player/resume чтобы плеер продолжил с места паузы
       // НЕ отправляем player/play - это перезагрузит файл с начала!
       if (d.current) {
         d.current.state = 'playing';
+        markPending(d, device_id);
       }
       io.to(`device:${device_id}`).emit('player/resume');
       console.log(`[Control] ▶️ Resume: ${device_id} (продолжение с места паузы)`);
@@ -64,12 +143,32 @@ export function setupControlHandlers(socket, deps) {
     io.emit('preview/refresh', { device_id });
   });
 
+  // control/syncPlay - Видеостена: одно видео на нескольких плеерах с общим стартом
+  socket.on('control/syncPlay', ({ device_ids, file, lead_ms }) => {
+    if (!Array.isArray(device_ids) || !file) return;
+    
+    // Запас на доставку команды и загрузку файла на всех плеерах
+    const startAt = Date.now() + (lead_ms || SYNC_LEAD_MS);
+    for (const device_id of device_ids) {
+      const d = devices[device_id];
+      if (!d) continue;
+      
+      d.playlist = null;
+      d.current = { type: 'video', file, state: 'playing' };
+      markPending(d, device_id);
+      io.to(`device:${device_id}`).emit('player/play', { ...d.current, startAt });
+      io.emit('preview/refresh', { device_id });
+    }
+    console.log(`[Control] 🎯 Sync play: ${file} on ${device_ids.join(', ')} at ${new Date(startAt).toISOString()}`);
+  });
+
   // control/pause - Пауза
   socket.on('control/pause', ({ device_id }) => {
     const d = devices[device_id];
     if (!d) return;
     
     d.current.state = 'paused';
+    markPending(d, device_id);
     io.to(`device:${device_id}`).emit('player/pause');
     io.emit('preview/refresh', { device_id });
   });
@@ -80,6 +179,7 @@ export function setupControlHandlers(socket, deps) {
     if (!d) return;
     
     d.current.state = 'playing';
+    markPending(d, device_id);
     io.to(`device:${device_id}`).emit('player/restart');
     io.emit('preview/refresh', { device_id });
   });
@@ -90,10 +190,22 @@ export function setupControlHandlers(socket, deps) {
     if (!d) return;
     
     d.current = { type: 'idle', file: null, state: 'idle' };
+    d.playlist = null;
+    markPending(d, device_id);
     io.to(`device:${device_id}`).emit('player/stop');
     io.emit('preview/refresh', { device_id });
   });
 
+  // control/playlist - Плейлист/расписание целиком: плеер исполняет его сам (и без сети)
+  socket.on('control/playlist', ({ device_id, playlist }) => {
+    const d = devices[device_id];
+    if (!d) return;
+    
+    d.playlist = normalizePlaylist(playlist);
+    io.to(`device:${device_id}`).emit('player/playlist', d.playlist);
+    console.log(`[Control] 📋 Playlist: ${device_id} (${d.playlist ? d.playlist.items.length : 0} items)`);
+  });
+
   // control/pdfPrev - Предыдущая страница/слайд/изображение
   socket.on('control/pdfPrev', ({ device_id }) => {
     const d = devices[device_id];
@@ -101,12 +213,15 @@ export function setupControlHandlers(socket, deps) {
     
     if (d.current.type === 'pdf') {
       d.current.page = Math.max(1, (d.current.page || 1) - 1);
+      markPending(d, device_id);
       io.to(`device:${device_id}`).emit('player/pdfPage', d.current.page);
     } else if (d.current.type === 'pptx') {
       d.current.page = Math.max(1, (d.current.page || 1) - 1);
+      markPending(d, device_id);
       io.to(`device:${device_id}`).emit('player/pptxPage', d.current.page);
     } else if (d.current.type === 'folder') {
       d.current.page = Math.max(1, (d.current.page || 1) - 1);
+      markPending(d, device_id);
       io.to(`device:${device_id}`).emit('player/folderPage', d.current.page);
     }
   });
@@ -122,6 +237,7 @@ export function setupControlHandlers(socket, deps) {
         const nextPage = Math.min((d.current.page || 1) + 1, maxPages);
         if (nextPage !== d.current.page) {
           d.current.page = nextPage;
+          markPending(d, device_id);
           io.to(`device:${device_id}`).emit('player/pdfPage', d.current.page);
         }
       }
@@ -131,6 +247,7 @@ export function setupControlHandlers(socket, deps) {
         const nextSlide = Math.min((d.current.page || 1) + 1, maxSlides);
         if (nextSlide !== d.current.page) {
           d.current.page = nextSlide;
+          markPending(d, device_id);
           io.to(`device:${device_id}`).emit('player/pptxPage', d.current.page);
         }
       }
@@ -142,6 +259,7 @@ export function setupControlHandlers(socket, deps) {
         const nextImage = Math.min((d.current.page || 1) + 1, maxImages);
         if (nextImage !== d.current.page) {
           d.current.page = nextImage;
+          markPending(d, device_id);
           io.to(`device:${device_id}`).emit('player/folderPage', d.current.page);
         }
       }
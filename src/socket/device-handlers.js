@@ -1,10 +1,93 @@
 /**
- * Обработчики устройств (player/register, player/ping)
+ * Обработчики устройств (player/register, player/ping, player/progress)
  * @module socket/device-handlers
  */
 
 import { getActiveConnections, getDeviceSockets } from './connection-manager.js';
 
+const PLAYABLE_TYPES = ['video', 'image', 'pdf', 'pptx', 'folder'];
+const PAGED_TYPES = ['pdf', 'pptx', 'folder'];
+
+/**
+ * Состояние, о котором сообщил плеер при регистрации (MPV клиент ведет
+ * журнал и после перезапуска продолжает показ сам)
+ * @param {Object} current - {type, file, state, page} от плеера
+ * @returns {Object|null} Нормализованное состояние или null - сброс в idle
+ */
+function reportedState(current) {
+  if (!current || !PLAYABLE_TYPES.includes(current.type) || typeof current.file !== 'string' || !current.file) {
+    return null;
+  }
+  
+  return {
+    type: current.type,
+    file: current.file,
+    state: current.state === 'paused' ? 'paused' : 'playing',
+    page: PAGED_TYPES.includes(current.type) ? Math.max(1, parseInt(current.page, 10) || 1) : undefined
+  };
+}
+
+/**
+ * Состояние устройства после регистрации. Команда оператора, пришедшая пока
+ * плеер был без связи (pendingCurrent), важнее доклада плеера: сервер
+ * оставляет свое состояние, плеер по player/state применит отличие
+ * @param {Object} device - devices[device_id]
+ * @param {string} deviceId - ID устройства (для лога)
+ * @param {Object} current - {type, file, state, page} от плеера
+ * @returns {Object} Новое devices[device_id].current
+ */
+function registeredState(device, deviceId, current) {
+  if (device.pendingCurrent && device.current) {
+    device.pendingCurrent = false;
+    console.log(`[Server] 📬 ${deviceId}: команда без связи - ${device.current.type} ${device.current.file || ''}`);
+    return device.current;
+  }
+  device.pendingCurrent = false;
+  return reportedState(current) || { type: 'idle', file: null, state: 'idle' };
+}
+
+/**
+ * Сверка плейлиста при регистрации: плеер пропустил player/playlist (был
+ * без связи) - досылаем; снятый на сервере (null) - снимаем и на плеере.
+ * undefined - сервер перезапускался и плейлиста не знает, плеер ведет его сам
+ * @param {Socket} socket - Socket.IO сокет плеера
+ * @param {Object} device - devices[device_id]
+ * @param {Object} reported - {id, index, loops, done, item} от плеера или null
+ */
+function syncPlaylist(socket, device, reported) {
+  if (device.playlist === undefined) return;
+  
+  if (device.playlist === null) {
+    if (reported && !reported.done) socket.emit('player/playlist', null);
+  } else if (!reported || reported.id !== device.playlist.id) {
+    socket.emit('player/playlist', device.playlist);
+  }
+}
+
+/**
+ * Телеметрия из player/ping (MPV клиент): сводка QoS за окно, синхронизация
+ * часов, холодный старт, ресурсы процессов. Отдается в GET /api/devices
+ * @param {Object} device - devices[device_id]
+ * @param {string} deviceId - ID устройства (для лога)
+ * @param {Object} data - Тело player/ping
+ */
+function saveTelemetry(device, deviceId, data) {
+  if (!device || !data || (!data.qos && !data.sync)) return;
+  
+  device.telemetry = {
+    qos: data.qos || device.telemetry?.qos || null,
+    sync: data.sync || null,
+    startup: data.startup || null,
+    resources: data.resources || null,
+    updatedAt: new Date().toISOString()
+  };
+  
+  const qos = data.qos;
+  if (qos && (qos.frame_drops > 0 || qos.decoder_drops > 0 || qos.stalls > 0)) {
+    console.warn(`[Server] ⚠️ QoS ${deviceId}: drops ${qos.frame_drops}/${qos.decoder_drops}, stalls ${qos.stalls}, cache ${qos.cache_s_min !== undefined ? qos.cache_s_min : '-'}s (${qos.file || 'idle'})`);
+  }
+}
+
 /**
  * Настраивает обработчики регистрации и пингов устройств
  * @param {Socket} socket - Socket.IO сокет
@@ -16,7 +99,7 @@ export function setupDeviceHandlers(socket, deps) {
   const deviceSockets = getDeviceSockets();
   
   // player/register - Регистрация устройства
-  socket.on('player/register', ({ device_id, device_type, capabilities, platform }) => {
+  socket.on('player/register', ({ device_id, device_type, capabilities, platform, current, playlist }) => {
     if (!device_id || !devices[device_id]) {
       socket.emit('player/reject', { reason: 'unknown_device' });
       return;
@@ -59,8 +142,9 @@ export function setupDeviceHandlers(socket, deps) {
         // Обновляем ping
         if (socket.data) socket.data.lastPing = Date.now();
         
-        // Сбрасываем состояние
-        devices[device_id].current = { type: 'idle', file: null, state: 'idle' };
+        // Плейлист раньше состояния: снятый плейлист не перекроет команду оператора
+        devices[device_id].current = registeredState(devices[device_id], device_id, current);
+        syncPlaylist(socket, devices[device_id], playlist);
         socket.emit('player/state', devices[device_id].current);
         return;
       }
@@ -83,8 +167,10 @@ export function setupDeviceHandlers(socket, deps) {
       io.emit('player/online', { device_id });
     }
     
-    // Сбрасываем состояние устройства
-    devices[device_id].current = { type: 'idle', file: null, state: 'idle' };
+    // Состояние плеера или команда, пришедшая пока он был без связи;
+    // плейлист раньше состояния: снятый плейлист не перекроет команду оператора
+    devices[device_id].current = registeredState(devices[device_id], device_id, current);
+    syncPlaylist(socket, devices[device_id], playlist);
     socket.emit('player/state', devices[device_id].current);
     
     // КРИТИЧНО: Отправляем подтверждение успешной регистрации
@@ -98,14 +184,27 @@ export function setupDeviceHandlers(socket, deps) {
   });
     
   // player/ping - Keep-alive пинг
-  socket.on('player/ping', () => {
+  socket.on('player/ping', (data) => {
+    const received = Date.now();
     if (socket.data.device_id) {
-      socket.emit('player/pong');
+      // Метки времени для оценки смещения часов плеера (синхронный показ)
+      socket.emit('player/pong', { t0: data?.t0, t1: received, t2: Date.now() });
       if (socket.data) socket.data.lastPing = Date.now();
+      saveTelemetry(devices[socket.data.device_id], socket.data.device_id, data);
       console.log(`[Server] 🏓 Ping from ${socket.data.device_id} (socket: ${socket.id})`);
     }
   });
   
+  // player/progress - Плеер сам перешел к следующему элементу плейлиста
+  socket.on('player/progress', (payload = {}) => {
+    const did = socket.data.device_id;
+    if (!did || !devices[did]) return;
+    const playlist = payload && payload.playlist;
+    
+    devices[did].current = reportedState(playlist && playlist.item) || { type: 'idle', file: null, state: 'idle' };
+    io.emit('preview/refresh', { device_id: did });
+  });
+  
   // Таймер неактивности для автоматического отключения
   socket.data.lastPing = Date.now();
   socket.data.inactivityTimeout = setInterval(() => {
@@ -14,7 +14,8 @@ export function saveDeviceState(devices) {
     const state = {};
     for (const [deviceId, device] of Object.entries(devices)) {
       if (device.current) {
-        state[deviceId] = device.current;
+        // pending - команда оператора еще не доставлена плееру (был без связи)
+        state[deviceId] = device.pendingCurrent ? { ...device.current, pending: true } : device.current;
       }
     }
     fs.writeFileSync(STATE_FILE, JSON.stringify(state, null, 2));
@@ -32,7 +33,9 @@ export function loadDeviceState(devices) {
       const state = JSON.parse(fs.readFileSync(STATE_FILE, 'utf-8'));
       for (const [deviceId, current] of Object.entries(state)) {
         if (devices[deviceId]) {
-          devices[deviceId].current = current;
+          const { pending, ...saved } = current;
+          devices[deviceId].current = saved;
+          devices[deviceId].pendingCurrent = Boolean(pending);
         }
       }
       console.log('✅ Device state restored from file');